@@ -315,7 +315,8 @@ async def get_program_jobs(
                         "total_files": job.total_files,
                         "processed_files": job.processed_files,
                         "successful_files": job.successful_files,
-                        "failed_files": job.failed_files
+                        "failed_files": job.failed_files,
+                        "skipped_unchanged": job.skipped_unchanged or 0
                     },
                     "error_message": job.error_message
                 }
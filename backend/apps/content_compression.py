@@ -0,0 +1,61 @@
+"""
+Compression of extracted text stored out of line in content blobs
+"""
+import gzip
+import os
+from typing import Tuple
+
+try:
+    import zstandard
+except ImportError:  # gzip is used instead
+    zstandard = None
+
+# Codec for newly stored text: zstd, gzip or identity (stored texts keep the codec they were written with)
+CONTENT_COMPRESSION = (os.environ.get("CONTENT_COMPRESSION") or "zstd").lower()
+# Compression level, 0 for the codec default
+CONTENT_COMPRESSION_LEVEL = int(os.environ.get("CONTENT_COMPRESSION_LEVEL") or 0)
+
+# zstd level 3 and gzip level 6 are the codec defaults
+_DEFAULT_LEVELS = {"zstd": 3, "gzip": 6}
+
+
+def _codec() -> str:
+    if CONTENT_COMPRESSION == "zstd" and zstandard is None:
+        return "gzip"
+    if CONTENT_COMPRESSION in ("zstd", "gzip"):
+        return CONTENT_COMPRESSION
+    return "identity"
+
+
+def compress_text(text: str) -> Tuple[bytes, str]:
+    """
+    Compress text with the configured codec
+
+    Falls back to gzip when zstd is configured but `zstandard` is not
+    installed. Lone surrogates left by broken extractions round-trip.
+
+    Returns:
+        Compressed bytes and the codec name to store next to them
+    """
+    data = text.encode('utf-8', 'surrogatepass')
+    encoding = _codec()
+    level = CONTENT_COMPRESSION_LEVEL or _DEFAULT_LEVELS.get(encoding, 0)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data), encoding
+    if encoding == "gzip":
+        # mtime=0 keeps the output deterministic
+        return gzip.compress(data, compresslevel=level, mtime=0), encoding
+    return data, encoding
+
+
+def decompress_text(data: bytes, encoding: str) -> str:
+    """Decompress text stored with `compress_text`"""
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed, cannot read zstd-compressed content")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == "gzip":
+        data = gzip.decompress(data)
+    elif encoding != "identity":
+        raise ValueError(f"Unknown content encoding: {encoding}")
+    return bytes(data).decode('utf-8', 'surrogatepass')
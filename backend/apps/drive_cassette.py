@@ -0,0 +1,429 @@
+"""
+Record and replay Google Drive HTTP traffic for offline, deterministic profiling
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import zipfile
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# "record" wraps the pooled Drive client and saves every response; "replay" serves them without network
+DRIVE_CASSETTE_MODE = (os.environ.get("DRIVE_CASSETTE_MODE") or "").lower()
+DRIVE_CASSETTE_PATH = os.environ.get("DRIVE_CASSETTE_PATH") or "drive_cassette.zip"
+
+# Replay timing: recorded latency times this factor, plus a fixed delay per response
+DRIVE_CASSETTE_LATENCY_SCALE = float(os.environ.get("DRIVE_CASSETTE_LATENCY_SCALE") or 0)
+DRIVE_CASSETTE_EXTRA_LATENCY_SECONDS = float(os.environ.get("DRIVE_CASSETTE_EXTRA_LATENCY_SECONDS") or 0)
+
+# Replay fault injection: share of responses swapped for a throttling or server error
+DRIVE_CASSETTE_ERROR_RATE = float(os.environ.get("DRIVE_CASSETTE_ERROR_RATE") or 0)
+DRIVE_CASSETTE_SEED = int(os.environ.get("DRIVE_CASSETTE_SEED") or 0)
+
+CASSETTE_MODES = ("record", "replay")
+
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+
+# Never written to a cassette
+_SCRUBBED_PARAMS = {"access_token", "key"}
+_SCRUBBED_TOKEN_FIELDS = ("access_token", "refresh_token", "id_token")
+_DROPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie", "alt-svc"}
+
+# Responses swapped in by fault injection
+_INJECTED_ERRORS = (
+    (429, {"error": {"code": 429, "message": "Injected rate limit", "errors": [{"reason": "rateLimitExceeded"}]}}),
+    (503, {"error": {"code": 503, "message": "Injected backend error", "errors": [{"reason": "backendError"}]}}),
+)
+
+_INDEX_NAME = "cassette.json"
+_CASSETTE_VERSION = 1
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode for a request the cassette has no response for"""
+
+
+class RecordedResponse:
+    """One recorded response; bodies are stored once per content hash"""
+
+    __slots__ = ("status_code", "headers", "body_hash", "elapsed")
+
+    def __init__(self, status_code: int, headers: List[Tuple[str, str]], body_hash: str, elapsed: float):
+        self.status_code = status_code
+        self.headers = headers
+        self.body_hash = body_hash
+        self.elapsed = elapsed
+
+
+class DriveCassette:
+    """
+    On-disk archive of Drive responses, keyed by normalized request
+
+    The archive is a zip file with a JSON index and one deflated member per
+    distinct body. Requests are keyed without credentials; multipart batch
+    bodies are keyed with their random boundary normalized. Responses to the
+    same request are replayed in recorded order, the last one repeating.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._responses: Dict[str, List[RecordedResponse]] = {}
+        self._urls: Dict[str, str] = {}
+        self._bodies: Dict[str, bytes] = {}
+        self._replay_positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        # Counters
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self.injected_errors = 0
+
+    def load(self):
+        """Load the archive from disk, if it exists"""
+        if not os.path.exists(self.path):
+            return
+        with zipfile.ZipFile(self.path) as archive:
+            index = json.loads(archive.read(_INDEX_NAME))
+            bodies = {
+                name.split("/", 1)[1]: archive.read(name)
+                for name in archive.namelist() if name.startswith("bodies/")
+            }
+        with self._lock:
+            self._bodies.update(bodies)
+            for interaction in index.get("interactions", []):
+                key = interaction["key"]
+                self._urls[key] = interaction.get("url", "")
+                self._responses.setdefault(key, []).append(RecordedResponse(
+                    interaction["status"],
+                    [tuple(header) for header in interaction.get("headers", [])],
+                    interaction["body"],
+                    interaction.get("elapsed", 0.0)
+                ))
+        logger.info(f"📼 Loaded Drive cassette {self.path} ({len(index.get('interactions', []))} responses)")
+
+    def save(self):
+        """Write the archive atomically, if anything was recorded since the last save"""
+        with self._lock:
+            if not self._dirty:
+                return
+            interactions = [
+                {
+                    "key": key,
+                    "url": self._urls.get(key, ""),
+                    "status": response.status_code,
+                    "headers": response.headers,
+                    "body": response.body_hash,
+                    "elapsed": round(response.elapsed, 4),
+                }
+                for key, responses in self._responses.items()
+                for response in responses
+            ]
+            bodies = dict(self._bodies)
+            self._dirty = False
+
+        temp_path = f"{self.path}.tmp"
+        with zipfile.ZipFile(temp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(_INDEX_NAME, json.dumps({"version": _CASSETTE_VERSION, "interactions": interactions}))
+            for body_hash, body in bodies.items():
+                archive.writestr(f"bodies/{body_hash}", body)
+        os.replace(temp_path, self.path)
+        logger.info(f"📼 Saved Drive cassette {self.path} ({len(interactions)} responses, {len(bodies)} bodies)")
+
+    def record(self, key: str, url: str, response: RecordedResponse, body: bytes):
+        """Append a response to the cassette"""
+        with self._lock:
+            self._bodies.setdefault(response.body_hash, body)
+            self._urls[key] = url
+            self._responses.setdefault(key, []).append(response)
+            self._dirty = True
+            self.recorded += 1
+
+    def next_response(self, key: str) -> Tuple[Optional[RecordedResponse], int]:
+        """
+        Get the next recorded response for a request key
+
+        Returns:
+            Tuple (response or None when the key was never recorded, occurrence number)
+        """
+        with self._lock:
+            responses = self._responses.get(key)
+            occurrence = self._replay_positions.get(key, 0)
+            self._replay_positions[key] = occurrence + 1
+            if not responses:
+                self.misses += 1
+                return None, occurrence
+            self.replayed += 1
+            return responses[min(occurrence, len(responses) - 1)], occurrence
+
+    def body(self, body_hash: str) -> bytes:
+        return self._bodies[body_hash]
+
+    def count_injected_error(self):
+        with self._lock:
+            self.injected_errors += 1
+
+    def rewind(self):
+        """Replay every request from its first recorded response again"""
+        with self._lock:
+            self._replay_positions.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get cassette counters"""
+        with self._lock:
+            return {
+                "requests": len(self._responses),
+                "bodies": len(self._bodies),
+                "recorded": self.recorded,
+                "replayed": self.replayed,
+                "misses": self.misses,
+                "injected_errors": self.injected_errors,
+            }
+
+
+def _scrub_url(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """URL with its query merged with `params`, sorted and without credentials"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query.extend((name, str(value)) for name, value in params.items())
+    query = sorted((name, value) for name, value in query if name not in _SCRUBBED_PARAMS)
+    base = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    return f"{base}?{urlencode(query)}" if query else base
+
+
+def _request_key(
+    method: str,
+    url: str,
+    params: Optional[Dict[str, Any]],
+    headers: Optional[Dict[str, str]],
+    body: Optional[bytes],
+) -> Tuple[str, str]:
+    """
+    Build the replay key of a request
+
+    Returns:
+        Tuple (key, scrubbed URL)
+    """
+    scrubbed_url = _scrub_url(url, params)
+    key = f"{method.upper()} {scrubbed_url}"
+    headers = {name.lower(): value for name, value in (headers or {}).items()}
+    if headers.get("range"):
+        key += f" range={headers['range']}"
+    # Token requests carry secrets and every refresh is equivalent
+    if body and not scrubbed_url.startswith(GOOGLE_TOKEN_URL):
+        content_type = headers.get("content-type", "")
+        if "boundary=" in content_type:
+            boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+            body = body.replace(boundary, b"BOUNDARY")
+        key += f" body={hashlib.sha1(body).hexdigest()}"
+    return key, scrubbed_url
+
+
+def _scrub_body(url: str, body: bytes) -> bytes:
+    """Replace tokens in token endpoint responses"""
+    if not url.startswith(GOOGLE_TOKEN_URL):
+        return body
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return b""
+    for field in _SCRUBBED_TOKEN_FIELDS:
+        if field in payload:
+            payload[field] = f"scrubbed-{field}"
+    return json.dumps(payload).encode()
+
+
+class CassetteClient:
+    """
+    Stand-in for the pooled Drive httpx.AsyncClient that records or replays a cassette
+
+    In "record" mode requests go through the wrapped client and each response
+    is stored; in "replay" mode responses come from the cassette and no
+    network is used. Replay can add latency (recorded latency scaled, plus a
+    fixed delay) and swap a deterministic, seeded share of responses for 429
+    or 503 errors to exercise the retry path. Closing the client saves the
+    cassette and closes the wrapped client.
+    """
+
+    def __init__(
+        self,
+        cassette: DriveCassette,
+        mode: str = "replay",
+        client: Optional[httpx.AsyncClient] = None,
+        latency_scale: float = DRIVE_CASSETTE_LATENCY_SCALE,
+        extra_latency_seconds: float = DRIVE_CASSETTE_EXTRA_LATENCY_SECONDS,
+        error_rate: float = DRIVE_CASSETTE_ERROR_RATE,
+        seed: int = DRIVE_CASSETTE_SEED,
+    ):
+        """
+        Args:
+            cassette: Archive to record into or replay from
+            mode: "record" or "replay"
+            client: Real client used in record mode
+            latency_scale: Replay delay as a factor of the recorded latency (0 = none)
+            extra_latency_seconds: Fixed delay added to every replayed response
+            error_rate: Share of replayed responses turned into injected errors (0-1)
+            seed: Seed of the error injection; the same seed injects the same errors
+        """
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if mode == "record" and client is None:
+            raise ValueError("Recording a cassette needs a real client")
+        self.cassette = cassette
+        self.mode = mode
+        self.client = client
+        self.latency_scale = latency_scale
+        self.extra_latency_seconds = extra_latency_seconds
+        self.error_rate = error_rate
+        self.seed = seed
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, Any]] = None, **kwargs) -> httpx.Response:
+        return await self._send("GET", url, headers=headers, params=params, **kwargs)
+
+    async def post(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        content: Optional[bytes] = None,
+        data: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> httpx.Response:
+        return await self._send("POST", url, headers=headers, content=content, data=data, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, Any]] = None, **kwargs):
+        """Same interface as httpx.AsyncClient.stream; the body is recorded whole"""
+        yield await self._send(method, url, headers=headers, params=params, stream=True, **kwargs)
+
+    async def aclose(self):
+        if self.mode == "record":
+            self.cassette.save()
+        if self.client is not None:
+            await self.client.aclose()
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        content: Optional[bytes] = None,
+        data: Optional[Dict[str, Any]] = None,
+        stream: bool = False,
+        **kwargs
+    ) -> httpx.Response:
+        body = content if content is not None else (urlencode(data).encode() if data else None)
+        key, scrubbed_url = _request_key(method, url, params, headers, body)
+        if self.mode == "record":
+            return await self._record(key, scrubbed_url, method, url, headers, params, content, data, stream, kwargs)
+        return await self._replay(key, scrubbed_url, method)
+
+    async def _record(self, key, scrubbed_url, method, url, headers, params, content, data, stream, kwargs) -> httpx.Response:
+        started = time.monotonic()
+        if stream:
+            async with self.client.stream(method, url, headers=headers, params=params, **kwargs) as response:
+                body = await response.aread()
+        elif method == "POST":
+            response = await self.client.post(url, headers=headers, content=content, data=data, **kwargs)
+            body = response.content
+        else:
+            response = await self.client.get(url, headers=headers, params=params, **kwargs)
+            body = response.content
+        elapsed = time.monotonic() - started
+
+        response_headers = [
+            (name, value) for name, value in response.headers.items()
+            if name.lower() not in _DROPPED_RESPONSE_HEADERS
+        ]
+        stored_body = _scrub_body(scrubbed_url, body)
+        body_hash = hashlib.sha1(stored_body).hexdigest()
+        self.cassette.record(key, scrubbed_url, RecordedResponse(response.status_code, response_headers, body_hash, elapsed), stored_body)
+        return httpx.Response(response.status_code, headers=response_headers, content=body, request=httpx.Request(method, url))
+
+    async def _replay(self, key: str, scrubbed_url: str, method: str) -> httpx.Response:
+        recorded, occurrence = self.cassette.next_response(key)
+        if recorded is None:
+            raise CassetteMissError(f"No recorded response for {key}")
+
+        delay = recorded.elapsed * self.latency_scale + self.extra_latency_seconds
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        request = httpx.Request(method, scrubbed_url)
+        if self.error_rate > 0 and not scrubbed_url.startswith(GOOGLE_TOKEN_URL):
+            # Decided per request and occurrence, so concurrency does not change which calls fail
+            rng = random.Random(f"{self.seed}:{key}:{occurrence}")
+            if rng.random() < self.error_rate:
+                status_code, error_body = _INJECTED_ERRORS[rng.randrange(len(_INJECTED_ERRORS))]
+                self.cassette.count_injected_error()
+                return httpx.Response(
+                    status_code,
+                    headers=[("content-type", "application/json")],
+                    content=json.dumps(error_body).encode(),
+                    request=request
+                )
+
+        return httpx.Response(
+            recorded.status_code,
+            headers=recorded.headers,
+            content=self.cassette.body(recorded.body_hash),
+            request=request
+        )
+
+
+_cassettes: Dict[str, DriveCassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: str = DRIVE_CASSETTE_PATH) -> DriveCassette:
+    """Get the process-wide cassette stored at a path, loading it on first use"""
+    path = os.path.abspath(path)
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None:
+            cassette = DriveCassette(path)
+            cassette.load()
+            _cassettes[path] = cassette
+        return cassette
+
+
+def wrap_drive_client(
+    client: Optional[httpx.AsyncClient],
+    mode: str = DRIVE_CASSETTE_MODE,
+    path: str = DRIVE_CASSETTE_PATH,
+    **options
+):
+    """
+    Wrap a Drive client in a cassette when a cassette mode is set
+
+    Args:
+        client: Real pooled client (closed by the cassette client); unused when replaying
+        mode: "record", "replay" or "" to return `client` unchanged
+        path: Cassette archive path
+        **options: Replay options of CassetteClient (latency and error injection)
+
+    Returns:
+        `client` itself, or a CassetteClient
+    """
+    if not mode:
+        return client
+    return CassetteClient(get_cassette(path), mode, client=client if mode == "record" else None, **options)
+
+
+def get_cassette_stats() -> Dict[str, Dict[str, int]]:
+    """Get counters of every loaded cassette, keyed by path"""
+    with _cassettes_lock:
+        cassettes = list(_cassettes.items())
+    return {path: cassette.get_stats() for path, cassette in cassettes}
@@ -0,0 +1,139 @@
+"""
+Process-wide budget of bytes downloaded from Google Drive at once
+"""
+import asyncio
+import os
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Tuple
+
+# Bytes of file content that may be in flight at once across every job of the process
+DRIVE_DOWNLOAD_BUDGET_BYTES = int(os.environ.get("DRIVE_DOWNLOAD_BUDGET_BYTES") or 256 * 1024 * 1024)
+
+_Waiter = Tuple[asyncio.AbstractEventLoop, asyncio.Future, int]
+
+
+def _grant(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class DownloadBudget:
+    """
+    Byte-counting semaphore shared by every download of the process
+
+    A download reserves the bytes it is about to hold before it starts and
+    gives them back once its content is decoded, so overlapping large
+    downloads wait for each other instead of piling up in memory. Waiters are
+    served in arrival order, so a large file is not starved by small ones; a
+    reservation larger than the whole budget is clamped to it and runs alone.
+
+    Processor threads each run their own event loop, so the state is guarded
+    by a thread lock and waiters are woken through the loop they wait on.
+    """
+
+    def __init__(self, max_bytes: int = DRIVE_DOWNLOAD_BUDGET_BYTES):
+        self.max_bytes = max(1, max_bytes)
+        self.in_flight = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.reservations = 0
+        self.waited = 0
+        self.peak_bytes = 0
+
+    def _take(self, nbytes: int):
+        self.in_flight += nbytes
+        self.reservations += 1
+        self.peak_bytes = max(self.peak_bytes, self.in_flight)
+
+    def _wake_waiters(self):
+        """Grant queued reservations that now fit, in arrival order (lock held)"""
+        while self._waiters:
+            loop, future, nbytes = self._waiters[0]
+            if loop.is_closed():
+                # The processor that was waiting has stopped
+                self._waiters.popleft()
+                continue
+            if self.in_flight + nbytes > self.max_bytes:
+                return
+            self._waiters.popleft()
+            self._take(nbytes)
+            loop.call_soon_threadsafe(_grant, future)
+
+    async def acquire(self, nbytes: int) -> int:
+        """
+        Wait until `nbytes` fit in the budget and reserve them
+
+        Returns:
+            Bytes actually reserved, to be passed to `release`
+        """
+        nbytes = min(max(0, int(nbytes or 0)), self.max_bytes)
+        if nbytes == 0:
+            return 0
+
+        with self._lock:
+            if not self._waiters and self.in_flight + nbytes <= self.max_bytes:
+                self._take(nbytes)
+                return nbytes
+            loop = asyncio.get_event_loop()
+            waiter = (loop, loop.create_future(), nbytes)
+            self._waiters.append(waiter)
+            self.waited += 1
+
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    self._wake_waiters()
+                    raise
+            # The bytes were granted while the download was being cancelled
+            self.release(nbytes)
+            raise
+        return nbytes
+
+    def release(self, nbytes: int):
+        """Give back bytes reserved with `acquire`"""
+        if nbytes <= 0:
+            return
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - nbytes)
+            self._wake_waiters()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int):
+        """Hold `nbytes` of the budget for the duration of the block"""
+        reserved = await self.acquire(nbytes)
+        try:
+            yield reserved
+        finally:
+            self.release(reserved)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get budget usage and counters"""
+        with self._lock:
+            return {
+                "budget_bytes": self.max_bytes,
+                "in_flight_bytes": self.in_flight,
+                "peak_bytes": self.peak_bytes,
+                "waiting": len(self._waiters),
+                "reservations": self.reservations,
+                "waited": self.waited
+            }
+
+
+_budget = DownloadBudget()
+
+
+def get_download_budget() -> DownloadBudget:
+    """Get the process-wide download budget"""
+    return _budget
+
+
+def get_download_budget_stats() -> Dict[str, int]:
+    """Get usage of the process-wide download budget"""
+    return _budget.get_stats()
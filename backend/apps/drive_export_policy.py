@@ -0,0 +1,120 @@
+"""
+Export format policy for Google Workspace files
+"""
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+# Export formats tried, in order, for each Google Workspace type. An empty
+# tuple means the type has no useful text (drawings, forms) and is never exported.
+# Sheets export as CSV (first sheet only); text/plain is not offered for them.
+GOOGLE_EXPORT_FORMATS: Dict[str, Tuple[str, ...]] = {
+    'application/vnd.google-apps.document': ('text/plain',),
+    'application/vnd.google-apps.spreadsheet': ('text/csv', 'text/tab-separated-values'),
+    'application/vnd.google-apps.presentation': ('text/plain',),
+    'application/vnd.google-apps.drawing': (),
+    'application/vnd.google-apps.form': (),
+}
+
+# Exports are cut off past this size; enough bytes for the ~1M characters stored
+# per file even in multi-byte UTF-8 (Drive itself refuses exports over 10MB)
+DRIVE_EXPORT_MAX_BYTES = int(os.environ.get("DRIVE_EXPORT_MAX_BYTES") or 4 * 1024 * 1024)
+
+_DEFAULT_EXPORT_FORMATS = ('text/plain',)
+
+# Drive error reasons (besides any HTTP 400, e.g. an unsupported conversion) that
+# reject one export format, so the next format is worth trying
+EXPORT_FORMAT_ERROR_REASONS = frozenset({"exportSizeLimitExceeded"})
+
+
+class DriveExportPolicy:
+    """
+    Chooses the export format of each Google Workspace type
+
+    The format that last exported a type successfully is remembered and tried
+    first for the next file of that type, so a format Drive rejects costs one
+    round trip per process instead of one per file.
+    """
+
+    def __init__(self, formats: Optional[Dict[str, Tuple[str, ...]]] = None):
+        self.formats = dict(GOOGLE_EXPORT_FORMATS if formats is None else formats)
+        self._preferred: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.exports = 0
+        self.skipped = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.truncated = 0
+
+    def is_exportable(self, mime_type: str) -> bool:
+        """Whether files of this Workspace type are exported at all"""
+        return bool(self.formats.get(mime_type, _DEFAULT_EXPORT_FORMATS))
+
+    def candidates(self, mime_type: str) -> Tuple[str, ...]:
+        """Export formats to try for a type, the last one that worked first"""
+        formats = self.formats.get(mime_type, _DEFAULT_EXPORT_FORMATS)
+        with self._lock:
+            preferred = self._preferred.get(mime_type)
+        if preferred is None or preferred not in formats:
+            return formats
+        return (preferred,) + tuple(f for f in formats if f != preferred)
+
+    def record_success(self, mime_type: str, export_format: str, truncated: bool = False):
+        """Remember the format that exported a file of this type"""
+        with self._lock:
+            self._preferred[mime_type] = export_format
+            self.exports += 1
+            if truncated:
+                self.truncated += 1
+
+    def record_fallback(self):
+        """Count a format that failed and was followed by another attempt"""
+        with self._lock:
+            self.fallbacks += 1
+
+    def record_failure(self):
+        """Count a file no format could export"""
+        with self._lock:
+            self.failures += 1
+
+    def record_skipped(self):
+        """Count a file whose type is not exported"""
+        with self._lock:
+            self.skipped += 1
+
+    def get_stats(self) -> Dict[str, object]:
+        """Get policy counters and the format chosen per type"""
+        with self._lock:
+            return {
+                "exports": self.exports,
+                "skipped": self.skipped,
+                "fallbacks": self.fallbacks,
+                "failures": self.failures,
+                "truncated": self.truncated,
+                "formats": dict(self._preferred)
+            }
+
+
+def is_export_format_error(status_code: int, body: Optional[Dict]) -> bool:
+    """Check whether a failed export was rejected for its format rather than for the file or the caller"""
+    if status_code == 400:
+        return True
+    if not isinstance(body, dict):
+        return False
+    errors = (body.get("error") or {}).get("errors") or []
+    return any(error.get("reason") in EXPORT_FORMAT_ERROR_REASONS for error in errors)
+
+
+_policy = DriveExportPolicy()
+
+
+def get_export_policy() -> DriveExportPolicy:
+    """Get the process-wide export policy"""
+    return _policy
+
+
+def get_export_policy_stats() -> Dict[str, object]:
+    """Get counters of the process-wide export policy"""
+    return _policy.get_stats()
@@ -0,0 +1,145 @@
+"""
+In-process cache of Google Drive file metadata with ETag revalidation
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Entries are served without any Drive call for this long, then revalidated with If-None-Match
+DRIVE_METADATA_CACHE_TTL_SECONDS = float(os.environ.get("DRIVE_METADATA_CACHE_TTL_SECONDS") or 60)
+DRIVE_METADATA_CACHE_MAX_ENTRIES = int(os.environ.get("DRIVE_METADATA_CACHE_MAX_ENTRIES") or 1024)
+
+CacheKey = Tuple[str, str, str]
+
+
+class CachedMetadata:
+    """A cached Drive file resource and the ETag it was served with"""
+
+    __slots__ = ("data", "etag", "expires_at")
+
+    def __init__(self, data: Dict[str, Any], etag: Optional[str], expires_at: float):
+        self.data = data
+        self.etag = etag
+        self.expires_at = expires_at
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.expires_at
+
+
+class DriveMetadataCache:
+    """
+    LRU cache of Drive file resources with a time-to-live
+
+    Keys are (subject, file id, field mask): the subject identifies whose
+    credentials fetched the entry, so one user's access is never answered from
+    another user's entry. Expired entries keep their ETag so the next fetch
+    can be a conditional request answered with 304 Not Modified.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DRIVE_METADATA_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = DRIVE_METADATA_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[CacheKey, CachedMetadata]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def lookup(self, key: CacheKey) -> Optional[CachedMetadata]:
+        """
+        Get the entry for a key, fresh or expired
+
+        Fresh entries count as hits; expired or missing entries count as misses.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.is_fresh(now):
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            return entry
+
+    def get_fresh(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        """
+        Get the data of a fresh entry, or None
+
+        Lets callers answer from the cache before setting up any HTTP client;
+        only hits are counted, the miss is counted by the `lookup` that follows.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.is_fresh(now):
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.data
+
+    def store(self, key: CacheKey, data: Dict[str, Any], etag: Optional[str] = None):
+        """Store a freshly fetched resource"""
+        with self._lock:
+            self._entries[key] = CachedMetadata(data, etag, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def mark_revalidated(self, key: CacheKey) -> Optional[CachedMetadata]:
+        """Extend the life of an entry after Drive answered 304 Not Modified"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires_at = time.monotonic() + self.ttl_seconds
+                self.revalidated += 1
+            return entry
+
+    def invalidate(self, key: CacheKey):
+        """Drop an entry, e.g. after Drive reported the file gone or inaccessible"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+def token_subject(access_token: str) -> str:
+    """Cache subject for a token when the caller does not know the user, so raw tokens are never kept"""
+    return "token:" + hashlib.sha256(access_token.encode()).hexdigest()[:16]
+
+
+_cache = DriveMetadataCache()
+
+
+def get_metadata_cache() -> DriveMetadataCache:
+    """Get the process-wide metadata cache"""
+    return _cache
+
+
+def get_metadata_cache_stats() -> Dict[str, float]:
+    """Get counters of the process-wide metadata cache"""
+    return _cache.get_stats()
@@ -0,0 +1,205 @@
+"""
+Adaptive rate limiting for Google Drive API calls
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Token bucket settings (requests per second, per access token)
+DRIVE_RATE_LIMIT_PER_SECOND = float(os.environ.get("DRIVE_RATE_LIMIT_PER_SECOND") or 10)
+DRIVE_RATE_LIMIT_MIN_PER_SECOND = float(os.environ.get("DRIVE_RATE_LIMIT_MIN_PER_SECOND") or 1)
+DRIVE_RATE_LIMIT_MAX_PER_SECOND = float(os.environ.get("DRIVE_RATE_LIMIT_MAX_PER_SECOND") or 50)
+DRIVE_RATE_LIMIT_BURST = float(os.environ.get("DRIVE_RATE_LIMIT_BURST") or 10)
+
+# Retry settings for throttled or transiently failing calls
+DRIVE_MAX_RETRIES = int(os.environ.get("DRIVE_MAX_RETRIES") or 5)
+DRIVE_BACKOFF_BASE_SECONDS = float(os.environ.get("DRIVE_BACKOFF_BASE_SECONDS") or 1)
+DRIVE_BACKOFF_MAX_SECONDS = float(os.environ.get("DRIVE_BACKOFF_MAX_SECONDS") or 64)
+
+# 403 reasons that mean "slow down" rather than "forbidden"
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+# Status codes worth retrying with backoff
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Upper bound of limiters kept in the per-token registry
+_MAX_LIMITERS = 256
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket that adapts its refill rate to Drive throttling responses
+
+    The rate grows additively on every successful call and is halved on every
+    throttled one (AIMD), so sustained throughput settles just under the quota
+    ceiling. A Retry-After value pauses every caller sharing the bucket.
+    """
+
+    def __init__(
+        self,
+        rate: float = DRIVE_RATE_LIMIT_PER_SECOND,
+        burst: float = DRIVE_RATE_LIMIT_BURST,
+        min_rate: float = DRIVE_RATE_LIMIT_MIN_PER_SECOND,
+        max_rate: float = DRIVE_RATE_LIMIT_MAX_PER_SECOND,
+        increase_step: float = 0.1,
+    ):
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, min_rate)
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        self.burst = max(1.0, burst)
+        self.increase_step = increase_step
+
+        # threading.Lock (not asyncio.Lock): limiters are shared by event loops
+        # running in different threads (API and job processor)
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+
+        # Counters
+        self.requests = 0
+        self.throttled = 0
+        self.retried = 0
+        self.failed = 0
+
+    def _refill(self, now: float):
+        """Add tokens for the time elapsed since the last refill"""
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._last_refill = now
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self.requests += 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        """Additive increase after a successful call"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        """Multiplicative decrease after a throttled call, honouring Retry-After"""
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+        logger.warning(f"🐢 Drive API throttled, rate lowered to {self.rate:.1f} req/s" + (f", pausing {retry_after:.1f}s" if retry_after else ""))
+
+    def on_retry(self):
+        """Count a call that is about to be retried"""
+        with self._lock:
+            self.retried += 1
+
+    def on_give_up(self):
+        """Count a call that failed after exhausting its retries"""
+        with self._lock:
+            self.failed += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get limiter counters and current rate"""
+        with self._lock:
+            return {
+                "current_rate": round(self.rate, 2),
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "retried": self.retried,
+                "failed": self.failed
+            }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header (delta-seconds or HTTP-date)
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(
+    attempt: int,
+    base: float = DRIVE_BACKOFF_BASE_SECONDS,
+    cap: float = DRIVE_BACKOFF_MAX_SECONDS,
+) -> float:
+    """Exponential backoff with full jitter for the given (0-based) attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def is_rate_limit_error(status_code: int, body: Optional[Dict]) -> bool:
+    """Check whether a Drive error response means the caller is being throttled"""
+    if status_code == 429:
+        return True
+    if status_code != 403 or not isinstance(body, dict):
+        return False
+    errors = (body.get("error") or {}).get("errors") or []
+    return any(error.get("reason") in RATE_LIMIT_REASONS for error in errors)
+
+
+# Per-token registry
+_limiters: "OrderedDict[str, AdaptiveRateLimiter]" = OrderedDict()
+_limiters_lock = threading.Lock()
+
+
+def _token_key(access_token: str) -> str:
+    """Registry key for a token, so raw tokens are never kept as keys"""
+    return hashlib.sha256(access_token.encode()).hexdigest()[:16]
+
+
+def get_rate_limiter(access_token: str) -> AdaptiveRateLimiter:
+    """Get the shared rate limiter for an access token"""
+    key = _token_key(access_token)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter()
+            _limiters[key] = limiter
+            while len(_limiters) > _MAX_LIMITERS:
+                _limiters.popitem(last=False)
+        else:
+            _limiters.move_to_end(key)
+        return limiter
+
+
+def get_rate_limiter_stats() -> Dict[str, Dict[str, float]]:
+    """Get counters of every registered limiter, keyed by token hash prefix"""
+    with _limiters_lock:
+        limiters = list(_limiters.items())
+    return {key: limiter.get_stats() for key, limiter in limiters}
@@ -1,10 +1,66 @@
+import os
 import re
+import json
+import uuid
 import asyncio
+import logging
+import sys
+import tempfile
+import time
+from email.parser import BytesParser
+from urllib.parse import urlencode
 from typing import Optional, Tuple, List, Dict, Any
-from datetime import datetime
 
 import httpx
 
+try:
+    import orjson
+except ImportError:  # optional: faster parsing of large listing pages
+    orjson = None
+
+from apps.drive_rate_limiter import (
+    AdaptiveRateLimiter,
+    DRIVE_MAX_RETRIES,
+    RETRYABLE_STATUS_CODES,
+    backoff_delay,
+    get_rate_limiter,
+    is_rate_limit_error,
+    parse_retry_after,
+)
+from apps.drive_cassette import DRIVE_CASSETTE_MODE, wrap_drive_client
+from apps.drive_export_policy import DRIVE_EXPORT_MAX_BYTES, get_export_policy, is_export_format_error
+from apps.drive_metadata_cache import get_metadata_cache, token_subject
+from apps.google_token_manager import GoogleTokenManager
+
+logger = logging.getLogger(__name__)
+
+# Connection pool settings for the shared Drive HTTP client
+DRIVE_HTTP_MAX_CONNECTIONS = int(os.environ.get("DRIVE_HTTP_MAX_CONNECTIONS") or 20)
+DRIVE_HTTP_MAX_KEEPALIVE = int(os.environ.get("DRIVE_HTTP_MAX_KEEPALIVE") or 10)
+DRIVE_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("DRIVE_HTTP_KEEPALIVE_EXPIRY") or 60)
+DRIVE_HTTP2_ENABLED = (os.environ.get("DRIVE_HTTP2_ENABLED") or "true").lower() == "true"
+
+# Number of folder listings a scan keeps in flight at once
+DRIVE_SCAN_MAX_CONCURRENCY = int(os.environ.get("DRIVE_SCAN_MAX_CONCURRENCY") or 8)
+
+# Downloads are kept in memory up to this size, then spill to a temporary file
+DRIVE_SPOOL_MAX_MEMORY_BYTES = int(os.environ.get("DRIVE_SPOOL_MAX_MEMORY_BYTES") or 8 * 1024 * 1024)
+
+# Window fetched with HTTP Range requests from files too large to download whole
+DRIVE_PARTIAL_PREFIX_BYTES = int(os.environ.get("DRIVE_PARTIAL_PREFIX_BYTES") or 4 * 1024 * 1024)
+DRIVE_PARTIAL_SUFFIX_BYTES = int(os.environ.get("DRIVE_PARTIAL_SUFFIX_BYTES") or 0)
+
+# Listings first request only the fields needed to detect changes, then full
+# metadata is fetched for new or changed files only
+DRIVE_SCAN_TWO_PHASE = (os.environ.get("DRIVE_SCAN_TWO_PHASE") or "true").lower() == "true"
+
+# Drive batch endpoint; Drive accepts at most 100 calls per batch request
+DRIVE_BATCH_URL = "https://www.googleapis.com/batch/drive/v3"
+DRIVE_BATCH_MAX_SIZE = min(100, int(os.environ.get("DRIVE_BATCH_MAX_SIZE") or 100))
+
+# Folders fetched together with one OR'd `in parents` query, bounded by query length
+DRIVE_SCAN_MAX_PARENTS_PER_QUERY = int(os.environ.get("DRIVE_SCAN_MAX_PARENTS_PER_QUERY") or 40)
+DRIVE_QUERY_MAX_LENGTH = int(os.environ.get("DRIVE_QUERY_MAX_LENGTH") or 2000)
 
 _FOLDER_URL_PATTERNS = [
     re.compile(r"https?://drive\.google\.com/drive/folders/([a-zA-Z0-9_-]+)"),
@@ -47,6 +103,261 @@ FILE_EXTENSIONS = {
     'application/zip': 'zip',
 }
 
+# Field masks for file resources: everything we store, and just enough to detect changes
+FILE_FIELDS = "id,name,mimeType,size,modifiedTime,createdTime,parents,trashed,webViewLink,description,owners,lastModifyingUser,md5Checksum,headRevisionId,version,shortcutDetails"
+LEAN_FILE_FIELDS = "id,name,mimeType,md5Checksum,modifiedTime,parents,shortcutDetails"
+
+# MIME type prefixes whose partial content yields no searchable text
+PARTIAL_CONTENT_EXCLUDED_PREFIXES = ('video/', 'audio/', 'image/', 'application/zip')
+
+
+
+def json_loads(content: bytes) -> Any:
+    """Parse a JSON response body, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def format_file_size(size_bytes: int) -> str:
+    """Format file size in human readable format"""
+    if size_bytes == 0:
+        return "0 B"
+    
+    size_names = ["B", "KB", "MB", "GB", "TB"]
+    i = 0
+    while size_bytes >= 1024 and i < len(size_names) - 1:
+        size_bytes /= 1024.0
+        i += 1
+    
+    return f"{size_bytes:.1f} {size_names[i]}"
+
+
+def get_file_type(mime_type: str) -> str:
+    """Get file type from MIME type"""
+    if mime_type in GOOGLE_DOC_TYPES:
+        return GOOGLE_DOC_TYPES[mime_type]
+    elif mime_type in FOLDER_TYPES:
+        return FOLDER_TYPES[mime_type]
+    elif mime_type in SHORTCUT_TYPES:
+        return SHORTCUT_TYPES[mime_type]
+    elif mime_type in FILE_EXTENSIONS:
+        return FILE_EXTENSIONS[mime_type]
+    else:
+        return mime_type.split('/')[-1] if '/' in mime_type else 'unknown'
+
+
+def _compact_json(value: Any) -> Optional[str]:
+    """Serialize a small JSON value compactly and intern it, or None when empty"""
+    if not value:
+        return None
+    return sys.intern(json.dumps(value, separators=(",", ":"), sort_keys=True))
+
+
+class DriveDownloadError(Exception):
+    """Drive answered a download or export with an error that retrying will not fix"""
+    
+    def __init__(self, status_code: int, body: Optional[Dict] = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.body = body
+
+
+class DriveFileMeta:
+    """
+    Compact record of a scanned Drive file
+    
+    Scans hold one record per file, so it keeps only what Drive sent: no
+    per-instance dict, repeated strings (MIME types, parent IDs) interned, and
+    file_type, size_formatted, is_google_doc and downloadable derived on
+    access. Owners and last modifying user are kept as interned compact JSON,
+    the form they are stored in, so files sharing an owner share one string.
+    Item access (`meta["name"]`, `meta.get("size", 0)`) and `to_dict()` keep
+    code written against the old metadata dictionaries working.
+    """
+    
+    __slots__ = (
+        "id", "name", "mime_type", "size", "modified_time", "created_time",
+        "parents", "trashed", "web_view_link", "description", "owners_json",
+        "last_modifying_user_json", "md5_checksum", "head_revision_id", "version",
+        "shortcut_target_id", "folder_path", "folder_id_path",
+    )
+    
+    DERIVED_FIELDS = ("file_type", "size_formatted", "is_google_doc", "downloadable", "owners", "last_modifying_user", "path")
+    
+    def __init__(
+        self,
+        id: str,
+        name: Optional[str] = None,
+        mime_type: str = "",
+        size: int = 0,
+        modified_time: Optional[str] = None,
+        created_time: Optional[str] = None,
+        parents: Tuple[str, ...] = (),
+        trashed: bool = False,
+        web_view_link: Optional[str] = None,
+        description: Optional[str] = None,
+        owners_json: Optional[str] = None,
+        last_modifying_user_json: Optional[str] = None,
+        md5_checksum: Optional[str] = None,
+        head_revision_id: Optional[str] = None,
+        version: Optional[int] = None,
+        shortcut_target_id: Optional[str] = None,
+        folder_path: Optional[str] = None,
+        folder_id_path: Optional[str] = None,
+    ):
+        self.id = id
+        self.name = name
+        self.mime_type = mime_type
+        self.size = size
+        self.modified_time = modified_time
+        self.created_time = created_time
+        self.parents = parents
+        self.trashed = trashed
+        self.web_view_link = web_view_link
+        self.description = description
+        self.owners_json = owners_json
+        self.last_modifying_user_json = last_modifying_user_json
+        self.md5_checksum = md5_checksum
+        self.head_revision_id = head_revision_id
+        self.version = version
+        self.shortcut_target_id = shortcut_target_id
+        self.folder_path = folder_path
+        self.folder_id_path = folder_id_path
+    
+    @classmethod
+    def from_api(cls, file: Dict) -> "DriveFileMeta":
+        """Build a record straight from a raw Drive API file resource"""
+        get = file.get
+        shortcut = get("shortcutDetails")
+        version = get("version")
+        return cls(
+            get("id"),
+            get("name"),
+            sys.intern(get("mimeType") or ""),
+            int(get("size") or 0),
+            get("modifiedTime"),
+            get("createdTime"),
+            tuple(sys.intern(parent) for parent in get("parents") or ()),
+            get("trashed", False),
+            get("webViewLink"),
+            get("description"),
+            _compact_json(get("owners")),
+            _compact_json(get("lastModifyingUser")),
+            get("md5Checksum"),
+            get("headRevisionId"),
+            int(version) if version else None,
+            shortcut.get("targetId") if shortcut else None,
+        )
+    
+    @property
+    def file_type(self) -> str:
+        return get_file_type(self.mime_type)
+    
+    @property
+    def size_formatted(self) -> str:
+        return format_file_size(self.size)
+    
+    @property
+    def path(self) -> Optional[str]:
+        """Folder names down to the file, e.g. "/Reports/2024/file.pdf" (shares the parent's folder path)"""
+        if self.folder_path is None:
+            return None
+        return f"{self.folder_path}/{self.name or ''}"
+    
+    @property
+    def owners(self) -> List[Dict]:
+        return json.loads(self.owners_json) if self.owners_json else []
+    
+    @property
+    def last_modifying_user(self) -> Optional[Dict]:
+        return json.loads(self.last_modifying_user_json) if self.last_modifying_user_json else None
+    
+    @property
+    def is_google_doc(self) -> bool:
+        return self.mime_type in GOOGLE_DOC_TYPES
+    
+    @property
+    def downloadable(self) -> bool:
+        return self.mime_type not in GOOGLE_DOC_TYPES
+    
+    def copy(self, **changes) -> "DriveFileMeta":
+        """Copy the record, replacing some fields"""
+        values = {field: getattr(self, field) for field in self.__slots__}
+        values.update(changes)
+        return DriveFileMeta(**values)
+    
+    def keys(self) -> Tuple[str, ...]:
+        return self.__slots__ + self.DERIVED_FIELDS
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__ or key in self.DERIVED_FIELDS
+    
+    def __getitem__(self, key: str) -> Any:
+        if key not in self:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __setitem__(self, key: str, value: Any):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self else default
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Metadata dictionary with every stored and derived field"""
+        return {key: getattr(self, key) for key in self.keys()}
+    
+    def __repr__(self) -> str:
+        return f"DriveFileMeta(id={self.id!r}, name={self.name!r}, mime_type={self.mime_type!r})"
+
+
+def create_drive_client(
+    max_connections: int = DRIVE_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections: int = DRIVE_HTTP_MAX_KEEPALIVE,
+    keepalive_expiry: float = DRIVE_HTTP_KEEPALIVE_EXPIRY,
+    http2: bool = DRIVE_HTTP2_ENABLED,
+    timeout: float = 30,
+) -> httpx.AsyncClient:
+    """
+    Create a pooled, keep-alive HTTP client for the Google Drive API
+
+    The client is meant to be long-lived and shared by every scanner created by
+    the same owner (e.g. a JobQueueProcessor), so TCP+TLS handshakes are paid
+    once per connection instead of once per request.
+
+    Args:
+        max_connections: Maximum number of concurrent connections
+        max_keepalive_connections: Maximum number of idle connections kept open
+        keepalive_expiry: Seconds an idle connection is kept open
+        http2: Whether to negotiate HTTP/2 (requires the `h2` package)
+        timeout: Default request timeout in seconds
+
+    With DRIVE_CASSETTE_MODE set, the client is wrapped in a cassette that
+    records its traffic or replays it offline (see `apps.drive_cassette`).
+
+    Returns:
+        httpx.AsyncClient ready to be shared; the owner must call `aclose()`
+    """
+    if DRIVE_CASSETTE_MODE == "replay":
+        return wrap_drive_client(None)
+
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("h2 package not installed, falling back to HTTP/1.1 for Drive client")
+            http2 = False
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    return wrap_drive_client(httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout))
+
 
 def extract_folder_id(link_or_id: str) -> Optional[str]:
     text = link_or_id.strip()
@@ -57,56 +368,125 @@ def extract_folder_id(link_or_id: str) -> Optional[str]:
     return None
 
 
-async def validate_folder_access(access_token: str, folder_id: str) -> Tuple[bool, Optional[str]]:
+def metadata_cache_key(access_token: str, file_id: str, fields: str, subject: Optional[str] = None) -> Tuple[str, str, str]:
+    """Key of a file resource in the shared metadata cache"""
+    return (subject or token_subject(access_token), file_id, fields)
+
+
+async def validate_folder_access(
+    access_token: str,
+    folder_id: str,
+    client: Optional[httpx.AsyncClient] = None,
+    subject: Optional[str] = None,
+) -> Tuple[bool, Optional[str]]:
     """
     Validates the existence and readability of a Google Drive folder using the user's OAuth access token.
+    Uses the given pooled client when provided, otherwise a short-lived one.
+    Repeated checks of the same folder by the same subject are answered from the metadata cache.
     Returns (ok, folder_name).
     """
-    headers = {"Authorization": f"Bearer {access_token}"}
-    params = {"fields": "id,name,mimeType", "supportsAllDrives": "true"}
-    url = f"https://www.googleapis.com/drive/v3/files/{folder_id}"
-    async with httpx.AsyncClient(timeout=10) as client:
-        resp = await client.get(url, headers=headers, params=params)
-    if resp.status_code == 200:
-        data = resp.json()
-        if data.get("mimeType") == "application/vnd.google-apps.folder":
-            return True, data.get("name")
+    fields = "id,name,mimeType"
+    data = get_metadata_cache().get_fresh(metadata_cache_key(access_token, folder_id, fields, subject))
+    if data is None:
+        scanner = GoogleDriveScanner(access_token, client=client)
+        try:
+            data = await scanner.get_file_resource(folder_id, fields, subject)
+        except Exception:
+            return False, None
+        finally:
+            await scanner.aclose()
+    if data and data.get("mimeType") == "application/vnd.google-apps.folder":
+        return True, data.get("name")
     return False, None
 
 
 class GoogleDriveScanner:
     """Scanner for Google Drive folders and files"""
     
-    def __init__(self, access_token: str):
+    def __init__(
+        self,
+        access_token: str,
+        client: Optional[httpx.AsyncClient] = None,
+        max_concurrency: int = DRIVE_SCAN_MAX_CONCURRENCY,
+        max_parents_per_query: int = DRIVE_SCAN_MAX_PARENTS_PER_QUERY,
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+        max_retries: int = DRIVE_MAX_RETRIES,
+        spool_max_memory: int = DRIVE_SPOOL_MAX_MEMORY_BYTES,
+        token_manager: Optional[GoogleTokenManager] = None,
+    ):
+        """
+        Args:
+            access_token: OAuth2 access token
+            client: Shared pooled client (see `create_drive_client`). When omitted
+                the scanner creates its own and closes it in `aclose()`.
+            max_concurrency: Max folder listings in flight during a scan
+            max_parents_per_query: Max folders listed together by one files.list query
+            rate_limiter: Rate limiter to use (defaults to the one shared by this token)
+            max_retries: Retries for throttled, timed out or 5xx calls
+            spool_max_memory: Bytes of a download kept in memory before spilling to disk
+            token_manager: Refreshes the access token before it expires and after a 401;
+                without it the token is used as given
+        """
+        self.max_concurrency = max_concurrency
+        self.max_parents_per_query = max(1, max_parents_per_query)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter(access_token)
+        self.max_retries = max_retries
+        self.spool_max_memory = spool_max_memory
+        self.token_manager = token_manager
+        self.set_access_token(access_token)
+        self.base_url = "https://www.googleapis.com/drive/v3"
+        self._owns_client = client is None
+        self.client = client if client is not None else create_drive_client()
+    
+    def set_access_token(self, access_token: str):
+        """Use a new access token for the next requests; scans in progress carry on with it"""
         self.access_token = access_token
         self.headers = {"Authorization": f"Bearer {access_token}"}
-        self.base_url = "https://www.googleapis.com/drive/v3"
+    
+    async def _auth_headers(self, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Request headers with a valid token, swapping in a refreshed one when the manager has it"""
+        if self.token_manager is not None:
+            access_token = await self.token_manager.get_access_token()
+            if access_token != self.access_token:
+                self.set_access_token(access_token)
+        return {**self.headers, **extra} if extra else self.headers
+    
+    async def _reauthorize(self, rejected_token: str) -> bool:
+        """
+        Recover from a 401 by switching to a refreshed token
+        
+        Returns:
+            True if the request should be sent again with the new token
+        """
+        if self.token_manager is None:
+            return False
+        try:
+            refreshed = await self.token_manager.invalidate(rejected_token)
+        except Exception as e:
+            logger.warning(f"Could not refresh Google access token: {str(e)}")
+            return False
+        if refreshed:
+            self.set_access_token(self.token_manager.access_token)
+        return refreshed
+    
+    async def aclose(self):
+        """Close the HTTP client if this scanner owns it (shared clients are left open)"""
+        if self._owns_client:
+            await self.client.aclose()
+    
+    async def __aenter__(self) -> "GoogleDriveScanner":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
     
     def _format_file_size(self, size_bytes: int) -> str:
         """Format file size in human readable format"""
-        if size_bytes == 0:
-            return "0 B"
-        
-        size_names = ["B", "KB", "MB", "GB", "TB"]
-        i = 0
-        while size_bytes >= 1024 and i < len(size_names) - 1:
-            size_bytes /= 1024.0
-            i += 1
-        
-        return f"{size_bytes:.1f} {size_names[i]}"
+        return format_file_size(size_bytes)
     
     def _get_file_type(self, mime_type: str) -> str:
         """Get file type from MIME type"""
-        if mime_type in GOOGLE_DOC_TYPES:
-            return GOOGLE_DOC_TYPES[mime_type]
-        elif mime_type in FOLDER_TYPES:
-            return FOLDER_TYPES[mime_type]
-        elif mime_type in SHORTCUT_TYPES:
-            return SHORTCUT_TYPES[mime_type]
-        elif mime_type in FILE_EXTENSIONS:
-            return FILE_EXTENSIONS[mime_type]
-        else:
-            return mime_type.split('/')[-1] if '/' in mime_type else 'unknown'
+        return get_file_type(mime_type)
     
     def _is_google_doc(self, mime_type: str) -> bool:
         """Check if file is a Google Workspace document"""
@@ -116,16 +496,91 @@ class GoogleDriveScanner:
         """Check if file can be downloaded directly"""
         return mime_type not in GOOGLE_DOC_TYPES
     
+    def _error_body(self, response: httpx.Response) -> Optional[Dict]:
+        """Parse a Drive error response body, if it is JSON"""
+        try:
+            return response.json()
+        except ValueError:
+            return None
+    
+    def _retry_delay(self, response: httpx.Response, attempt: int) -> Optional[float]:
+        """
+        Decide whether a failed response should be retried
+        
+        Throttling responses (429, 403 rateLimitExceeded/userRateLimitExceeded)
+        slow down the shared rate limiter; they and transient 5xx errors are
+        retried after Retry-After, or jittered exponential backoff without it.
+        
+        Returns:
+            Seconds to wait before retrying, or None if the call must fail
+        """
+        throttled = is_rate_limit_error(response.status_code, self._error_body(response))
+        if not throttled and response.status_code not in RETRYABLE_STATUS_CODES:
+            return None
+        
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if throttled:
+            self.rate_limiter.on_throttled(retry_after)
+        
+        if attempt >= self.max_retries:
+            self.rate_limiter.on_give_up()
+            return None
+        
+        self.rate_limiter.on_retry()
+        return retry_after if retry_after is not None else backoff_delay(attempt)
+    
     async def _make_request(self, url: str, params: Dict[str, Any] = None) -> Optional[Dict]:
-        """Make HTTP request to Google Drive API"""
+        """Make HTTP request to Google Drive API, retrying throttled and transient failures"""
+        response = await self._request(url, params)
+        return json_loads(response.content)
+    
+    async def _request(self, url: str, params: Dict[str, Any] = None, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """
+        GET a Drive API URL, retrying throttled and transient failures
+        
+        Args:
+            url: Drive API URL
+            params: Query parameters
+            headers: Extra request headers (e.g. If-None-Match)
+        
+        Returns:
+            The 200 (or 304 Not Modified) response
+        """
+        reauthorized = False
         try:
-            async with httpx.AsyncClient(timeout=30) as client:
-                response = await client.get(url, headers=self.headers, params=params)
-                if response.status_code == 200:
-                    return response.json()
-                elif response.status_code == 401:
+            for attempt in range(self.max_retries + 1):
+                request_headers = await self._auth_headers(headers)
+                sent_token = self.access_token
+                await self.rate_limiter.acquire()
+                try:
+                    response = await self.client.get(url, headers=request_headers, params=params)
+                except httpx.TimeoutException:
+                    if attempt >= self.max_retries:
+                        self.rate_limiter.on_give_up()
+                        raise
+                    self.rate_limiter.on_retry()
+                    await asyncio.sleep(backoff_delay(attempt))
+                    continue
+                
+                if response.status_code in (200, 304):
+                    self.rate_limiter.on_success()
+                    return response
+                
+                if response.status_code == 401 and not reauthorized and await self._reauthorize(sent_token):
+                    reauthorized = True
+                    continue
+                
+                delay = self._retry_delay(response, attempt)
+                if delay is not None:
+                    logger.info(f"🔁 Drive API returned HTTP {response.status_code}, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                    await asyncio.sleep(delay)
+                    continue
+                
+                if response.status_code == 401:
                     raise Exception("Invalid or expired access token")
-                elif response.status_code == 403:
+                elif response.status_code in (403, 429):
+                    if is_rate_limit_error(response.status_code, self._error_body(response)):
+                        raise Exception("Rate limit exceeded after retries")
                     raise Exception("Insufficient permissions to access this resource")
                 else:
                     raise Exception(f"API request failed with status {response.status_code}")
@@ -134,36 +589,146 @@ class GoogleDriveScanner:
         except Exception as e:
             raise Exception(f"Request failed: {str(e)}")
     
-    async def scan_folder_recursive(self, folder_id: str = None, include_trashed: bool = False) -> List[Dict]:
+    async def _download(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        description: str,
+        byte_range: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        spool: Optional[tempfile.SpooledTemporaryFile] = None,
+        raise_errors: bool = False
+    ) -> Optional[tempfile.SpooledTemporaryFile]:
         """
-        Recursively scan a Google Drive folder and return all files
+        Stream a media or export response into a spooled temporary file
+        
+        The body is kept in memory up to `spool_max_memory` bytes and spills to
+        disk beyond that, so peak memory per download is bounded regardless of
+        file size. Throttling and retries work as in `_make_request`; timeouts
+        and transport errors while streaming are retried too, discarding the
+        bytes of the failed attempt.
         
         Args:
-            folder_id: ID of the folder to scan. If None, scans entire Drive
-            include_trashed: Whether to include trashed files
+            url: Drive API URL
+            params: Query parameters
+            description: What is being downloaded, for log messages
+            byte_range: Optional Range header value (e.g. "bytes=0-1023", "bytes=-1024")
+            max_bytes: Stop reading after this many bytes (guards against servers ignoring Range)
+            spool: Existing spool to append to instead of creating a new one
+            raise_errors: Raise DriveDownloadError for an HTTP error that is not retried,
+                so the caller can tell why it failed, instead of returning None
         
         Returns:
-            List of file metadata dictionaries
+            Spooled file positioned at offset 0 (the caller must close it), or None if failed
         """
-        all_files = []
-        page_token = None
+        extra_headers = {"Range": byte_range} if byte_range else None
+        reauthorized = False
+        # A failed attempt leaves an existing spool as it was handed in
+        start = spool.tell() if spool is not None else 0
+        
+        for attempt in range(self.max_retries + 1):
+            headers = await self._auth_headers(extra_headers)
+            sent_token = self.access_token
+            await self.rate_limiter.acquire()
+            try:
+                async with self.client.stream('GET', url, headers=headers, params=params, timeout=60) as response:
+                    if response.status_code in (200, 206):
+                        self.rate_limiter.on_success()
+                        
+                        target = spool if spool is not None else tempfile.SpooledTemporaryFile(max_size=self.spool_max_memory)
+                        remaining = max_bytes
+                        try:
+                            async for chunk in response.aiter_bytes():
+                                if remaining is not None:
+                                    chunk = chunk[:remaining]
+                                    remaining -= len(chunk)
+                                target.write(chunk)
+                                if remaining is not None and remaining <= 0:
+                                    break
+                        except BaseException:
+                            if spool is None:
+                                target.close()
+                            else:
+                                spool.seek(start)
+                                spool.truncate()
+                            raise
+                        target.seek(0)
+                        return target
+                    
+                    if response.status_code == 401 and not reauthorized and await self._reauthorize(sent_token):
+                        reauthorized = True
+                        continue
+                    
+                    # Error bodies are small; read them to find the error reason
+                    await response.aread()
+                    delay = self._retry_delay(response, attempt)
+                    if delay is None:
+                        logger.warning(f"Failed to {description}: HTTP {response.status_code}")
+                        if raise_errors:
+                            raise DriveDownloadError(response.status_code, self._error_body(response))
+                        return None
+                    failure = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                # Timeouts and dropped connections, before or while reading the body
+                if attempt >= self.max_retries:
+                    self.rate_limiter.on_give_up()
+                    logger.warning(f"Failed to {description}: {type(e).__name__}")
+                    return None
+                self.rate_limiter.on_retry()
+                delay = backoff_delay(attempt)
+                failure = type(e).__name__
+            
+            logger.info(f"🔁 Retrying {description} in {delay:.1f}s after {failure} (attempt {attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
         
-        # Build query parameters
-        query_parts = []
-        if folder_id:
-            query_parts.append(f"'{folder_id}' in parents")
+        return None
+    
+    def _build_file_metadata(self, file: Dict) -> DriveFileMeta:
+        """Convert a raw Drive API file resource into a file metadata record"""
+        return DriveFileMeta.from_api(file)
+    
+    def _build_parents_query(self, folder_ids: List[Optional[str]], include_trashed: bool) -> str:
+        """Build a files.list query matching the direct children of any of the given folders"""
+        if folder_ids == [None]:
+            parents_clause = "parents in 'root'"
         else:
-            query_parts.append("parents in 'root'")
+            parents_clause = " or ".join(f"'{folder_id}' in parents" for folder_id in folder_ids)
+            if len(folder_ids) > 1:
+                parents_clause = f"({parents_clause})"
         
+        query_parts = [parents_clause]
         if not include_trashed:
             query_parts.append("trashed = false")
         
-        query = " and ".join(query_parts)
+        return " and ".join(query_parts)
+    
+    async def _iter_folder_pages(
+        self,
+        folder_ids: List[Optional[str]],
+        include_trashed: bool,
+        file_fields: str = FILE_FIELDS
+    ):
+        """
+        List the direct children of one or more folders, one API page at a time
+        
+        Several folders are fetched with a single OR'd `in parents` query; the
+        caller demultiplexes the results with each file's `parents` field.
+        
+        Args:
+            folder_ids: IDs of the folders to list. [None] lists the Drive root
+            include_trashed: Whether to include trashed files
+            file_fields: Field mask of each file resource (must include id, mimeType and parents)
+        
+        Yields:
+            Lists of raw Drive API file resources
+        """
+        page_token = None
+        query = self._build_parents_query(folder_ids, include_trashed)
         
         while True:
             params = {
                 "q": query,
-                "fields": "nextPageToken,files(id,name,mimeType,size,modifiedTime,createdTime,parents,trashed,webViewLink,description,owners,lastModifyingUser,md5Checksum)",
+                "fields": f"nextPageToken,files({file_fields})",
                 "pageSize": 1000,
                 "supportsAllDrives": "true",
                 "includeItemsFromAllDrives": "true"
@@ -178,156 +743,784 @@ class GoogleDriveScanner:
             if not data:
                 break
             
-            files = data.get("files", [])
-            
-            for file in files:
-                # Process file metadata
-                file_metadata = {
-                    "id": file.get("id"),
-                    "name": file.get("name"),
-                    "mime_type": file.get("mimeType"),
-                    "file_type": self._get_file_type(file.get("mimeType", "")),
-                    "size": int(file.get("size", 0)),
-                    "size_formatted": self._format_file_size(int(file.get("size", 0))),
-                    "modified_time": file.get("modifiedTime"),
-                    "created_time": file.get("createdTime"),
-                    "parents": file.get("parents", []),
-                    "trashed": file.get("trashed", False),
-                    "web_view_link": file.get("webViewLink"),
-                    "description": file.get("description"),
-                    "owners": file.get("owners", []),
-                    "last_modifying_user": file.get("lastModifyingUser"),
-                    "md5_checksum": file.get("md5Checksum"),
-                    "is_google_doc": self._is_google_doc(file.get("mimeType", "")),
-                    "downloadable": self._is_downloadable(file.get("mimeType", ""))
-                }
-                
-                all_files.append(file_metadata)
-                
-                # If it's a folder, scan it recursively
-                if file.get("mimeType") == "application/vnd.google-apps.folder":
-                    folder_files = await self.scan_folder_recursive(file.get("id"), include_trashed)
-                    all_files.extend(folder_files)
+            yield data.get("files", [])
             
             page_token = data.get("nextPageToken")
             if not page_token:
                 break
+    
+    def _take_folder_batch(self, pending: asyncio.Queue, first: Tuple) -> List[Tuple]:
+        """
+        Drain queued folders to list together with `first` in one files.list call
+        
+        The batch stops at DRIVE_SCAN_MAX_PARENTS_PER_QUERY folders or when the
+        query would exceed DRIVE_QUERY_MAX_LENGTH; whatever is left in the
+        queue is picked up by the other workers. The Drive root (None) is only
+        ever the first item and is listed alone.
+        """
+        batch = [first]
+        if first[0] is None:
+            return batch
+        
+        query_length = len(self._build_parents_query([first[0]], False))
+        
+        while len(batch) < self.max_parents_per_query and not pending.empty():
+            item = pending.get_nowait()
+            clause_length = len(f" or '{item[0]}' in parents")
+            if query_length + clause_length + 2 > DRIVE_QUERY_MAX_LENGTH:
+                # Does not fit: hand it back for the next listing
+                pending.put_nowait(item)
+                pending.task_done()
+                break
+            batch.append(item)
+            query_length += clause_length
         
-        return all_files
+        return batch
     
-    async def get_file_content(self, file_id: str) -> Optional[bytes]:
+    async def _iter_keyed_pages(
+        self,
+        folder_id: Optional[str],
+        include_trashed: bool,
+        max_concurrency: Optional[int] = None,
+        max_buffered_pages: Optional[int] = None,
+        lean: bool = False,
+        base_path: str = "",
+        base_id_path: Optional[str] = None,
+    ):
+        """
+        Walk a folder tree breadth-first and yield listing pages as they arrive
+        
+        Folders are listed by a bounded pool of workers, so up to
+        `max_concurrency` folder listings are in flight at once. Pages are
+        handed over through a bounded buffer, so a slow consumer pauses the
+        listing instead of letting metadata pile up in memory.
+        
+        Every file is emitted at most once per scan, however many parents or
+        shortcuts reach it, and every folder is listed at most once (cycle
+        protection). Shortcuts are replaced by their targets (see
+        `resolve_shortcuts`); a target folder is walked like any subfolder.
+        
+        Each file is paired with a sort key (parent key + position in the parent
+        listing); sorting by it reproduces a sequential depth-first scan.
+        
+        With `lean`, files are listed with LEAN_FILE_FIELDS only, so their
+        metadata lacks size, owners and links (see `get_files_metadata`).
+        
+        Every file also gets its materialized paths: `path` (folder names from
+        the scanned folder, e.g. "/Reports/2024/file.pdf") and `folder_id_path`
+        (IDs of the folders above it, e.g. "/<root>/<reports>/<2024>/").
+        `base_path` and `base_id_path` are the paths of the scanned folder itself.
+        
+        Yields:
+            Lists of (sort_key, file_metadata) tuples, one list per API page
+        """
+        concurrency = max(1, max_concurrency or self.max_concurrency)
+        pending: asyncio.Queue = asyncio.Queue()
+        output: asyncio.Queue = asyncio.Queue(maxsize=max_buffered_pages or concurrency * 2)
+        # IDs of every file and folder emitted (or listed) so far
+        visited = {folder_id}
+        done = object()
+        file_fields = LEAN_FILE_FIELDS if lean else FILE_FIELDS
+        
+        root_id_path = base_id_path or f"/{folder_id or 'root'}/"
+        pending.put_nowait((folder_id, (), base_path, root_id_path))
+        
+        def emit(page: List[Tuple], file_key: Tuple, file_metadata: DriveFileMeta, parent_paths: Tuple[str, str]):
+            """Add a file to the page with its paths and queue it if it is a folder"""
+            file_metadata.folder_path, file_metadata.folder_id_path = parent_paths
+            page.append((file_key, file_metadata))
+            
+            if file_metadata.mime_type in FOLDER_TYPES:
+                pending.put_nowait((
+                    file_metadata.id,
+                    file_key,
+                    file_metadata.path,
+                    f"{file_metadata.folder_id_path}{file_metadata.id}/"
+                ))
+        
+        async def worker():
+            while True:
+                batch = self._take_folder_batch(pending, await pending.get())
+                try:
+                    folder_keys = {item[0]: item[1] for item in batch}
+                    folder_paths = {item[0]: (item[2], item[3]) for item in batch}
+                    next_index = {batch_folder_id: 0 for batch_folder_id in folder_keys}
+                    async for files in self._iter_folder_pages(list(folder_keys), include_trashed, file_fields):
+                        page = []
+                        shortcuts = []
+                        for file in files:
+                            # Demultiplex by parent; a file listed under several
+                            # batched folders is emitted under the first one
+                            if batch[0][0] is None:
+                                parent = None
+                            else:
+                                parent = next((parent for parent in file.get("parents", []) if parent in folder_keys), None)
+                                if parent is None:
+                                    continue
+                            file_key = folder_keys[parent] + (next_index[parent],)
+                            next_index[parent] += 1
+                            
+                            file_metadata = self._build_file_metadata(file)
+                            if file_metadata.mime_type in SHORTCUT_TYPES:
+                                shortcuts.append((file_key, file_metadata, folder_paths[parent]))
+                            elif file_metadata.id not in visited:
+                                visited.add(file_metadata.id)
+                                emit(page, file_key, file_metadata, folder_paths[parent])
+                        
+                        if shortcuts:
+                            targets = await self.resolve_shortcuts(
+                                [shortcut for _, shortcut, _ in shortcuts if shortcut.shortcut_target_id not in visited],
+                                include_trashed
+                            )
+                            for file_key, shortcut, parent_paths in shortcuts:
+                                target = targets.get(shortcut.shortcut_target_id)
+                                if target is not None and target.id not in visited:
+                                    visited.add(target.id)
+                                    emit(page, file_key, target, parent_paths)
+                        
+                        await output.put(page)
+                except Exception as e:
+                    await output.put(e)
+                finally:
+                    for _ in batch:
+                        pending.task_done()
+        
+        async def wait_until_listed():
+            await pending.join()
+            await output.put(done)
+        
+        tasks = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        tasks.append(asyncio.ensure_future(wait_until_listed()))
+        try:
+            while True:
+                item = await output.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.debug(f"Scan of {folder_id} finished after visiting {len(visited)} files and folders")
+    
+    async def iter_files(
+        self,
+        folder_id: str = None,
+        include_trashed: bool = False,
+        max_concurrency: Optional[int] = None,
+        max_buffered_pages: Optional[int] = None,
+        lean: bool = False,
+        base_path: str = "",
+        base_id_path: Optional[str] = None,
+    ):
+        """
+        Stream the files of a Google Drive folder tree, one listing page at a time
+        
+        Pages are yielded as soon as Drive returns them, so callers can start
+        processing files while the rest of the tree is still being listed.
+        Pages arrive in completion order, not depth-first order.
+        
+        Args:
+            folder_id: ID of the folder to scan. If None, scans entire Drive
+            include_trashed: Whether to include trashed files
+            max_concurrency: Max folder listings in flight (defaults to the scanner setting)
+            max_buffered_pages: Pages buffered ahead of the consumer before listing pauses
+            lean: List only id, name, mimeType, md5Checksum, modifiedTime and parents;
+                fetch the rest with `get_files_metadata` for the files that need it
+            base_path: Folder-name path of `folder_id` ("" for the program root)
+            base_id_path: Folder-ID path of `folder_id` (defaults to "/<folder_id>/")
+        
+        Yields:
+            Lists of DriveFileMeta records
+        """
+        async for page in self._iter_keyed_pages(folder_id, include_trashed, max_concurrency, max_buffered_pages, lean, base_path, base_id_path):
+            yield [file_metadata for _, file_metadata in page]
+    
+    async def scan_folder_recursive(
+        self,
+        folder_id: str = None,
+        include_trashed: bool = False,
+        max_concurrency: Optional[int] = None,
+    ) -> List[DriveFileMeta]:
+        """
+        Recursively scan a Google Drive folder and return all files
+        
+        Uses the same concurrent traversal as `iter_files`, then sorts the
+        result back into depth-first pre-order so the output order does not
+        depend on which listing finishes first.
+        
+        Args:
+            folder_id: ID of the folder to scan. If None, scans entire Drive
+            include_trashed: Whether to include trashed files
+            max_concurrency: Max folder listings in flight (defaults to the scanner setting)
+        
+        Returns:
+            List of DriveFileMeta records
+        """
+        keyed_files: List[Tuple[Tuple[int, ...], Dict]] = []
+        async for page in self._iter_keyed_pages(folder_id, include_trashed, max_concurrency):
+            keyed_files.extend(page)
+        
+        keyed_files.sort(key=lambda item: item[0])
+        return [file_metadata for _, file_metadata in keyed_files]
+    
+    async def resolve_shortcuts(self, shortcuts: List[DriveFileMeta], include_trashed: bool = False) -> Dict[str, DriveFileMeta]:
+        """
+        Fetch the files that shortcuts point to
+        
+        Targets are fetched with batch requests. Targets that are gone, not
+        shared with the user or (unless `include_trashed`) trashed are left
+        out, and so are targets that are shortcuts themselves.
+        
+        Args:
+            shortcuts: Metadata of shortcut files (with `shortcut_target_id`)
+            include_trashed: Whether to keep trashed targets
+        
+        Returns:
+            Dictionary of target file metadata keyed by target ID
+        """
+        target_ids = list(dict.fromkeys(
+            shortcut.shortcut_target_id for shortcut in shortcuts if shortcut.shortcut_target_id
+        ))
+        if not target_ids:
+            return {}
+        
+        metadata, errors = await self.get_files_metadata_batch(target_ids)
+        for target_id, error in errors.items():
+            logger.info(f"Skipping shortcut target {target_id}: {error}")
+        return {
+            target_id: target for target_id, target in metadata.items()
+            if target.mime_type not in SHORTCUT_TYPES and (include_trashed or not target.trashed)
+        }
+    
+    async def get_file_resource(self, file_id: str, fields: str = FILE_FIELDS, subject: Optional[str] = None) -> Optional[Dict]:
+        """
+        Get a raw Drive file resource through the shared metadata cache
+        
+        Fresh cache entries are returned without any Drive call; expired ones
+        are revalidated with If-None-Match, so an unchanged file costs a 304
+        with no body.
+        
+        Args:
+            file_id: ID of the file
+            fields: Field mask of the file resource
+            subject: Who is asking (e.g. the user's email); defaults to a hash of the token
+        
+        Returns:
+            Drive file resource dictionary
+        """
+        cache = get_metadata_cache()
+        key = metadata_cache_key(self.access_token, file_id, fields, subject)
+        entry = cache.lookup(key)
+        if entry is not None and entry.is_fresh(time.monotonic()):
+            return entry.data
+        
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else None
+        try:
+            response = await self._request(f"{self.base_url}/files/{file_id}", {"fields": fields, "supportsAllDrives": "true"}, headers)
+        except Exception:
+            cache.invalidate(key)
+            raise
+        
+        if response.status_code == 304:
+            revalidated = cache.mark_revalidated(key)
+            if revalidated is not None:
+                return revalidated.data
+            # Evicted meanwhile: fetch it again unconditionally
+            response = await self._request(f"{self.base_url}/files/{file_id}", {"fields": fields, "supportsAllDrives": "true"})
+        
+        data = json_loads(response.content)
+        cache.store(key, data, response.headers.get("ETag"))
+        return data
+    
+    async def get_files_metadata(self, file_ids: List[str], max_concurrency: Optional[int] = None) -> Dict[str, DriveFileMeta]:
+        """
+        Fetch full metadata for several files with batch requests
+        
+        Used after a lean listing to complete the metadata of new or changed
+        files only. Files that cannot be fetched are logged and left out.
+        
+        Args:
+            file_ids: IDs of the files
+            max_concurrency: Max batch requests in flight (defaults to the scanner setting)
+        
+        Returns:
+            Dictionary of file metadata keyed by file ID
+        """
+        metadata, errors = await self.get_files_metadata_batch(file_ids, max_concurrency=max_concurrency)
+        for file_id, error in errors.items():
+            logger.warning(f"Could not get metadata of file {file_id}: {error}")
+        return metadata
+    
+    def _build_batch_body(self, file_ids: List[str], params: Dict[str, Any], boundary: str) -> bytes:
+        """Build a multipart/mixed body with one files.get call per file ID"""
+        query = urlencode(params)
+        parts = []
+        for index, file_id in enumerate(file_ids):
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <item-{index}>\r\n"
+                "\r\n"
+                f"GET /drive/v3/files/{file_id}?{query}\r\n"
+                "\r\n"
+            )
+        parts.append(f"--{boundary}--\r\n")
+        return "".join(parts).encode()
+    
+    def _parse_batch_response(self, content: bytes, content_type: str) -> Dict[int, Tuple[int, Optional[Dict]]]:
+        """
+        Split a multipart/mixed batch response into its embedded HTTP responses
+        
+        Returns:
+            Dictionary of (status code, JSON body) keyed by the index of the call in the batch
+        """
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + content)
+        results = {}
+        for part in message.get_payload() if message.is_multipart() else []:
+            match = re.search(r"item-(\d+)", part.get("Content-ID", ""))
+            if not match:
+                continue
+            http_response = part.get_payload(decode=True) or b""
+            head, _, body = http_response.replace(b"\r\n", b"\n").partition(b"\n\n")
+            status_line = head.split(b"\n", 1)[0].split()
+            try:
+                status_code = int(status_line[1])
+            except (IndexError, ValueError):
+                continue
+            try:
+                data = json_loads(body) if body.strip() else None
+            except ValueError:
+                data = None
+            results[int(match.group(1))] = (status_code, data)
+        return results
+    
+    async def _send_batch(self, file_ids: List[str], params: Dict[str, Any]) -> Dict[int, Tuple[int, Optional[Dict]]]:
+        """
+        Send one batch request of files.get calls, retrying the whole batch on throttling or 5xx
+        
+        Returns:
+            Dictionary of (status code, JSON body) keyed by the index of the call in the batch
+        """
+        boundary = f"batch_{uuid.uuid4().hex}"
+        body = self._build_batch_body(file_ids, params, boundary)
+        reauthorized = False
+        
+        for attempt in range(self.max_retries + 1):
+            headers = await self._auth_headers({"Content-Type": f"multipart/mixed; boundary={boundary}"})
+            sent_token = self.access_token
+            await self.rate_limiter.acquire()
+            try:
+                response = await self.client.post(DRIVE_BATCH_URL, headers=headers, content=body)
+            except httpx.TimeoutException:
+                if attempt >= self.max_retries:
+                    self.rate_limiter.on_give_up()
+                    raise Exception("Request timeout")
+                self.rate_limiter.on_retry()
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            
+            if response.status_code == 200:
+                self.rate_limiter.on_success()
+                return self._parse_batch_response(response.content, response.headers.get("Content-Type", ""))
+            
+            if response.status_code == 401 and not reauthorized and await self._reauthorize(sent_token):
+                reauthorized = True
+                continue
+            
+            delay = self._retry_delay(response, attempt)
+            if delay is None:
+                if response.status_code == 401:
+                    raise Exception("Invalid or expired access token")
+                raise Exception(f"Batch request failed with status {response.status_code}")
+            logger.info(f"🔁 Drive batch request returned HTTP {response.status_code}, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+        
+        raise Exception("Batch request failed after retries")
+    
+    async def get_files_metadata_batch(
+        self,
+        file_ids: List[str],
+        batch_size: int = DRIVE_BATCH_MAX_SIZE,
+        max_concurrency: Optional[int] = None
+    ) -> Tuple[Dict[str, DriveFileMeta], Dict[str, str]]:
+        """
+        Fetch metadata for many files, packing up to 100 files.get calls per batch request
+        
+        Batches are sent concurrently. Calls that were throttled or hit a 5xx
+        inside a batch are retried in a later batch after a backoff; any other
+        per-file failure is reported in the errors dictionary.
+        
+        Args:
+            file_ids: IDs of the files
+            batch_size: Calls per batch request (at most 100)
+            max_concurrency: Max batch requests in flight (defaults to the scanner setting)
+        
+        Returns:
+            Tuple (metadata keyed by file ID, error message keyed by file ID)
+        """
+        batch_size = max(1, min(batch_size, DRIVE_BATCH_MAX_SIZE))
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or self.max_concurrency))
+        params = {"fields": FILE_FIELDS, "supportsAllDrives": "true"}
+        metadata: Dict[str, DriveFileMeta] = {}
+        errors: Dict[str, str] = {}
+        
+        async def run_batch(batch_ids: List[str]) -> List[str]:
+            """Send one batch and return the IDs whose calls should be retried"""
+            async with semaphore:
+                try:
+                    results = await self._send_batch(batch_ids, params)
+                except Exception as e:
+                    for file_id in batch_ids:
+                        errors[file_id] = str(e)
+                    return []
+            
+            retry = []
+            throttled = False
+            for index, file_id in enumerate(batch_ids):
+                status_code, data = results.get(index, (None, None))
+                if status_code == 200 and data:
+                    metadata[file_id] = self._build_file_metadata(data)
+                elif status_code is None:
+                    retry.append(file_id)
+                elif is_rate_limit_error(status_code, data) or status_code in RETRYABLE_STATUS_CODES:
+                    throttled = throttled or is_rate_limit_error(status_code, data)
+                    retry.append(file_id)
+                else:
+                    message = ((data or {}).get("error") or {}).get("message")
+                    errors[file_id] = f"HTTP {status_code}" + (f": {message}" if message else "")
+            if throttled:
+                self.rate_limiter.on_throttled()
+            return retry
+        
+        pending = list(dict.fromkeys(file_ids))
+        for attempt in range(self.max_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                await asyncio.sleep(backoff_delay(attempt - 1))
+            batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+            retries = await asyncio.gather(*(run_batch(batch_ids) for batch_ids in batches))
+            pending = [file_id for retry in retries for file_id in retry]
+        
+        for file_id in pending:
+            errors[file_id] = "Batch call failed after retries"
+        
+        return metadata, errors
+    
+    async def get_start_page_token(self) -> Optional[str]:
+        """
+        Get the current Drive Changes API cursor
+        
+        Changes made after this call are returned by `list_changes` when it is
+        given this token.
+        
+        Returns:
+            startPageToken string, or None if Drive did not return one
+        """
+        url = f"{self.base_url}/changes/startPageToken"
+        data = await self._make_request(url, {"supportsAllDrives": "true"})
+        return data.get("startPageToken") if data else None
+    
+    async def list_changes(self, page_token: str) -> Tuple[List[Dict], Optional[str]]:
+        """
+        List every change visible to the user since `page_token`
+        
+        The Changes API is not scoped to a folder: callers must filter the
+        returned changes to the tree they care about.
+        
+        Args:
+            page_token: Cursor from `get_start_page_token` or a previous call
+        
+        Returns:
+            Tuple of (changes, new_start_page_token). Each change is a dict with
+            "file_id", "removed", "time" and "file" (DriveFileMeta record, or
+            None when the file was removed or is no longer accessible).
+        """
+        changes = []
+        new_start_page_token = None
+        url = f"{self.base_url}/changes"
+        
+        while page_token:
+            params = {
+                "pageToken": page_token,
+                "fields": f"nextPageToken,newStartPageToken,changes(fileId,removed,time,file({FILE_FIELDS}))",
+                "pageSize": 1000,
+                "spaces": "drive",
+                "includeRemoved": "true",
+                "supportsAllDrives": "true",
+                "includeItemsFromAllDrives": "true"
+            }
+            data = await self._make_request(url, params)
+            if not data:
+                break
+            
+            for change in data.get("changes", []):
+                file = change.get("file")
+                changes.append({
+                    "file_id": change.get("fileId"),
+                    "removed": change.get("removed", False),
+                    "time": change.get("time"),
+                    "file": self._build_file_metadata(file) if file else None
+                })
+            
+            new_start_page_token = data.get("newStartPageToken") or new_start_page_token
+            page_token = data.get("nextPageToken")
+        
+        return changes, new_start_page_token
+    
+    async def spool_file_content(self, file_id: str) -> Optional[tempfile.SpooledTemporaryFile]:
         """
-        Download file content as bytes with memory management
+        Download file content into a spooled temporary file
         
         Args:
             file_id: ID of the file to download
         
         Returns:
-            File content as bytes, or None if failed
+            Spooled file positioned at offset 0 (the caller must close it), or None if failed
         """
         try:
             url = f"{self.base_url}/files/{file_id}"
             params = {"alt": "media"}
-            
-            # Use streaming download for large files to prevent memory issues
-            async with httpx.AsyncClient(timeout=60) as client:
-                async with client.stream('GET', url, headers=self.headers, params=params) as response:
-                    if response.status_code == 200:
-                        # Read content in chunks to manage memory
-                        content_chunks = []
-                        async for chunk in response.aiter_bytes(chunk_size=8192):  # 8KB chunks
-                            content_chunks.append(chunk)
-                        
-                        # Combine chunks into single bytes object
-                        return b''.join(content_chunks)
-                    else:
-                        logger.warning(f"Failed to download file {file_id}: HTTP {response.status_code}")
-                        return None
+            return await self._download(url, params, f"download file {file_id}")
         except Exception as e:
             logger.error(f"Error downloading file {file_id}: {str(e)}")
             return None
     
-    async def export_google_doc(self, file_id: str, mime_type: str = "text/plain") -> Optional[bytes]:
+    async def spool_partial_content(
+        self,
+        file_id: str,
+        file_size: int,
+        prefix_bytes: int = DRIVE_PARTIAL_PREFIX_BYTES,
+        suffix_bytes: int = DRIVE_PARTIAL_SUFFIX_BYTES
+    ) -> Optional[tempfile.SpooledTemporaryFile]:
+        """
+        Download only the beginning (and optionally the end) of a file using HTTP Range requests
+        
+        The prefix and suffix are written one after the other, separated by a
+        newline. When the file is smaller than the window it is downloaded whole.
+        
+        Args:
+            file_id: ID of the file to download
+            file_size: Size of the file in bytes, as reported by the listing
+            prefix_bytes: Bytes to fetch from the start of the file
+            suffix_bytes: Bytes to fetch from the end of the file (0 to skip)
+        
+        Returns:
+            Spooled file positioned at offset 0 (the caller must close it), or None if failed
+        """
+        url = f"{self.base_url}/files/{file_id}"
+        params = {"alt": "media"}
+        
+        if file_size and prefix_bytes + suffix_bytes >= file_size:
+            return await self.spool_file_content(file_id)
+        
+        spool = None
+        try:
+            spool = await self._download(
+                url, params, f"download first {prefix_bytes} bytes of file {file_id}",
+                byte_range=f"bytes=0-{prefix_bytes - 1}", max_bytes=prefix_bytes
+            )
+            if spool is None or suffix_bytes <= 0:
+                return spool
+            
+            spool.seek(0, 2)
+            spool.write(b"\n")
+            result = await self._download(
+                url, params, f"download last {suffix_bytes} bytes of file {file_id}",
+                byte_range=f"bytes=-{suffix_bytes}", max_bytes=suffix_bytes, spool=spool
+            )
+            if result is None:
+                # Keep the prefix even if the suffix could not be fetched
+                spool.seek(0)
+            return spool
+        except Exception as e:
+            logger.error(f"Error downloading partial content of file {file_id}: {str(e)}")
+            if spool is not None:
+                spool.close()
+            return None
+    
+    async def spool_google_doc_export(self, file_id: str, mime_type: str = "text/plain") -> Optional[tempfile.SpooledTemporaryFile]:
         """
-        Export Google Workspace document to specified format with memory management
+        Export a Google Workspace document into a spooled temporary file
         
         Args:
             file_id: ID of the Google document
             mime_type: Export format (text/plain, application/pdf, etc.)
         
         Returns:
-            Exported content as bytes, or None if failed
+            Spooled file positioned at offset 0 (the caller must close it), or None if failed
         """
         try:
             url = f"{self.base_url}/files/{file_id}/export"
             params = {"mimeType": mime_type}
-            
-            # Use streaming download for large exports to prevent memory issues
-            async with httpx.AsyncClient(timeout=60) as client:
-                async with client.stream('GET', url, headers=self.headers, params=params) as response:
-                    if response.status_code == 200:
-                        # Read content in chunks to manage memory
-                        content_chunks = []
-                        async for chunk in response.aiter_bytes(chunk_size=8192):  # 8KB chunks
-                            content_chunks.append(chunk)
-                        
-                        # Combine chunks into single bytes object
-                        return b''.join(content_chunks)
-                    else:
-                        logger.warning(f"Failed to export Google Doc {file_id}: HTTP {response.status_code}")
-                        return None
+            return await self._download(url, params, f"export Google Doc {file_id}")
         except Exception as e:
             logger.error(f"Error exporting Google Doc {file_id}: {str(e)}")
             return None
+    
+    async def spool_workspace_export(
+        self,
+        file_id: str,
+        mime_type: str,
+        max_bytes: int = DRIVE_EXPORT_MAX_BYTES
+    ) -> Tuple[Optional[tempfile.SpooledTemporaryFile], bool]:
+        """
+        Export a Google Workspace file in the text format chosen for its type
+        
+        Formats come from the shared export policy (CSV for sheets, plain text
+        for documents and presentations); when Drive rejects one as a format
+        (HTTP 400, export too large) the next is tried, and the one that worked
+        is tried first for later files of the same type. Other failures (no
+        access, not found, retries exhausted) end the export. Types without
+        useful text (drawings, forms) are not exported.
+        
+        Args:
+            file_id: ID of the Google document
+            mime_type: Google Workspace MIME type of the file
+            max_bytes: Exports are cut off past this size
+        
+        Returns:
+            (spooled file positioned at offset 0 or None, whether the export was cut off)
+        """
+        policy = get_export_policy()
+        if not policy.is_exportable(mime_type):
+            policy.record_skipped()
+            return None, False
+        
+        url = f"{self.base_url}/files/{file_id}/export"
+        candidates = policy.candidates(mime_type)
+        for index, export_format in enumerate(candidates):
+            try:
+                # One byte past the cap tells a cut-off export from one that fits exactly
+                spool = await self._download(
+                    url, {"mimeType": export_format}, f"export Google Doc {file_id} as {export_format}",
+                    max_bytes=max_bytes + 1, raise_errors=True
+                )
+            except DriveDownloadError as e:
+                if not is_export_format_error(e.status_code, e.body):
+                    break
+                if index + 1 < len(candidates):
+                    policy.record_fallback()
+                continue
+            except Exception as e:
+                logger.error(f"Error exporting Google Doc {file_id} as {export_format}: {str(e)}")
+                break
+            
+            if spool is None:
+                # Retries exhausted: another format would fail the same way
+                break
+            
+            spool.seek(0, 2)
+            truncated = spool.tell() > max_bytes
+            if truncated:
+                spool.truncate(max_bytes)
+            spool.seek(0)
+            policy.record_success(mime_type, export_format, truncated)
+            return spool, truncated
+        
+        policy.record_failure()
+        return None, False
+    
+    async def get_file_content(self, file_id: str) -> Optional[bytes]:
+        """
+        Download file content as bytes
+        
+        Loads the whole file in memory; prefer `spool_file_content` for indexing.
+        
+        Args:
+            file_id: ID of the file to download
+        
+        Returns:
+            File content as bytes, or None if failed
+        """
+        spool = await self.spool_file_content(file_id)
+        if spool is None:
+            return None
+        with spool:
+            return spool.read()
+    
+    async def export_google_doc(self, file_id: str, mime_type: str = "text/plain") -> Optional[bytes]:
+        """
+        Export Google Workspace document to specified format
+        
+        Loads the whole export in memory; prefer `spool_google_doc_export` for indexing.
+        
+        Args:
+            file_id: ID of the Google document
+            mime_type: Export format (text/plain, application/pdf, etc.)
+        
+        Returns:
+            Exported content as bytes, or None if failed
+        """
+        spool = await self.spool_google_doc_export(file_id, mime_type)
+        if spool is None:
+            return None
+        with spool:
+            return spool.read()
 
-
-async def get_file_metadata(access_token: str, file_id: str) -> Optional[Dict]:
+async def get_file_metadata(
+    access_token: str,
+    file_id: str,
+    client: Optional[httpx.AsyncClient] = None,
+    subject: Optional[str] = None,
+) -> Optional[DriveFileMeta]:
     """
-    Get metadata for a specific file
+    Get metadata for a specific file, through the shared metadata cache
     
     Args:
         access_token: OAuth2 access token
         file_id: ID of the file
+        client: Optional shared pooled client
+        subject: Who is asking (e.g. the user's email); defaults to a hash of the token
     
     Returns:
-        File metadata dictionary, or None if failed
+        File metadata record, or None if failed
     """
+    scanner = GoogleDriveScanner(access_token, client=client)
     try:
-        scanner = GoogleDriveScanner(access_token)
-        url = f"{scanner.base_url}/files/{file_id}"
-        params = {
-            "fields": "id,name,mimeType,size,modifiedTime,createdTime,parents,trashed,webViewLink,description,owners,lastModifyingUser,md5Checksum",
-            "supportsAllDrives": "true"
-        }
-        
-        data = await scanner._make_request(url, params)
+        data = await scanner.get_file_resource(file_id, FILE_FIELDS, subject)
         if not data:
             return None
         
-        return {
-            "id": data.get("id"),
-            "name": data.get("name"),
-            "mime_type": data.get("mimeType"),
-            "file_type": scanner._get_file_type(data.get("mimeType", "")),
-            "size": int(data.get("size", 0)),
-            "size_formatted": scanner._format_file_size(int(data.get("size", 0))),
-            "modified_time": data.get("modifiedTime"),
-            "created_time": data.get("createdTime"),
-            "parents": data.get("parents", []),
-            "trashed": data.get("trashed", False),
-            "web_view_link": data.get("webViewLink"),
-            "description": data.get("description"),
-            "owners": data.get("owners", []),
-            "last_modifying_user": data.get("lastModifyingUser"),
-            "md5_checksum": data.get("md5Checksum"),
-            "is_google_doc": scanner._is_google_doc(data.get("mimeType", "")),
-            "downloadable": scanner._is_downloadable(data.get("mimeType", ""))
-        }
+        return scanner._build_file_metadata(data)
     except Exception:
         return None
+    finally:
+        await scanner.aclose()
+
+
+async def get_files_metadata_batch(
+    access_token: str,
+    file_ids: List[str],
+    client: Optional[httpx.AsyncClient] = None,
+) -> Tuple[Dict[str, DriveFileMeta], Dict[str, str]]:
+    """
+    Get metadata for many files using Drive batch requests (up to 100 files per call)
+    
+    Args:
+        access_token: OAuth2 access token
+        file_ids: IDs of the files
+        client: Optional shared pooled client
+    
+    Returns:
+        Tuple (metadata keyed by file ID, error message keyed by file ID)
+    """
+    scanner = GoogleDriveScanner(access_token, client=client)
+    try:
+        return await scanner.get_files_metadata_batch(file_ids)
+    finally:
+        await scanner.aclose()
 
 
-async def scan_google_drive(access_token: str, folder_id: str = None, include_trashed: bool = False) -> List[Dict]:
+async def scan_google_drive(
+    access_token: str,
+    folder_id: str = None,
+    include_trashed: bool = False,
+    client: Optional[httpx.AsyncClient] = None,
+) -> List[DriveFileMeta]:
     """
     Convenience function to scan Google Drive
     
@@ -335,10 +1528,11 @@ async def scan_google_drive(access_token: str, folder_id: str = None, include_tr
         access_token: OAuth2 access token
         folder_id: Optional folder ID to scan (scans entire Drive if None)
         include_trashed: Whether to include trashed files
+        client: Optional shared pooled client
     
     Returns:
-        List of file metadata dictionaries
+        List of DriveFileMeta records
     """
-    scanner = GoogleDriveScanner(access_token)
-    return await scanner.scan_folder_recursive(folder_id, include_trashed)
+    async with GoogleDriveScanner(access_token, client=client) as scanner:
+        return await scanner.scan_folder_recursive(folder_id, include_trashed)
 
@@ -0,0 +1,174 @@
+"""
+Proactive refresh of Google OAuth access tokens for long-running Drive jobs
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+
+# Tokens are refreshed this long before they expire
+GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS = int(os.environ.get("GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS") or 300)
+
+# Lifetime assumed when Google does not send expires_in
+_DEFAULT_TOKEN_LIFETIME_SECONDS = 3600
+
+TokenLoader = Callable[[], Optional[Tuple[str, Optional[datetime]]]]
+TokenSaver = Callable[[str, datetime], None]
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Normalize an expiry to an aware UTC datetime (naive values are local time, as stored at login)"""
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc)
+
+
+class GoogleTokenManager:
+    """
+    Keeps a Google access token valid for the lifetime of a job
+
+    The token is refreshed with the user's refresh token shortly before it
+    expires (or as soon as Drive answers 401). Refreshes are single-flight:
+    every coroutine asking for a token while a refresh is running waits for
+    that refresh instead of starting its own. Refreshed tokens are handed to
+    `token_saver` (e.g. stored on the user), and `token_loader` lets the
+    manager pick up a token another process refreshed in the meantime.
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        refresh_token: Optional[str] = None,
+        expiry: Optional[datetime] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        token_loader: Optional[TokenLoader] = None,
+        token_saver: Optional[TokenSaver] = None,
+        refresh_margin_seconds: int = GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS,
+        client_id: Optional[str] = None,
+        client_secret: Optional[str] = None,
+    ):
+        """
+        Args:
+            access_token: Current access token
+            refresh_token: OAuth2 refresh token; without it the token is never refreshed
+            expiry: When the access token expires, if known
+            client: Shared HTTP client used for the token endpoint (a short-lived one otherwise)
+            token_loader: Returns the latest stored (access_token, expiry), checked before refreshing
+            token_saver: Called with every refreshed (access_token, expiry)
+            refresh_margin_seconds: How long before expiry the token is refreshed
+            client_id: OAuth client ID (defaults to GOOGLE_CLIENT_ID)
+            client_secret: OAuth client secret (defaults to GOOGLE_CLIENT_SECRET)
+        """
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expiry = _as_utc(expiry)
+        self.client = client
+        self.token_loader = token_loader
+        self.token_saver = token_saver
+        self.refresh_margin = timedelta(seconds=refresh_margin_seconds)
+        self.client_id = client_id or os.environ.get("GOOGLE_CLIENT_ID")
+        self.client_secret = client_secret or os.environ.get("GOOGLE_CLIENT_SECRET")
+        self._lock: Optional[asyncio.Lock] = None
+
+        # Counters
+        self.refreshes = 0
+
+    @property
+    def can_refresh(self) -> bool:
+        return bool(self.refresh_token and self.client_id and self.client_secret)
+
+    def _expires_soon(self) -> bool:
+        if self.expiry is None:
+            return False
+        return datetime.now(timezone.utc) >= self.expiry - self.refresh_margin
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Created lazily so it belongs to the loop that runs the job
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def get_access_token(self) -> str:
+        """Get a valid access token, refreshing it first when it is about to expire"""
+        if self._expires_soon() and self.can_refresh:
+            async with self._get_lock():
+                # Another coroutine may have refreshed it while we waited
+                if self._expires_soon():
+                    await self._refresh()
+        return self.access_token
+
+    async def invalidate(self, rejected_token: str) -> bool:
+        """
+        Refresh after Drive rejected a token with 401
+
+        Only the first caller reporting a given token triggers a refresh; the
+        others get the token it produced.
+
+        Returns:
+            True if a different token is now available
+        """
+        if not self.can_refresh:
+            return False
+        async with self._get_lock():
+            if self.access_token == rejected_token:
+                await self._refresh()
+        return self.access_token != rejected_token
+
+    def _adopt_stored_token(self) -> bool:
+        """Use a newer token stored by another process, if there is one"""
+        if self.token_loader is None:
+            return False
+        try:
+            stored = self.token_loader()
+        except Exception as e:
+            logger.warning(f"Could not load stored Google token: {str(e)}")
+            return False
+        if not stored or not stored[0] or stored[0] == self.access_token:
+            return False
+        access_token, expiry = stored[0], _as_utc(stored[1])
+        if expiry is None or datetime.now(timezone.utc) >= expiry - self.refresh_margin:
+            return False
+        self.access_token, self.expiry = access_token, expiry
+        logger.info("🔑 Picked up Google access token refreshed by another worker")
+        return True
+
+    async def _refresh(self):
+        """Exchange the refresh token for a new access token"""
+        if self._adopt_stored_token():
+            return
+
+        data = {
+            "grant_type": "refresh_token",
+            "refresh_token": self.refresh_token,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+        }
+        if self.client is not None:
+            response = await self.client.post(GOOGLE_TOKEN_URL, data=data, timeout=30)
+        else:
+            async with httpx.AsyncClient(timeout=30) as one_off_client:
+                response = await one_off_client.post(GOOGLE_TOKEN_URL, data=data)
+
+        if response.status_code != 200:
+            raise Exception(f"Google token refresh failed with status {response.status_code}")
+
+        payload = response.json()
+        self.access_token = payload["access_token"]
+        self.expiry = datetime.now(timezone.utc) + timedelta(seconds=int(payload.get("expires_in") or _DEFAULT_TOKEN_LIFETIME_SECONDS))
+        if payload.get("refresh_token"):
+            self.refresh_token = payload["refresh_token"]
+        self.refreshes += 1
+        logger.info(f"🔑 Refreshed Google access token, valid until {self.expiry.isoformat()}")
+
+        if self.token_saver is not None:
+            try:
+                self.token_saver(self.access_token, self.expiry)
+            except Exception as e:
+                logger.warning(f"Could not store refreshed Google token: {str(e)}")
@@ -5,14 +5,29 @@ import asyncio
 import hashlib
 import json
 import logging
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Tuple, Set, Iterable
+from sqlalchemy.orm import Session, load_only, undefer
+from sqlalchemy import and_, or_, func, literal, false, Text
+from sqlalchemy.exc import IntegrityError
 
-from database.models import Program, IndexedFile, IndexingJob, UserModel
+from database.models import Program, IndexedFile, IndexingJob, UserModel, DriveFolderNode, ContentChunk, ContentBlob
 from database.database import get_db
-from apps.google_drive import GoogleDriveScanner, get_file_metadata
+from apps.google_drive import (
+    GoogleDriveScanner,
+    DriveFileMeta,
+    get_file_metadata,
+    FOLDER_TYPES,
+    PARTIAL_CONTENT_EXCLUDED_PREFIXES,
+    DRIVE_PARTIAL_PREFIX_BYTES,
+    DRIVE_PARTIAL_SUFFIX_BYTES,
+)
+from apps.drive_download_budget import get_download_budget
+from apps.drive_export_policy import DRIVE_EXPORT_MAX_BYTES, get_export_policy
+from apps.text_extraction import decode_text, extract_text, get_extractor
+from apps.text_sanitizer import sanitize_text
+from apps.text_chunker import chunk_text
+from apps.content_compression import compress_text, decompress_text
 from apps.jwt import get_current_user_email
 
 logger = logging.getLogger(__name__)
@@ -21,6 +36,12 @@ logger = logging.getLogger(__name__)
 class IndexingService:
     """Servicio para indexar archivos de Google Drive"""
     
+    # Máximo de caracteres de texto almacenados por archivo (~1MB)
+    MAX_CONTENT_CHARS = 1000000
+    
+    # Archivos más grandes se indexan parcialmente (solo una ventana de bytes)
+    MAX_FULL_DOWNLOAD_BYTES = 100 * 1024 * 1024
+    
     def __init__(self, db: Session):
         self.db = db
     
@@ -122,22 +143,27 @@ class IndexingService:
             folder_id = job.folder_id or program.drive_folder_id
             
             logger.info(f"Starting scan for program {program.id}, folder {folder_id}")
-            files = await scanner.scan_folder_recursive(folder_id, include_trashed)
+            try:
+                files = await scanner.scan_folder_recursive(folder_id, include_trashed)
+            except Exception:
+                await scanner.aclose()
+                raise
             
             # Actualizar contadores
             job.total_files = len(files)
             job.processed_files = 0
             job.successful_files = 0
             job.failed_files = 0
+            job.skipped_unchanged = 0
             self.db.commit()
             
             # Procesar cada archivo
             for file_data in files:
                 try:
-                    await self._process_file(job, program, file_data, scanner)
-                    job.successful_files += 1
+                    if await self._process_file(job, program, file_data, scanner):
+                        job.successful_files += 1
                 except Exception as e:
-                    logger.error(f"Error processing file {file_data.get('id')}: {str(e)}")
+                    logger.error(f"Error processing file {file_data.id}: {str(e)}")
                     job.failed_files += 1
                     
                     # Crear registro de archivo fallido
@@ -149,6 +175,8 @@ class IndexingService:
                 if job.processed_files % 10 == 0:
                     self.db.commit()
             
+            await scanner.aclose()
+            
             # Marcar trabajo como completado
             job.status = "completed"
             job.completed_at = datetime.utcnow()
@@ -170,9 +198,9 @@ class IndexingService:
         self, 
         job: IndexingJob, 
         program: Program, 
-        file_data: Dict, 
+        file_data: DriveFileMeta, 
         scanner: GoogleDriveScanner
-    ):
+    ) -> bool:
         """
         Procesa un archivo individual
         
@@ -181,10 +209,13 @@ class IndexingService:
             program: Programa
             file_data: Datos del archivo de Google Drive
             scanner: Scanner de Google Drive
+        
+        Returns:
+            False si el archivo no cambió desde la última indexación y se omitió
         """
-        file_id = file_data.get("id")
+        file_id = file_data.id
         if not file_id:
-            return
+            return False
         
         # Verificar si el archivo ya existe
         existing_file = self.db.query(IndexedFile).filter(
@@ -194,54 +225,96 @@ class IndexingService:
             )
         ).first()
         
+        # Archivo sin cambios: no descargar ni reescribir el registro
+        if existing_file and self._is_unchanged(existing_file, file_data):
+            logger.debug(f"⏭️ Skipping unchanged file {file_id}")
+            job.skipped_unchanged = (job.skipped_unchanged or 0) + 1
+            return False
+        
         # Obtener contenido del archivo con gestión de memoria optimizada
         content_text = None
+        content_partial = False
+        content_blob = None
+        content_error = None
         
         # Get file information
-        file_name = file_data.get("name", "unknown")
-        file_size = file_data.get("size", 0)
+        file_name = file_data.name
+        file_size = file_data.size
         file_size_mb = file_size / (1024 * 1024)
-        mime_type = file_data.get("mimeType", "")
-        modified_time = file_data.get("modifiedTime", "")
-        file_type = file_data.get("file_type", "")
+        mime_type = file_data.mime_type
+        modified_time = file_data.modified_time or ""
+        file_type = file_data.file_type
         
         # Get MD5 checksum from file_data instead of calculating
-        md5_checksum = file_data.get("md5_checksum")
+        md5_checksum = file_data.md5_checksum
         logger.info(f"🔍 File {file_id} ({file_name}) - MD5 checksum: {md5_checksum}")
         
         # Use MD5 checksum as content hash if available, otherwise use modified time
         content_hash = md5_checksum if md5_checksum else (hashlib.md5(modified_time.encode()).hexdigest() if modified_time else None)
         
-        # Only process content text for files under 100MB and not MP4
+        # Files over the download limit only get a ranged prefix/suffix window; MP4 and other media get nothing
         logger.info(f"🔍 File {file_id} ({file_name}) - File size: {file_size_mb:.1f}MB, file_type: {file_type}")
-        skip_process_content = file_size_mb > 100 or file_type == "mp4"
+        is_large = file_size > self.MAX_FULL_DOWNLOAD_BYTES
+        skip_process_content = file_type == "mp4" or (
+            is_large and (
+                not file_data.downloadable
+                or mime_type.startswith(PARTIAL_CONTENT_EXCLUDED_PREFIXES)
+            )
+        )
+        
+        if not skip_process_content:
+            content_blob = self._find_content_blob(file_data)
         
         if skip_process_content:
             logger.info(f"🎥 Skipping content download for file {file_id} ({file_name})")
+        elif content_blob is not None:
+            # Los mismos bytes ya se extrajeron (en este u otro programa): no descargar ni extraer
+            logger.debug(f"♻️ Content of file {file_id} already extracted (blob {content_blob.id}), skipping download")
+            content_partial = bool(content_blob.content_partial)
+        elif existing_file and self._same_content_revision(existing_file, file_data):
+            # Solo cambiaron metadatos (p. ej. se movió): conservar el texto ya extraído
+            logger.debug(f"♻️ Content revision of file {file_id} unchanged, reusing extracted text")
+            content_partial = bool(existing_file.content_partial)
+            content_blob = existing_file.content_blob
         else:
             try:
-                if file_data.get("is_google_doc"):
-                    # Exportar documento de Google
-                    logger.debug(f"📄 Exporting Google Doc: {file_id}")
-                    content_bytes = await scanner.export_google_doc(file_id, "text/plain")
-                elif file_data.get("downloadable"):
-                    # Descargar archivo normal
-                    logger.debug(f"📥 Downloading file: {file_id}")
-                    content_bytes = await scanner.get_file_content(file_id)
-                else:
-                    content_bytes = None
-                
-                if content_bytes:
-                    # Log content size for monitoring
-                    content_size_mb = len(content_bytes) / (1024 * 1024)
-                    logger.debug(f"📊 File content size: {content_size_mb:.1f}MB for {file_id}")
-                    
-                    # Decode content with memory management
-                    content_text = content_bytes.decode('utf-8', errors='ignore')
+                # Reservar del presupuesto global los bytes que se van a tener en memoria
+                reservation = self._download_reservation(file_data, is_large)
+                async with get_download_budget().reserve(reservation):
+                    if file_data.is_google_doc:
+                        # Exportar documento de Google
+                        logger.debug(f"📄 Exporting Google Doc: {file_id}")
+                        content_file, content_partial = await scanner.spool_workspace_export(file_id, mime_type)
+                    elif file_data.downloadable and is_large:
+                        # Descargar solo una ventana del archivo
+                        logger.info(f"✂️ Downloading partial content of large file {file_id} ({file_name})")
+                        content_file = await scanner.spool_partial_content(file_id, file_size)
+                        content_partial = content_file is not None
+                    elif file_data.downloadable:
+                        # Descargar archivo normal
+                        logger.debug(f"📥 Downloading file: {file_id}")
+                        content_file = await scanner.spool_file_content(file_id)
+                    else:
+                        content_file = None
                     
-                    # Clear content_bytes to free memory immediately
-                    del content_bytes
+                    expects_content = (
+                        get_export_policy().is_exportable(mime_type) if file_data.is_google_doc else file_data.downloadable
+                    )
+                    if content_file is None and expects_content:
+                        # Descarga o exportación fallida: se reintenta en el próximo escaneo
+                        content_error = "Content could not be downloaded"
                     
+                    if content_file is not None:
+                        # Decode straight from the spooled file, so the raw bytes are never held in memory twice
+                        with content_file:
+                            content_file.seek(0, 2)
+                            content_size_mb = content_file.tell() / (1024 * 1024)
+                            content_file.seek(0)
+                            logger.debug(f"📊 File content size: {content_size_mb:.1f}MB for {file_id}")
+                            
+                            content_text = await self._extract_text(content_file, file_data)
+                
+                if content_text:
                     # Sanitizar contenido: remover caracteres NUL y otros caracteres problemáticos
                     content_text = self._sanitize_content(content_text)
                     
@@ -254,61 +327,719 @@ class IndexingService:
                         logger.debug(f"✅ Calculated content hash for {file_id}: {content_hash[:8]}...")
                     
                     logger.debug(f"✅ Content processed for {file_id}: {len(content_text)} chars, hash: {content_hash[:8]}...")
+                    
+                    # Guardar el texto comprimido; una sola vez para todos los archivos con los mismos bytes
+                    content_blob = self._store_content_blob(file_data, content_text, content_partial)
             
             except Exception as e:
                 logger.warning(f"Could not extract content from file {file_id}: {str(e)}")
                 # Ensure content variables are None on error
                 content_text = None
+                content_partial = False
+                content_blob = None
+                content_error = self._sanitize_content(str(e)) or type(e).__name__
                 # Keep the MD5 checksum or modified time hash as fallback
                 content_hash = md5_checksum if md5_checksum else (hashlib.md5(modified_time.encode()).hexdigest() if modified_time else None)
         
         # Crear o actualizar registro de archivo
         if existing_file:
+            previous_blob_id = existing_file.content_blob_id
             # Actualizar archivo existente
-            existing_file.drive_file_name = self._sanitize_content(file_data.get("name", ""))
-            existing_file.file_type = self._sanitize_content(file_data.get("file_type", ""))
-            existing_file.file_size = file_data.get("size", 0)
-            existing_file.web_view_link = self._sanitize_content(file_data.get("web_view_link", ""))
-            existing_file.description = self._sanitize_content(file_data.get("description", ""))
-            existing_file.parents = json.dumps(file_data.get("parents", [])) if file_data.get("parents") else None
-            existing_file.owners = json.dumps(file_data.get("owners", [])) if file_data.get("owners") else None
-            existing_file.last_modifying_user = json.dumps(file_data.get("last_modifying_user", {})) if file_data.get("last_modifying_user") else None
+            existing_file.drive_file_name = self._sanitize_content(file_data.name)
+            existing_file.file_type = self._sanitize_content(file_data.file_type)
+            existing_file.file_size = file_data.size
+            existing_file.web_view_link = self._sanitize_content(file_data.web_view_link)
+            existing_file.description = self._sanitize_content(file_data.description)
+            existing_file.parents = json.dumps(file_data.parents) if file_data.parents else None
+            existing_file.owners = file_data.owners_json
+            existing_file.last_modifying_user = file_data.last_modifying_user_json
             existing_file.md5_checksum = md5_checksum
-            existing_file.is_google_doc = file_data.get("is_google_doc", False)
-            existing_file.is_downloadable = file_data.get("downloadable", True)
-            existing_file.content_text = content_text
+            existing_file.head_revision_id = file_data.head_revision_id
+            existing_file.drive_version = file_data.version
+            existing_file.is_google_doc = file_data.is_google_doc
+            existing_file.is_downloadable = file_data.downloadable
+            existing_file.content_blob = content_blob
+            existing_file.content_partial = content_partial and content_blob is not None
+            existing_file.content_error = content_error
             existing_file.indexing_status = "completed"
             existing_file.last_indexed_at = datetime.utcnow()
-            existing_file.drive_created_time = self._parse_datetime(file_data.get("created_time"))
-            existing_file.drive_modified_time = self._parse_datetime(file_data.get("modified_time"))
+            existing_file.drive_created_time = self._parse_datetime(file_data.created_time)
+            existing_file.drive_modified_time = self._parse_datetime(file_data.modified_time)
+            if file_data.folder_id_path:
+                existing_file.drive_file_path = file_data.path
+                existing_file.folder_id_path = file_data.folder_id_path
+            if previous_blob_id is not None and previous_blob_id != (content_blob.id if content_blob else None):
+                # El contenido cambió: liberar el blob anterior si nadie más lo usa
+                self.db.flush()
+                self.prune_content_blobs([previous_blob_id])
         else:
             # Crear nuevo archivo
             indexed_file = IndexedFile(
                 drive_folder_id=program.drive_folder_id,
                 drive_file_id=file_id,
-                drive_file_name=self._sanitize_content(file_data.get("name", "")),
-                file_type=self._sanitize_content(file_data.get("file_type", "")),
-                file_size=file_data.get("size", 0),
-                web_view_link=self._sanitize_content(file_data.get("web_view_link", "")),
-                description=self._sanitize_content(file_data.get("description", "")),
-                parents=json.dumps(file_data.get("parents", [])) if file_data.get("parents") else None,
-                owners=json.dumps(file_data.get("owners", [])) if file_data.get("owners") else None,
-                last_modifying_user=json.dumps(file_data.get("last_modifying_user", {})) if file_data.get("last_modifying_user") else None,
+                drive_file_name=self._sanitize_content(file_data.name),
+                file_type=self._sanitize_content(file_data.file_type),
+                file_size=file_data.size,
+                web_view_link=self._sanitize_content(file_data.web_view_link),
+                description=self._sanitize_content(file_data.description),
+                parents=json.dumps(file_data.parents) if file_data.parents else None,
+                owners=file_data.owners_json,
+                last_modifying_user=file_data.last_modifying_user_json,
                 md5_checksum=md5_checksum,
-                content_text=content_text,
-                is_google_doc=file_data.get("is_google_doc", False),
-                is_downloadable=file_data.get("downloadable", True),
+                head_revision_id=file_data.head_revision_id,
+                drive_version=file_data.version,
+                content_blob=content_blob,
+                content_partial=content_partial and content_blob is not None,
+                content_error=content_error,
+                is_google_doc=file_data.is_google_doc,
+                is_downloadable=file_data.downloadable,
                 indexing_status="completed",
                 last_indexed_at=datetime.utcnow(),
-                drive_created_time=self._parse_datetime(file_data.get("created_time")),
-                drive_modified_time=self._parse_datetime(file_data.get("modified_time"))
+                drive_created_time=self._parse_datetime(file_data.created_time),
+                drive_modified_time=self._parse_datetime(file_data.modified_time),
+                drive_file_path=file_data.path,
+                folder_id_path=file_data.folder_id_path
             )
             self.db.add(indexed_file)
+        
+        return True
+    
+    def _insert_chunks(self, content_blob: ContentBlob, content_text: str) -> int:
+        """
+        Fragmenta el texto de un blob e inserta sus fragmentos
+        
+        Args:
+            content_blob: Blob ya guardado al que pertenecen los fragmentos
+            content_text: Texto del blob
+        
+        Returns:
+            Número de fragmentos insertados
+        """
+        chunks = chunk_text(content_text)
+        if chunks:
+            self.db.bulk_insert_mappings(ContentChunk, [
+                dict(
+                    content_blob_id=content_blob.id,
+                    ordinal=chunk.ordinal,
+                    char_start=chunk.char_start,
+                    char_end=chunk.char_end,
+                    heading=chunk.heading,
+                    text=chunk.text,
+                    token_estimate=chunk.token_estimate,
+                    content_hash=chunk.content_hash
+                )
+                for chunk in chunks
+            ])
+        return len(chunks)
+    
+    def _find_content_blob(self, file_data: DriveFileMeta) -> Optional[ContentBlob]:
+        """
+        Busca el texto ya extraído de un archivo con los mismos bytes
+        
+        Args:
+            file_data: Datos del archivo de Google Drive
+        
+        El blob queda bloqueado en modo compartido hasta el commit, para que
+        `prune_content_blobs` no lo elimine antes de que el archivo lo referencie.
+        
+        Returns:
+            Blob con el md5Checksum y tamaño del archivo, o None (también si Drive no informa checksum)
+        """
+        if not file_data.md5_checksum:
+            return None
+        return self.db.query(ContentBlob).filter(
+            and_(
+                ContentBlob.md5_checksum == file_data.md5_checksum,
+                ContentBlob.file_size == file_data.size
+            )
+        ).with_for_update(read=True).first()
+    
+    def _store_content_blob(self, file_data: DriveFileMeta, content_text: str, content_partial: bool) -> ContentBlob:
+        """
+        Guarda el texto extraído de un archivo comprimido, y sus fragmentos, en un blob
+        
+        Con md5Checksum el blob queda compartido por los archivos con los mismos
+        bytes; si otro trabajo guardó el mismo contenido al mismo tiempo, se usa
+        ese blob. Sin checksum (Google Workspace) el blob es solo de este archivo.
+        
+        Args:
+            file_data: Datos del archivo de Google Drive
+            content_text: Texto extraído y sanitizado
+            content_partial: Si el texto proviene solo de una parte del archivo
+        
+        Returns:
+            Blob del contenido del archivo
+        """
+        content_data, content_encoding = compress_text(content_text)
+        content_blob = ContentBlob(
+            md5_checksum=file_data.md5_checksum or None,
+            file_size=file_data.size if file_data.md5_checksum else None,
+            content_data=content_data,
+            content_encoding=content_encoding,
+            content_chars=len(content_text),
+            stored_bytes=len(content_data),
+            content_partial=content_partial
+        )
+        if file_data.md5_checksum:
+            # Enviar los cambios pendientes antes, para que el savepoint solo cubra el blob
+            self.db.flush()
+            try:
+                with self.db.begin_nested():
+                    self.db.add(content_blob)
+                    self.db.flush()
+            except IntegrityError:
+                logger.debug(f"♻️ Content of file {file_data.id} was stored concurrently, reusing it")
+                return self._find_content_blob(file_data)
+        else:
+            self.db.add(content_blob)
+            self.db.flush()
+        
+        count = self._insert_chunks(content_blob, content_text)
+        logger.debug(f"🧩 Stored content blob {content_blob.id} for {file_data.id}: {len(content_text)} chars in {len(content_data)} {content_encoding} bytes, {count} chunks")
+        return content_blob
+    
+    def prune_content_blobs(self, blob_ids: Iterable[int]) -> int:
+        """
+        Elimina los blobs de contenido indicados que ya no usa ningún archivo indexado (y sus fragmentos)
+        
+        Los blobs se bloquean antes de comprobar si siguen en uso: un trabajo
+        que acaba de enlazar uno (ver `_find_content_blob`) termina antes, y la
+        comprobación ve su referencia.
+        
+        Args:
+            blob_ids: Blobs que dejaron de referenciar los archivos modificados o eliminados
+        
+        Returns:
+            Número de blobs eliminados
+        """
+        blob_ids = sorted({blob_id for blob_id in blob_ids if blob_id is not None})
+        deleted = 0
+        for i in range(0, len(blob_ids), 500):
+            # Lock in id order so concurrent prunes cannot deadlock
+            locked = [
+                blob_id for (blob_id,) in self.db.query(ContentBlob.id).filter(
+                    ContentBlob.id.in_(blob_ids[i:i + 500])
+                ).order_by(ContentBlob.id).with_for_update().all()
+            ]
+            if not locked:
+                continue
+            deleted += self.db.query(ContentBlob).filter(
+                and_(
+                    ContentBlob.id.in_(locked),
+                    ~self.db.query(IndexedFile.id).filter(IndexedFile.content_blob_id == ContentBlob.id).exists()
+                )
+            ).delete(synchronize_session=False)
+        if deleted:
+            logger.info(f"🗑️ Removed {deleted} unused content blobs")
+        return deleted
+    
+    def _is_unchanged(self, indexed_file: IndexedFile, file_data: DriveFileMeta) -> bool:
+        """
+        Compara los metadatos del listado con el registro almacenado
+        
+        Un archivo no cambió si se indexó correctamente, sin fallar la descarga
+        ni la extracción de su contenido, y coinciden su modifiedTime, su
+        md5Checksum (cuando Drive lo informa) y sus carpetas padre.
+        
+        Args:
+            indexed_file: Registro existente del archivo
+            file_data: Datos del archivo de Google Drive
+        
+        Returns:
+            True si se puede omitir la descarga y la actualización
+        """
+        if indexed_file.indexing_status != "completed" or indexed_file.content_error:
+            return False
+        
+        modified_time = self._parse_datetime(file_data.modified_time)
+        if modified_time is None or indexed_file.drive_modified_time is None:
+            return False
+        if self._to_utc(modified_time) != self._to_utc(indexed_file.drive_modified_time):
+            return False
+        
+        md5_checksum = file_data.md5_checksum
+        if md5_checksum and md5_checksum != indexed_file.md5_checksum:
+            return False
+        
+        parents = json.dumps(file_data.parents) if file_data.parents else None
+        return parents == indexed_file.parents
+    
+    def _to_utc(self, value: datetime) -> datetime:
+        """Normaliza un datetime a UTC sin zona horaria para compararlo"""
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    
+    def _download_reservation(self, file_data: DriveFileMeta, is_large: bool) -> int:
+        """
+        Bytes que una descarga reserva del presupuesto global antes de empezar
+        
+        Args:
+            file_data: Datos del archivo de Google Drive
+            is_large: Si solo se descarga una ventana del archivo
+        
+        Returns:
+            Tamaño listado del archivo, la ventana de un archivo grande o el
+            tope de exportación de Google Workspace (cuyo tamaño Drive no informa)
+        """
+        if file_data.is_google_doc:
+            return DRIVE_EXPORT_MAX_BYTES
+        if is_large:
+            return DRIVE_PARTIAL_PREFIX_BYTES + DRIVE_PARTIAL_SUFFIX_BYTES
+        return file_data.size
+    
+    def _same_content_revision(self, indexed_file: IndexedFile, file_data: DriveFileMeta) -> bool:
+        """
+        Indica si el contenido del archivo es el mismo que se extrajo la última vez
+        
+        Drive solo informa headRevisionId (y md5Checksum) de archivos binarios.
+        Los de Google Workspace se comparan por `version`, que sube con cualquier
+        cambio, o por modifiedTime, que no cambia al moverlos de carpeta. Si la
+        última extracción no guardó texto (falló o no había contenido) no se reutiliza.
+        
+        Args:
+            indexed_file: Registro existente del archivo
+            file_data: Datos del archivo de Google Drive
+        
+        Returns:
+            True si se puede reutilizar el texto almacenado sin descargar ni exportar
+        """
+        # Solo hay algo que reutilizar si la última extracción guardó contenido
+        if (
+            indexed_file.indexing_status != "completed"
+            or indexed_file.content_blob_id is None
+            or indexed_file.content_error
+        ):
+            return False
+        
+        if not file_data.is_google_doc:
+            if file_data.head_revision_id and indexed_file.head_revision_id:
+                return file_data.head_revision_id == indexed_file.head_revision_id
+            return bool(file_data.md5_checksum) and file_data.md5_checksum == indexed_file.md5_checksum
+        
+        if file_data.version and indexed_file.drive_version and file_data.version == indexed_file.drive_version:
+            return True
+        modified_time = self._parse_datetime(file_data.modified_time)
+        return (
+            modified_time is not None
+            and indexed_file.drive_modified_time is not None
+            and self._to_utc(modified_time) == self._to_utc(indexed_file.drive_modified_time)
+        )
+    
+    def get_unchanged_file_ids(self, drive_folder_id: str, files: List[DriveFileMeta], batch_size: int = 500) -> Set[str]:
+        """
+        Obtiene los IDs de los archivos de un listado que no cambiaron desde su indexación
+        
+        Usa una consulta por lote en lugar de una por archivo, para que un
+        reindexado sin cambios cueste poco más que el propio listado.
+        
+        Args:
+            drive_folder_id: ID de la carpeta principal del programa
+            files: Datos de archivos de Google Drive (una página del escaneo)
+            batch_size: Tamaño de cada lote de la consulta IN
+        
+        Returns:
+            Conjunto de IDs de archivo que se pueden omitir
+        """
+        by_id = {file_data.id: file_data for file_data in files if file_data.id}
+        file_ids = list(by_id)
+        unchanged = set()
+        for i in range(0, len(file_ids), batch_size):
+            rows = self.db.query(IndexedFile).filter(
+                and_(
+                    IndexedFile.drive_folder_id == drive_folder_id,
+                    IndexedFile.drive_file_id.in_(file_ids[i:i + batch_size])
+                )
+            ).options(
+                load_only(
+                    IndexedFile.drive_file_id,
+                    IndexedFile.indexing_status,
+                    IndexedFile.content_error,
+                    IndexedFile.md5_checksum,
+                    IndexedFile.parents,
+                    IndexedFile.drive_modified_time,
+                    IndexedFile.drive_file_path,
+                    IndexedFile.folder_id_path
+                )
+            ).all()
+            for row in rows:
+                file_data = by_id[row.drive_file_id]
+                if not self._is_unchanged(row, file_data):
+                    continue
+                unchanged.add(row.drive_file_id)
+                # Un archivo sin cambios puede haber quedado bajo una carpeta renombrada
+                if file_data.folder_id_path and (
+                    row.drive_file_path != file_data.path or row.folder_id_path != file_data.folder_id_path
+                ):
+                    row.drive_file_path = file_data.path
+                    row.folder_id_path = file_data.folder_id_path
+        return unchanged
+    
+    def _like_prefix(self, prefix: str) -> str:
+        """Patrón LIKE que coincide con todo lo que empieza por `prefix` (escapando comodines)"""
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return escaped + "%"
+    
+    def get_folder_node(self, drive_folder_id: str, folder_id: str) -> Optional[DriveFolderNode]:
+        """
+        Obtiene el nodo de una carpeta en la jerarquía persistida de un programa
+        
+        Args:
+            drive_folder_id: ID de la carpeta principal del programa
+            folder_id: ID de la carpeta de Google Drive
+        
+        Returns:
+            Nodo de la carpeta o None si todavía no se escaneó
+        """
+        return self.db.query(DriveFolderNode).filter(
+            and_(
+                DriveFolderNode.drive_folder_id == drive_folder_id,
+                DriveFolderNode.folder_id == folder_id
+            )
+        ).first()
+    
+    def ensure_root_node(self, drive_folder_id: str) -> DriveFolderNode:
+        """
+        Crea el nodo raíz de la jerarquía de un programa si no existe
+        
+        Args:
+            drive_folder_id: ID de la carpeta principal del programa
+        
+        Returns:
+            Nodo de la carpeta principal (ruta "" e id_path "/<drive_folder_id>/")
+        """
+        node = self.get_folder_node(drive_folder_id, drive_folder_id)
+        if node is None:
+            node = DriveFolderNode(
+                drive_folder_id=drive_folder_id,
+                folder_id=drive_folder_id,
+                parent_id=None,
+                name=None,
+                path="",
+                id_path=f"/{drive_folder_id}/",
+                depth=0
+            )
+            self.db.add(node)
+            self.db.commit()
+        return node
+    
+    def apply_folder_paths(self, drive_folder_id: str, files: List[DriveFileMeta]):
+        """
+        Completa las rutas de una página del escaneo y actualiza la jerarquía de carpetas
+        
+        Los archivos que llegan sin rutas (p. ej. desde la Changes API) las
+        toman del nodo de su carpeta padre. Cada carpeta de la página se guarda
+        como nodo con su ruta materializada; si una carpeta conocida cambió de
+        nombre o de lugar, se reescriben las rutas de todo su subárbol con dos
+        UPDATE por prefijo, sin recorrerlo.
+        
+        Args:
+            drive_folder_id: ID de la carpeta principal del programa
+            files: Datos de archivos de Google Drive (se modifican en el lugar)
+        """
+        folder_ids = {f.id for f in files if f.id and f.mime_type in FOLDER_TYPES}
+        parent_ids = {
+            parent for f in files if not f.folder_id_path
+            for parent in f.parents
+        }
+        wanted = list(folder_ids | parent_ids)
+        if not wanted:
+            return
+        
+        nodes = {}
+        for i in range(0, len(wanted), 500):
+            for node in self.db.query(DriveFolderNode).filter(
+                and_(
+                    DriveFolderNode.drive_folder_id == drive_folder_id,
+                    DriveFolderNode.folder_id.in_(wanted[i:i + 500])
+                )
+            ).all():
+                nodes[node.folder_id] = node
+        
+        for file_data in files:
+            if not file_data.folder_id_path:
+                parent_node = next(
+                    (nodes[parent] for parent in file_data.parents if parent in nodes),
+                    None
+                )
+                if parent_node is None:
+                    continue
+                file_data.folder_id_path = parent_node.id_path
+                file_data.folder_path = parent_node.path
+            
+            if file_data.id not in folder_ids:
+                continue
+            id_path = f"{file_data.folder_id_path}{file_data.id}/"
+            path = file_data.path
+            node = nodes.get(file_data.id)
+            if node is None:
+                node = DriveFolderNode(
+                    drive_folder_id=drive_folder_id,
+                    folder_id=file_data.id,
+                    parent_id=file_data.folder_id_path.rstrip("/").rsplit("/", 1)[-1],
+                    name=file_data.name,
+                    path=path,
+                    id_path=id_path,
+                    depth=id_path.count("/") - 2
+                )
+                self.db.add(node)
+                nodes[node.folder_id] = node
+            elif node.id_path != id_path or node.path != path:
+                self._move_subtree(drive_folder_id, node, file_data.name, path, id_path)
+    
+    def _move_subtree(self, drive_folder_id: str, node: DriveFolderNode, name: Optional[str], path: str, id_path: str):
+        """
+        Reescribe las rutas de una carpeta renombrada o movida y de todo lo que contiene
+        
+        Args:
+            drive_folder_id: ID de la carpeta principal del programa
+            node: Nodo de la carpeta con sus rutas anteriores
+            name: Nombre actual de la carpeta
+            path: Nueva ruta de nombres
+            id_path: Nueva ruta de IDs
+        """
+        old_path, old_id_path = node.path, node.id_path
+        depth_delta = (id_path.count("/") - 2) - node.depth
+        pattern = self._like_prefix(old_id_path)
+        
+        self.db.query(DriveFolderNode).filter(
+            and_(
+                DriveFolderNode.drive_folder_id == drive_folder_id,
+                DriveFolderNode.id_path.like(pattern, escape="\\")
+            )
+        ).update({
+            DriveFolderNode.id_path: literal(id_path, Text).concat(func.substr(DriveFolderNode.id_path, len(old_id_path) + 1)),
+            DriveFolderNode.path: literal(path, Text).concat(func.substr(DriveFolderNode.path, len(old_path) + 1)),
+            DriveFolderNode.depth: DriveFolderNode.depth + depth_delta
+        }, synchronize_session=False)
+        
+        self.db.query(IndexedFile).filter(
+            and_(
+                IndexedFile.drive_folder_id == drive_folder_id,
+                IndexedFile.folder_id_path.like(pattern, escape="\\")
+            )
+        ).update({
+            IndexedFile.folder_id_path: literal(id_path, Text).concat(func.substr(IndexedFile.folder_id_path, len(old_id_path) + 1)),
+            IndexedFile.drive_file_path: literal(path, Text).concat(func.substr(IndexedFile.drive_file_path, len(old_path) + 1))
+        }, synchronize_session=False)
+        
+        # Mantener el objeto en memoria coherente con la base de datos
+        node.id_path = id_path
+        node.path = path
+        node.depth += depth_delta
+        node.name = name
+        node.parent_id = id_path.rstrip("/").rsplit("/", 2)[-2]
+        logger.info(f"📁 Folder {node.folder_id} moved or renamed, rewrote paths under {path or '/'}")
+    
+    def _filter_folder_subtree(self, query, drive_folder_id: str, folder_id: Optional[str]):
+        """
+        Restringe una consulta de IndexedFile al subárbol de una carpeta
+        
+        Args:
+            query: Consulta sobre IndexedFile
+            drive_folder_id: ID de la carpeta principal del programa
+            folder_id: Carpeta cuyo subárbol se quiere (None o la raíz = sin filtro)
+        
+        Returns:
+            Consulta filtrada; vacía si la carpeta no está en la jerarquía
+        """
+        if not folder_id or folder_id == drive_folder_id:
+            return query
+        node = self.get_folder_node(drive_folder_id, folder_id)
+        if node is None:
+            return query.filter(false())
+        return query.filter(IndexedFile.folder_id_path.like(self._like_prefix(node.id_path), escape="\\"))
+    
+    def get_indexed_folder_ids(self, drive_folder_id: str) -> Set[str]:
+        """
+        Obtiene los IDs de las carpetas ya indexadas de un programa
+        
+        Args:
+            drive_folder_id: ID de la carpeta principal del programa
+        
+        Returns:
+            Conjunto de IDs de carpetas de Drive
+        """
+        rows = self.db.query(IndexedFile.drive_file_id).filter(
+            and_(
+                IndexedFile.drive_folder_id == drive_folder_id,
+                IndexedFile.file_type == FOLDER_TYPES['application/vnd.google-apps.folder']
+            )
+        ).all()
+        return {row[0] for row in rows}
+    
+    def get_indexed_file_ids(self, drive_folder_id: str, file_ids: Iterable[str], batch_size: int = 500) -> Set[str]:
+        """
+        Filtra los IDs de archivo que ya están indexados en un programa
+        
+        Args:
+            drive_folder_id: ID de la carpeta principal del programa
+            file_ids: IDs de archivo a comprobar
+            batch_size: Tamaño de cada lote de la consulta IN
+        
+        Returns:
+            Subconjunto de file_ids que existen en indexed_files
+        """
+        file_ids = list(file_ids)
+        found = set()
+        for i in range(0, len(file_ids), batch_size):
+            rows = self.db.query(IndexedFile.drive_file_id).filter(
+                and_(
+                    IndexedFile.drive_folder_id == drive_folder_id,
+                    IndexedFile.drive_file_id.in_(file_ids[i:i + batch_size])
+                )
+            ).all()
+            found.update(row[0] for row in rows)
+        return found
+    
+    def plan_drive_changes(
+        self,
+        drive_folder_id: str,
+        changes: List[Dict],
+        include_trashed: bool = False
+    ) -> Dict[str, List]:
+        """
+        Clasifica los cambios de la Changes API de Drive para un programa
+        
+        La Changes API devuelve cambios de todo el Drive del usuario, así que
+        solo se conservan los archivos cuyo padre está dentro del árbol del
+        programa. Las carpetas que entran al árbol en el mismo lote amplían el
+        alcance hasta llegar a un punto fijo.
+        
+        Args:
+            drive_folder_id: ID de la carpeta principal del programa
+            changes: Cambios devueltos por GoogleDriveScanner.list_changes
+            include_trashed: Mantener indexados los archivos en papelera
+        
+        Returns:
+            Diccionario con:
+              - upserts: metadatos de archivos nuevos o modificados a procesar
+              - removals: IDs indexados a eliminar (borrados, en papelera o movidos fuera)
+              - new_folders: carpetas que entraron al árbol y deben escanearse completas
+        """
+        # Keep only the latest change per file, in change order
+        latest: Dict[str, Dict] = {}
+        for change in changes:
+            file_id = change.get("file_id")
+            if file_id:
+                latest.pop(file_id, None)
+                latest[file_id] = change
+        
+        known_folders = self.get_indexed_folder_ids(drive_folder_id)
+        in_scope = known_folders | {drive_folder_id}
+        upserts: Dict[str, DriveFileMeta] = {}
+        new_folders: List[str] = []
+        
+        grew = True
+        while grew:
+            grew = False
+            for file_id, change in latest.items():
+                file_data = change.get("file")
+                if file_id in upserts or change.get("removed") or not file_data:
+                    continue
+                if file_data.trashed and not include_trashed:
+                    continue
+                if not any(parent in in_scope for parent in file_data.parents):
+                    continue
+                
+                upserts[file_id] = file_data
+                if file_data.mime_type in FOLDER_TYPES and file_id not in in_scope:
+                    in_scope.add(file_id)
+                    new_folders.append(file_id)
+                    grew = True
+        
+        # Folders we did not know about may bring existing content with them;
+        # scanning the top-most ones covers their whole subtree.
+        new_folder_set = set(new_folders)
+        new_folders = [
+            folder_id for folder_id in new_folders
+            if folder_id not in known_folders
+            and not any(parent in new_folder_set for parent in upserts[folder_id].parents)
+        ]
+        
+        indexed_ids = self.get_indexed_file_ids(drive_folder_id, latest.keys())
+        removals = [file_id for file_id in latest if file_id in indexed_ids and file_id not in upserts]
+        
+        return {
+            "upserts": list(upserts.values()),
+            "removals": removals,
+            "new_folders": new_folders
+        }
+    
+    def remove_indexed_files(self, drive_folder_id: str, file_ids: List[str]) -> int:
+        """
+        Elimina archivos indexados de un programa, incluyendo el contenido de las carpetas eliminadas
+        
+        Args:
+            drive_folder_id: ID de la carpeta principal del programa
+            file_ids: IDs de archivo de Drive a eliminar
+        
+        Returns:
+            Número de registros eliminados
+        """
+        to_delete = set(file_ids)
+        frontier = [
+            file_id for file_id in self.get_indexed_folder_ids(drive_folder_id)
+            if file_id in to_delete
+        ]
+        
+        # Walk down removed folders through the JSON parents column
+        while frontier:
+            folder_id = frontier.pop()
+            children = self.db.query(IndexedFile.drive_file_id, IndexedFile.file_type).filter(
+                and_(
+                    IndexedFile.drive_folder_id == drive_folder_id,
+                    IndexedFile.parents.like(f'%"{folder_id}"%')
+                )
+            ).all()
+            for child_id, child_type in children:
+                if child_id not in to_delete:
+                    to_delete.add(child_id)
+                    if child_type == FOLDER_TYPES['application/vnd.google-apps.folder']:
+                        frontier.append(child_id)
+        
+        deleted = 0
+        released_blob_ids = set()
+        ids = list(to_delete)
+        for i in range(0, len(ids), 500):
+            batch = self.db.query(IndexedFile).filter(
+                and_(
+                    IndexedFile.drive_folder_id == drive_folder_id,
+                    IndexedFile.drive_file_id.in_(ids[i:i + 500])
+                )
+            )
+            # Only the blobs of removed files can become unused
+            released_blob_ids.update(
+                blob_id for (blob_id,) in batch.with_entities(IndexedFile.content_blob_id).filter(
+                    IndexedFile.content_blob_id.isnot(None)
+                ).distinct()
+            )
+            deleted += batch.delete(synchronize_session=False)
+        
+        # Drop the hierarchy nodes of removed folders, including their subtrees
+        for i in range(0, len(ids), 500):
+            removed_nodes = self.db.query(DriveFolderNode.id_path).filter(
+                and_(
+                    DriveFolderNode.drive_folder_id == drive_folder_id,
+                    DriveFolderNode.folder_id.in_(ids[i:i + 500])
+                )
+            ).all()
+            for (id_path,) in removed_nodes:
+                self.db.query(DriveFolderNode).filter(
+                    and_(
+                        DriveFolderNode.drive_folder_id == drive_folder_id,
+                        DriveFolderNode.id_path.like(self._like_prefix(id_path), escape="\\")
+                    )
+                ).delete(synchronize_session=False)
+        
+        logger.info(f"🗑️ Removed {deleted} indexed files from {drive_folder_id}")
+        self.prune_content_blobs(released_blob_ids)
+        return deleted
     
     def _create_failed_file_record(
         self, 
         job: IndexingJob, 
-        file_data: Dict, 
+        file_data: DriveFileMeta, 
         error_message: str
     ):
         """
@@ -319,7 +1050,7 @@ class IndexingService:
             file_data: Datos del archivo
             error_message: Mensaje de error
         """
-        file_id = file_data.get("id", "")
+        file_id = file_data.id
         
         # Check if file already exists
         existing_file = self.db.query(IndexedFile).filter(
@@ -340,50 +1071,73 @@ class IndexingService:
             indexed_file = IndexedFile(
                 program_id=job.program_id,
                 drive_file_id=self._sanitize_content(file_id),
-                drive_file_name=self._sanitize_content(file_data.get("name", "")),
-                mime_type=self._sanitize_content(file_data.get("mimeType", "")),
-                file_type=self._sanitize_content(file_data.get("file_type", "")),
-                file_size=file_data.get("size", 0),
-                web_view_link=self._sanitize_content(file_data.get("webViewLink", "")),
-                is_google_doc=file_data.get("is_google_doc", False),
-                is_downloadable=file_data.get("downloadable", True),
+                drive_file_name=self._sanitize_content(file_data.name),
+                mime_type=self._sanitize_content(file_data.mime_type),
+                file_type=self._sanitize_content(file_data.file_type),
+                file_size=file_data.size,
+                web_view_link=self._sanitize_content(file_data.web_view_link),
+                is_google_doc=file_data.is_google_doc,
+                is_downloadable=file_data.downloadable,
                 indexing_status="failed",
                 indexing_error=self._sanitize_content(error_message),
                 last_indexed_at=datetime.utcnow(),
-                drive_created_time=self._parse_datetime(file_data.get("createdTime")),
-                drive_modified_time=self._parse_datetime(file_data.get("modifiedTime"))
+                drive_created_time=self._parse_datetime(file_data.created_time),
+                drive_modified_time=self._parse_datetime(file_data.modified_time)
             )
             self.db.add(indexed_file)
             logger.debug(f"Created new failed file record for {file_id}")
     
-    def _sanitize_content(self, content: str) -> str:
+    def _read_text(self, content_file, chunk_size: int = 64 * 1024) -> str:
         """
-        Sanitiza el contenido de texto removiendo caracteres problemáticos
+        Decodifica texto UTF-8 de un archivo de forma incremental
+        
+        Deja de leer cuando ya hay más texto del que se almacena, para que el
+        tamaño del archivo no determine el uso de memoria.
         
         Args:
-            content: Contenido de texto a sanitizar
+            content_file: Archivo binario posicionado al inicio
+            chunk_size: Bytes leídos por iteración
         
         Returns:
-            Contenido sanitizado
+            Texto decodificado (como máximo un bloque más allá del límite)
         """
-        if not content:
-            return content
+        return decode_text(content_file, self.MAX_CONTENT_CHARS, chunk_size)
+    
+    async def _extract_text(self, content_file, file_data: DriveFileMeta) -> Optional[str]:
+        """
+        Extrae el texto de un archivo descargado con el extractor de su tipo
+        
+        Los PDF y archivos de Office se procesan en el pool de procesos de
+        `apps.text_extraction`, nunca en el hilo del event loop. Las
+        exportaciones de Google Workspace ya son texto.
+        
+        Args:
+            content_file: Archivo binario posicionado al inicio
+            file_data: Datos del archivo de Google Drive
         
-        # Remover caracteres NUL (0x00) y otros caracteres de control problemáticos
-        # Mantener solo caracteres imprimibles y espacios
-        sanitized = ''.join(char for char in content if ord(char) >= 32 or char in '\n\r\t')
+        Returns:
+            Texto extraído, o None si el tipo de archivo no tiene texto
+        """
+        if file_data.is_google_doc:
+            return self._read_text(content_file)
         
-        # Remover caracteres NUL específicamente (por si acaso)
-        sanitized = sanitized.replace('\x00', '')
+        extractor = get_extractor(file_data.mime_type, file_data.file_type)
+        if extractor is None:
+            logger.debug(f"🚫 No text extractor for {file_data.mime_type} ({file_data.id})")
+            return None
+        return await extract_text(extractor, content_file, self.MAX_CONTENT_CHARS)
+    
+    def _sanitize_content(self, content: str) -> str:
+        """
+        Sanitiza el contenido de texto removiendo caracteres problemáticos
         
-        # Limitar el tamaño del contenido para evitar problemas de base de datos
-        max_length = 1000000  # 1MB de texto
-        if len(sanitized) > max_length:
-            # Asegurar que el texto truncado + mensaje no exceda el límite
-            truncate_length = max_length - len("\n\n[CONTENT TRUNCATED]")
-            sanitized = sanitized[:truncate_length] + "\n\n[CONTENT TRUNCATED]"
+        Args:
+            content: Contenido de texto a sanitizar
         
-        return sanitized
+        Returns:
+            Contenido sanitizado
+        """
+        return sanitize_text(content, self.MAX_CONTENT_CHARS)
     
     def _parse_datetime(self, datetime_str: Optional[str]) -> Optional[datetime]:
         """
@@ -425,7 +1179,8 @@ class IndexingService:
                 "total_files": job.total_files,
                 "processed_files": job.processed_files,
                 "successful_files": job.successful_files,
-                "failed_files": job.failed_files
+                "failed_files": job.failed_files,
+                "skipped_unchanged": job.skipped_unchanged or 0
             },
             "error_message": job.error_message,
             "started_at": job.started_at,
@@ -437,7 +1192,8 @@ class IndexingService:
         drive_folder_id: str, 
         query: str, 
         file_types: Optional[List[str]] = None,
-        limit: int = 50
+        limit: int = 50,
+        folder_id: Optional[str] = None
     ) -> Tuple[List[IndexedFile], int]:
         """
         Busca archivos indexados en un programa
@@ -447,10 +1203,19 @@ class IndexingService:
             query: Consulta de búsqueda
             file_types: Tipos de archivo a filtrar
             limit: Límite de resultados
+            folder_id: Limitar la búsqueda al subárbol de esta carpeta
         
         Returns:
             Tupla con lista de archivos y total de resultados
         """
+        # El texto se guarda comprimido: el contenido se busca en sus fragmentos
+        content_match = self.db.query(ContentChunk.id).filter(
+            and_(
+                ContentChunk.content_blob_id == IndexedFile.content_blob_id,
+                ContentChunk.text.ilike(f"%{query}%")
+            )
+        ).exists()
+        
         # Construir consulta base
         base_query = self.db.query(IndexedFile).filter(
             and_(
@@ -458,7 +1223,7 @@ class IndexingService:
                 IndexedFile.indexing_status == "completed",
                 or_(
                     IndexedFile.drive_file_name.ilike(f"%{query}%"),
-                    IndexedFile.content_text.ilike(f"%{query}%")
+                    content_match
                 )
             )
         )
@@ -467,6 +1232,9 @@ class IndexingService:
         if file_types:
             base_query = base_query.filter(IndexedFile.file_type.in_(file_types))
         
+        # Filtrar por subárbol de carpeta
+        base_query = self._filter_folder_subtree(base_query, drive_folder_id, folder_id)
+        
         # Obtener total de resultados
         total_count = base_query.count()
         
@@ -475,11 +1243,61 @@ class IndexingService:
         
         return files, total_count
     
+    def search_chunks(
+        self,
+        drive_folder_id: str,
+        query: str,
+        file_types: Optional[List[str]] = None,
+        limit: int = 20,
+        folder_id: Optional[str] = None
+    ) -> Tuple[List[Tuple[ContentChunk, IndexedFile]], int]:
+        """
+        Busca fragmentos de contenido en los archivos indexados de un programa
+        
+        Devuelve solo los pasajes que contienen la consulta, sin cargar el
+        texto completo de los documentos.
+        
+        Args:
+            drive_folder_id: ID de la carpeta principal del programa
+            query: Consulta de búsqueda
+            file_types: Tipos de archivo a filtrar
+            limit: Límite de fragmentos
+            folder_id: Limitar la búsqueda al subárbol de esta carpeta
+        
+        Returns:
+            Tupla con lista de (fragmento, archivo) y total de fragmentos encontrados
+        """
+        # Fragmentos del blob de cada archivo (compartido con los archivos con los mismos bytes)
+        base_query = self.db.query(ContentChunk, IndexedFile).join(
+            IndexedFile, ContentChunk.content_blob_id == IndexedFile.content_blob_id
+        ).options(
+            load_only(IndexedFile.drive_file_id, IndexedFile.drive_file_name, IndexedFile.file_type, IndexedFile.web_view_link)
+        ).filter(
+            and_(
+                IndexedFile.drive_folder_id == drive_folder_id,
+                IndexedFile.indexing_status == "completed",
+                ContentChunk.text.ilike(f"%{query}%")
+            )
+        )
+        
+        # Filtrar por tipos de archivo
+        if file_types:
+            base_query = base_query.filter(IndexedFile.file_type.in_(file_types))
+        
+        # Filtrar por subárbol de carpeta
+        base_query = self._filter_folder_subtree(base_query, drive_folder_id, folder_id)
+        
+        total_count = base_query.count()
+        rows = base_query.order_by(IndexedFile.id, ContentChunk.ordinal).limit(limit).all()
+        
+        return rows, total_count
+    
     def get_program_files(
         self, 
         drive_folder_id: str, 
         file_types: Optional[List[str]] = None,
-        limit: int = 100
+        limit: int = 100,
+        folder_id: Optional[str] = None
     ) -> List[IndexedFile]:
         """
         Obtiene todos los archivos indexados de un programa
@@ -488,6 +1306,7 @@ class IndexingService:
             drive_folder_id: ID de la carpeta principal del programa
             file_types: Tipos de archivo a filtrar
             limit: Límite de resultados
+            folder_id: Limitar a los archivos bajo esta carpeta (a cualquier profundidad)
         
         Returns:
             Lista de archivos indexados
@@ -502,8 +1321,53 @@ class IndexingService:
         if file_types:
             query = query.filter(IndexedFile.file_type.in_(file_types))
         
+        query = self._filter_folder_subtree(query, drive_folder_id, folder_id)
+        
         return query.limit(limit).all()
     
+    def get_indexed_file(self, drive_folder_id: str, drive_file_id: str) -> Optional[IndexedFile]:
+        """
+        Obtiene un archivo indexado de un programa, sin su texto
+        
+        Args:
+            drive_folder_id: ID de la carpeta principal del programa
+            drive_file_id: ID del archivo en Google Drive
+        
+        Returns:
+            Archivo indexado o None
+        """
+        return self.db.query(IndexedFile).filter(
+            and_(
+                IndexedFile.drive_folder_id == drive_folder_id,
+                IndexedFile.drive_file_id == drive_file_id
+            )
+        ).first()
+    
+    def get_content_texts(self, files: Iterable[IndexedFile]) -> Dict[int, Optional[str]]:
+        """
+        Carga y descomprime el texto extraído de varios archivos con una sola consulta
+        
+        Las consultas de archivos no traen el texto; se pide aquí solo cuando se necesita.
+        
+        Args:
+            files: Archivos indexados
+        
+        Returns:
+            Texto de cada archivo por ID de registro (None si no tiene contenido)
+        """
+        files = list(files)
+        blob_ids = {indexed_file.content_blob_id for indexed_file in files if indexed_file.content_blob_id}
+        texts = {}
+        if blob_ids:
+            blobs = self.db.query(ContentBlob).options(undefer(ContentBlob.content_data)).filter(
+                ContentBlob.id.in_(blob_ids)
+            ).all()
+            texts = {
+                content_blob.id: decompress_text(content_blob.content_data, content_blob.content_encoding)
+                for content_blob in blobs
+            }
+        return {indexed_file.id: texts.get(indexed_file.content_blob_id) for indexed_file in files}
+    
     def get_indexing_jobs(self, program_id: int, limit: int = 20) -> List[IndexingJob]:
         """
         Obtiene los trabajos de indexación de un programa
@@ -1,6 +1,7 @@
 """
 Job Queue Processor - Processes indexing jobs from database queue
 """
+import asyncio
 import gc
 import json
 import logging
@@ -12,14 +13,21 @@ import threading
 import time
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 
 from database.database import SessionLocal
 from database.models import IndexingJob, Program, UserModel
-from apps.google_drive import GoogleDriveScanner
+from apps.google_drive import GoogleDriveScanner, DriveFileMeta, create_drive_client, DRIVE_SCAN_TWO_PHASE, FOLDER_TYPES, SHORTCUT_TYPES
+from apps.drive_rate_limiter import get_rate_limiter_stats
+from apps.drive_metadata_cache import get_metadata_cache_stats
+from apps.drive_export_policy import get_export_policy_stats
+from apps.drive_download_budget import get_download_budget_stats
+from apps.drive_cassette import get_cassette_stats
+from apps.google_token_manager import GoogleTokenManager
 from apps.indexing_service import IndexingService
+from apps.text_extraction import shutdown_extraction_pool
 from memory_monitor import get_memory_monitor, log_memory_usage
 
 logger = logging.getLogger(__name__)
@@ -38,6 +46,14 @@ class JobQueueProcessor:
         self.max_file_size_mb = 100  # Maximum file size to process (MB)
         self.memory_cleanup_interval = 100  # Cleanup memory every N files
         self.files_processed_since_cleanup = 0
+        self.scan_queue_size = 500  # Files buffered between the folder scan and processing
+        # Files downloaded and indexed at once per job; their bytes in flight are capped by the download budget
+        self.download_concurrency = max(1, int(os.environ.get("DRIVE_DOWNLOAD_CONCURRENCY") or 1))
+        
+        # Long-lived event loop and pooled Drive HTTP client, shared across jobs.
+        # Both live in the processing thread and are closed when the loop ends.
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._drive_client = None
         
         # Setup signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -97,7 +113,38 @@ class JobQueueProcessor:
         except Exception as e:
             logger.error(f"Error during memory cleanup: {str(e)}")
     
-    def _should_skip_file(self, file_data: Dict) -> bool:
+    def _run_async(self, coro):
+        """Run a coroutine on the processor's long-lived event loop"""
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+    
+    def _get_drive_client(self):
+        """Get the pooled Drive HTTP client, creating it on first use"""
+        if self._drive_client is None:
+            self._drive_client = create_drive_client()
+            logger.info(f"🌐 Created pooled Drive HTTP client for {self.process_id}")
+        return self._drive_client
+    
+    def _close_async_resources(self):
+        """Close the pooled Drive client and the event loop"""
+        try:
+            if self._drive_client is not None:
+                self._run_async(self._drive_client.aclose())
+                logger.info(f"🌐 Closed pooled Drive HTTP client for {self.process_id}")
+        except Exception as e:
+            logger.error(f"Error closing Drive HTTP client: {str(e)}")
+        finally:
+            self._drive_client = None
+        
+        if self._loop is not None and not self._loop.is_closed():
+            try:
+                self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            finally:
+                self._loop.close()
+        self._loop = None
+    
+    def _should_skip_file(self, file_data: DriveFileMeta) -> bool:
         """Check if file should be skipped (currently no files are skipped)"""
         # No files are skipped - all files are processed
         return False
@@ -133,6 +180,9 @@ class JobQueueProcessor:
         if self.thread and self.thread.is_alive():
             self.thread.join(timeout=30)  # Wait up to 30 seconds
         
+        # Stop the text extraction workers so they do not outlive the processor
+        shutdown_extraction_pool()
+        
         # Final memory cleanup
         self._cleanup_memory(force=True)
         
@@ -176,6 +226,8 @@ class JobQueueProcessor:
                 self._log_memory_usage("After error in processing loop")
                 self.shutdown_event.wait(30)  # Wait before retrying
         
+        self._close_async_resources()
+        
         logger.info(f"🛑 Job processing loop ended for {self.process_id}")
         self._log_memory_usage("Processing loop ended")
     
@@ -253,14 +305,17 @@ class JobQueueProcessor:
             
             logger.info(f"📋 Job {job.id} parameters - include_trashed: {include_trashed}, has_access_token: {bool(access_token)}")
             
+            user = db.query(UserModel).filter(UserModel.id == job.user_id).first()
             if not access_token:
                 # Get access token from user
-                user = db.query(UserModel).filter(UserModel.id == job.user_id).first()
                 if not user or not user.google_access_token:
                     raise Exception("No Google access token available")
                 access_token = user.google_access_token
                 logger.info(f"🔑 Retrieved access token from user {user.id} for job {job.id}")
             
+            # Keeps the token valid for scans that outlive it
+            token_manager = self._create_token_manager(user, access_token)
+            
             # Get program
             program = db.query(Program).filter(Program.id == job.program_id).first()
             if not program:
@@ -277,7 +332,8 @@ class JobQueueProcessor:
                 job, 
                 program, 
                 access_token, 
-                include_trashed
+                include_trashed,
+                token_manager
             )
             
             # Mark job as completed
@@ -288,7 +344,7 @@ class JobQueueProcessor:
             db.commit()
             
             processing_time = (datetime.utcnow() - start_time).total_seconds()
-            logger.info(f"✅ Job {job.id} completed successfully in {processing_time:.2f} seconds - Processed: {job.processed_files}, Successful: {job.successful_files}, Failed: {job.failed_files}")
+            logger.info(f"✅ Job {job.id} completed successfully in {processing_time:.2f} seconds - Processed: {job.processed_files}, Successful: {job.successful_files}, Failed: {job.failed_files}, Unchanged: {job.skipped_unchanged}")
             
         except Exception as e:
             processing_time = (datetime.utcnow() - start_time).total_seconds()
@@ -328,157 +384,450 @@ class JobQueueProcessor:
         job: IndexingJob, 
         program: Program, 
         access_token: str, 
-        include_trashed: bool
+        include_trashed: bool,
+        token_manager: Optional[GoogleTokenManager] = None
     ):
-        """Process indexing job synchronously (converted from async)"""
+        """Process indexing job synchronously by running the async scan/process pipeline on the processor loop"""
         try:
             # Update job status
             job.status = "running"
             job.started_at = datetime.utcnow()
             
-            # Create Google Drive scanner
-            scanner = GoogleDriveScanner(access_token)
+            # Create Google Drive scanner on top of the processor's pooled client
+            scanner = GoogleDriveScanner(access_token, client=self._get_drive_client(), token_manager=token_manager)
             folder_id = job.folder_id or program.drive_folder_id
             
-            logger.info(f"🔍 Starting Google Drive scan for program {program.id}, folder {folder_id} (include_trashed: {include_trashed})")
-            
-            # Scan folder (this needs to be converted to sync)
-            files = self._scan_folder_sync(scanner, folder_id, include_trashed)
-            
-            # Update counters
-            job.total_files = len(files)
-            job.processed_files = 0
-            job.successful_files = 0
-            job.failed_files = 0
+            tracks_program_tree = folder_id == program.drive_folder_id
             
-            logger.info(f"📊 Found {job.total_files} files to process for job {job.id}")
-            
-            # Process each file with memory management
-            for i, file_data in enumerate(files, 1):
-                file_id = file_data.get('id', 'unknown')
-                file_name = file_data.get('name', 'unnamed')
-                file_size_mb = file_data.get('size', 0) / (1024 * 1024)
-                
-                logger.info(f"📄 Processing file {i} of {len(files)} for job {job.id}: {file_name} ({file_size_mb:.1f}MB)")
+            # Reuse the processor's event loop so the pooled client keeps its connections
+            if job.job_type == "incremental" and tracks_program_tree and program.drive_changes_page_token:
+                logger.info(f"🔁 Starting incremental indexing for program {program.id} from Drive changes cursor")
+                new_page_token = self._run_async(self._run_incremental_pipeline(
+                    indexing_service,
+                    job,
+                    program,
+                    scanner,
+                    include_trashed
+                ))
+            else:
+                if job.job_type == "incremental":
+                    logger.info(f"🔁 No Drive changes cursor for program {program.id}, running a full scan instead")
                 
-                try:
-                    # Process all files (including large files and videos) with memory optimization
-                    self._process_file_sync(indexing_service, job, program, file_data, scanner)
-                    job.successful_files += 1
-                    
-                    # Increment processed files counter
-                    self.files_processed_since_cleanup += 1
-                    
-                    # Log progress every 10 files or for important milestones
-                    if job.processed_files % 10 == 0 or i == len(files):
-                        progress_pct = (job.processed_files / job.total_files) * 100 if job.total_files > 0 else 0
-                        logger.info(f"📈 Job {job.id} progress: {job.processed_files}/{job.total_files} files ({progress_pct:.1f}%) - ✅ {job.successful_files} successful, ❌ {job.failed_files} failed")
-                        
-                        # Log memory usage during progress
-                        self._log_memory_usage(f"Job {job.id} progress checkpoint")
-                        
-                except Exception as e:
-                    logger.error(f"❌ Error processing file {file_id} ({file_name}): {str(e)}")
-                    job.failed_files += 1
-                    
-                    # Create failed file record
-                    self._create_failed_file_record_sync(indexing_service, job, file_data, str(e))
+                logger.info(f"🔍 Starting Google Drive scan for program {program.id}, folder {folder_id} (include_trashed: {include_trashed})")
+                self._log_memory_usage("Before folder scan")
                 
-                job.processed_files += 1
+                # Take the changes cursor before listing so nothing changed during the scan is missed
+                new_page_token = self._run_async(self._get_start_page_token(scanner)) if tracks_program_tree else None
                 
-                # Update progress and commit every 10 files
-                if job.processed_files % 10 == 0:
-                    indexing_service.db.commit()
-                    
-                    # Run memory cleanup periodically
-                    self._cleanup_memory()
+                self._run_async(self._run_indexing_pipeline(
+                    indexing_service,
+                    job,
+                    program,
+                    scanner,
+                    scanner.iter_files(
+                        folder_id,
+                        include_trashed,
+                        lean=DRIVE_SCAN_TWO_PHASE,
+                        **self._folder_scan_paths(indexing_service, program, folder_id)
+                    ),
+                    lean_pages=DRIVE_SCAN_TWO_PHASE
+                ))
+            
+            # Persisted together with the job completion commit
+            if new_page_token:
+                program.drive_changes_page_token = new_page_token
             
             # Final memory cleanup after processing all files
             self._cleanup_memory(force=True)
             
-            logger.info(f"🎉 Indexing job {job.id} completed! Processed: {job.processed_files}, Successful: {job.successful_files}, Failed: {job.failed_files}")
+            logger.info(f"🎉 Indexing job {job.id} completed! Processed: {job.processed_files}, Successful: {job.successful_files}, Failed: {job.failed_files}, Unchanged: {job.skipped_unchanged}")
             
         except Exception as e:
             logger.error(f"💥 Error in indexing job {job.id}: {str(e)}")
             raise
     
-    def _scan_folder_sync(self, scanner: GoogleDriveScanner, folder_id: str, include_trashed: bool):
-        """Synchronous version of folder scanning with proper memory management"""
-        import asyncio
+    async def _run_indexing_pipeline(
+        self,
+        indexing_service: IndexingService,
+        job: IndexingJob,
+        program: Program,
+        scanner: GoogleDriveScanner,
+        pages,
+        lean_pages: bool = False
+    ):
+        """
+        Overlap folder listing and file processing through a bounded queue
+        
+        A producer task streams listing pages (e.g. from `scanner.iter_files()`)
+        into the queue and grows `job.total_files` as pages arrive; this coroutine
+        consumes files as soon as they are queued, with up to
+        `download_concurrency` files in progress at once. When the queue is full
+        the listing pauses, so memory stays flat however large the tree is, and
+        the process-wide download budget caps the bytes the consumers hold.
         
-        async def _async_scan():
+        With `lean_pages` the pages come from a lean listing: full metadata is
+        fetched only for the files that are new or changed.
+        """
+        file_queue: asyncio.Queue = asyncio.Queue(maxsize=self.scan_queue_size)
+        end_of_scan = object()
+        scan_errors = []
+        
+        # Reset counters; total_files grows as the scan discovers files
+        job.total_files = 0
+        job.processed_files = 0
+        job.successful_files = 0
+        job.failed_files = 0
+        job.skipped_unchanged = 0
+        
+        async def produce():
             try:
-                logger.info(f"🔍 Starting folder scan for folder {folder_id} (include_trashed: {include_trashed})")
-                self._log_memory_usage("Before folder scan")
-                
-                files = await scanner.scan_folder_recursive(folder_id, include_trashed)
-                
-                logger.info(f"📁 Folder scan completed, found {len(files)} files")
+                async for page in pages:
+                    job.total_files += len(page)
+                    logger.debug(f"📁 Scan page with {len(page)} files for job {job.id} (total so far: {job.total_files})")
+                    
+                    # Resolve materialized paths and keep the folder hierarchy up to date
+                    indexing_service.apply_folder_paths(program.drive_folder_id, page)
+                    
+                    # Files whose listing metadata matches the stored row never reach the queue
+                    unchanged = indexing_service.get_unchanged_file_ids(program.drive_folder_id, page)
+                    if unchanged:
+                        job.skipped_unchanged += len(unchanged)
+                        job.processed_files += len(unchanged)
+                        logger.debug(f"⏭️ Skipped {len(unchanged)} unchanged files for job {job.id}")
+                    
+                    # Commit before the next await: moving a folder row-locks every file under it,
+                    # and a consumer updating one of those files through its own session would block
+                    # the event loop on that lock while this transaction can never commit
+                    try:
+                        indexing_service.db.commit()
+                    except Exception:
+                        indexing_service.db.rollback()
+                        raise
+                    
+                    changed = [file_data for file_data in page if file_data.id not in unchanged]
+                    if lean_pages and changed:
+                        changed = await self._complete_metadata(indexing_service, job, scanner, changed)
+                    
+                    for file_data in changed:
+                        await file_queue.put(file_data)
+                logger.info(f"📁 Folder scan completed for job {job.id}, found {job.total_files} files")
                 self._log_memory_usage("After folder scan")
-                
-                return files
             except Exception as e:
-                logger.error(f"❌ Error during folder scan: {str(e)}")
+                logger.error(f"❌ Error during folder scan for job {job.id}: {str(e)}")
                 self._log_memory_usage("After folder scan error")
-                raise
+                scan_errors.append(e)
+            await file_queue.put(end_of_scan)
+        
+        async def consume():
+            # Each consumer writes its files through its own session, so a commit or
+            # a failed flush never involves another file's half-built rows
+            file_service = IndexingService(SessionLocal())
+            try:
+                while True:
+                    file_data = await file_queue.get()
+                    if file_data is end_of_scan:
+                        # Leave the marker for the other consumers (the slot it took is free)
+                        file_queue.put_nowait(end_of_scan)
+                        return
+                    await self._process_queued_file(file_service, indexing_service.db, job, program, file_data, scanner)
+            finally:
+                file_service.db.close()
+        
+        producer = asyncio.ensure_future(produce())
+        consumers = [asyncio.ensure_future(consume()) for _ in range(self.download_concurrency)]
+        try:
+            await asyncio.gather(*consumers)
+        finally:
+            for task in [producer] + consumers:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(producer, *consumers, return_exceptions=True)
         
-        # Use asyncio.run() instead of creating new event loops to prevent memory leaks
+        # Surface scan failures so the job goes through the retry logic
+        if scan_errors:
+            raise scan_errors[0]
+    
+    async def _complete_metadata(
+        self,
+        indexing_service: IndexingService,
+        job: IndexingJob,
+        scanner: GoogleDriveScanner,
+        files: List[DriveFileMeta]
+    ) -> List[DriveFileMeta]:
+        """Replace lean listing metadata with full metadata, counting files that could not be fetched as failed"""
+        full_metadata = await scanner.get_files_metadata([file_data.id for file_data in files])
+        missing = [file_data for file_data in files if file_data.id not in full_metadata]
+        if missing:
+            logger.warning(f"⚠️ Could not get full metadata of {len(missing)} files for job {job.id}")
+            job.failed_files += len(missing)
+            job.processed_files += len(missing)
+            indexing_service.db.commit()
+        # Keep the listing order and the paths resolved from the listing
+        completed = []
+        for file_data in files:
+            full = full_metadata.get(file_data.id)
+            if full is not None:
+                full.folder_path = file_data.folder_path
+                full.folder_id_path = file_data.folder_id_path
+                completed.append(full)
+        return completed
+    
+    def _folder_scan_paths(self, indexing_service: IndexingService, program: Program, folder_id: str) -> Dict[str, Any]:
+        """Materialized paths of the folder a scan starts from, so its files get paths relative to the program root"""
+        if folder_id == program.drive_folder_id:
+            indexing_service.ensure_root_node(program.drive_folder_id)
+            return {}
+        node = indexing_service.get_folder_node(program.drive_folder_id, folder_id)
+        if node is None:
+            # Paths are corrected by the next full scan that reaches the folder
+            return {}
+        return {"base_path": node.path, "base_id_path": node.id_path}
+    
+    async def _get_start_page_token(self, scanner: GoogleDriveScanner) -> Optional[str]:
+        """Get the Drive changes cursor, logging instead of failing the job when unavailable"""
         try:
-            return asyncio.run(_async_scan())
+            return await scanner.get_start_page_token()
         except Exception as e:
-            logger.error(f"❌ Failed to scan folder {folder_id}: {str(e)}")
-            return []
+            logger.warning(f"⚠️ Could not get Drive changes cursor, next incremental job will run a full scan: {str(e)}")
+            return None
     
-    def _process_file_sync(
-        self, 
+    async def _run_incremental_pipeline(
+        self,
         indexing_service: IndexingService,
-        job: IndexingJob, 
-        program: Program, 
-        file_data: Dict, 
+        job: IndexingJob,
+        program: Program,
+        scanner: GoogleDriveScanner,
+        include_trashed: bool
+    ) -> Optional[str]:
+        """
+        Apply Drive Changes API deltas since the program's last successful job
+        
+        Removed, trashed and moved-out files are deleted from the index; new
+        and modified files go through the regular processing pipeline, along
+        with the content of folders that were moved into the program tree.
+        
+        Returns:
+            The new changes cursor to store once the job succeeds
+        """
+        changes, new_page_token = await scanner.list_changes(program.drive_changes_page_token)
+        plan = indexing_service.plan_drive_changes(program.drive_folder_id, changes, include_trashed)
+        
+        logger.info(f"🔁 Job {job.id}: {len(changes)} Drive changes -> {len(plan['upserts'])} to index, {len(plan['removals'])} to remove, {len(plan['new_folders'])} new folders to scan")
+        
+        if plan["removals"]:
+            indexing_service.remove_indexed_files(program.drive_folder_id, plan["removals"])
+            indexing_service.db.commit()
+        
+        await self._run_indexing_pipeline(
+            indexing_service,
+            job,
+            program,
+            scanner,
+            self._iter_incremental_pages(indexing_service, program, scanner, plan, include_trashed)
+        )
+        return new_page_token
+    
+    async def _iter_incremental_pages(
+        self,
+        indexing_service: IndexingService,
+        program: Program,
+        scanner: GoogleDriveScanner,
+        plan: Dict[str, Any],
+        include_trashed: bool
+    ):
+        """
+        Yield changed files, then the full content of folders that entered the tree, without duplicates
+        
+        Changed shortcuts are replaced by their targets; target folders are
+        scanned like folders that entered the tree.
+        """
+        upserts = [file_data for file_data in plan["upserts"] if file_data.mime_type not in SHORTCUT_TYPES]
+        shortcuts = [file_data for file_data in plan["upserts"] if file_data.mime_type in SHORTCUT_TYPES]
+        seen = {file_data.id for file_data in upserts}
+        folders_to_scan = list(plan["new_folders"])
+        
+        if shortcuts:
+            # Targets take the place of the shortcut in the tree
+            indexing_service.apply_folder_paths(program.drive_folder_id, shortcuts)
+            targets = await scanner.resolve_shortcuts(shortcuts, include_trashed)
+            for shortcut in shortcuts:
+                target = targets.get(shortcut.shortcut_target_id)
+                if target is None or target.id in seen:
+                    continue
+                seen.add(target.id)
+                target.folder_path = shortcut.folder_path
+                target.folder_id_path = shortcut.folder_id_path
+                upserts.append(target)
+                if target.mime_type in FOLDER_TYPES:
+                    folders_to_scan.append(target.id)
+        
+        if upserts:
+            yield upserts
+        
+        for folder_id in folders_to_scan:
+            # The folder's own node was stored when its change went through the pipeline
+            scan_paths = self._folder_scan_paths(indexing_service, program, folder_id)
+            async for page in scanner.iter_files(folder_id, include_trashed, **scan_paths):
+                page = [file_data for file_data in page if file_data.id not in seen]
+                seen.update(file_data.id for file_data in page)
+                if page:
+                    yield page
+    
+    async def _process_queued_file(
+        self,
+        indexing_service: IndexingService,
+        job_db: Session,
+        job: IndexingJob,
+        program: Program,
+        file_data: DriveFileMeta,
         scanner: GoogleDriveScanner
     ):
-        """Synchronous version of file processing with memory management"""
-        import asyncio
+        """
+        Process one file taken from the scan queue and update job counters
         
-        # Check if file should be skipped (currently no files are skipped)
-        if self._should_skip_file(file_data):
-            return
+        The file is committed on its own through `indexing_service` (the
+        consumer's session) and rolled back if it fails; job counters live in
+        `job_db`, the job's session, and are committed every 10 files.
+        """
+        file_id = file_data.id or 'unknown'
+        file_name = file_data.name or 'unnamed'
+        file_size_mb = file_data.size / (1024 * 1024)
+        position = job.processed_files + 1
         
-        async def _async_process():
-            try:
-                file_id = file_data.get('id', 'unknown')
-                file_name = file_data.get('name', 'unnamed')
-                
-                logger.debug(f"📄 Processing file: {file_name} (ID: {file_id})")
-                self._log_memory_usage(f"Before processing file {file_id}")
-                
-                await indexing_service._process_file(job, program, file_data, scanner)
+        logger.info(f"📄 Processing file {position} of {job.total_files} (so far) for job {job.id}: {file_name} ({file_size_mb:.1f}MB)")
+        
+        try:
+            # Process all files (including large files and videos) with memory optimization
+            indexed = await self._process_file_async(indexing_service, job, program, file_data, scanner)
+            indexing_service.db.commit()
+            if indexed:
+                job.successful_files += 1
+            
+            # Increment processed files counter
+            self.files_processed_since_cleanup += 1
+            
+            # Log progress every 10 files
+            if job.processed_files % 10 == 0:
+                progress_pct = (job.processed_files / job.total_files) * 100 if job.total_files > 0 else 0
+                logger.info(f"📈 Job {job.id} progress: {job.processed_files}/{job.total_files} files ({progress_pct:.1f}%) - ✅ {job.successful_files} successful, ❌ {job.failed_files} failed, ⏭️ {job.skipped_unchanged} unchanged")
                 
-                logger.debug(f"✅ File processed successfully: {file_name}")
-                self._log_memory_usage(f"After processing file {file_id}")
+                # Log memory usage during progress
+                self._log_memory_usage(f"Job {job.id} progress checkpoint")
                 
-            except Exception as e:
-                logger.error(f"❌ Error processing file {file_data.get('id', 'unknown')}: {str(e)}")
-                self._log_memory_usage(f"After file processing error for {file_data.get('id', 'unknown')}")
+        except Exception as e:
+            # Drop the file's partial rows so the session stays usable
+            indexing_service.db.rollback()
+            logger.error(f"❌ Error processing file {file_id} ({file_name}): {str(e)}")
+            job.failed_files += 1
+            
+            # Create failed file record
+            try:
+                self._create_failed_file_record_sync(indexing_service, job, file_data, str(e))
+                indexing_service.db.commit()
+            except Exception as record_error:
+                indexing_service.db.rollback()
+                logger.error(f"❌ Could not record the failure of file {file_id}: {str(record_error)}")
+        
+        job.processed_files += 1
+        
+        # Update progress and commit every 10 files
+        if job.processed_files % 10 == 0:
+            try:
+                job_db.commit()
+            except Exception:
+                job_db.rollback()
                 raise
+            
+            # Run memory cleanup periodically
+            self._cleanup_memory()
+    
+    async def _process_file_async(
+        self, 
+        indexing_service: IndexingService,
+        job: IndexingJob, 
+        program: Program, 
+        file_data: DriveFileMeta, 
+        scanner: GoogleDriveScanner
+    ) -> bool:
+        """
+        Process a single file with memory management
+        
+        Returns:
+            False if the file was skipped because it is unchanged since it was last indexed
+        """
+        # Check if file should be skipped (currently no files are skipped)
+        if self._should_skip_file(file_data):
+            return True
         
-        # Use asyncio.run() instead of creating new event loops to prevent memory leaks
         try:
-            asyncio.run(_async_process())
+            file_id = file_data.id or 'unknown'
+            file_name = file_data.name or 'unnamed'
+            
+            logger.debug(f"📄 Processing file: {file_name} (ID: {file_id})")
+            self._log_memory_usage(f"Before processing file {file_id}")
+            
+            indexed = await indexing_service._process_file(job, program, file_data, scanner)
+            
+            logger.debug(f"✅ File processed successfully: {file_name}")
+            self._log_memory_usage(f"After processing file {file_id}")
+            return indexed
+            
         except Exception as e:
-            logger.error(f"❌ Failed to process file {file_data.get('id', 'unknown')}: {str(e)}")
+            logger.error(f"❌ Error processing file {file_data.id}: {str(e)}")
+            self._log_memory_usage(f"After file processing error for {file_data.id}")
             raise
     
     def _create_failed_file_record_sync(
         self, 
         indexing_service: IndexingService,
         job: IndexingJob, 
-        file_data: Dict, 
+        file_data: DriveFileMeta, 
         error_message: str
     ):
         """Synchronous version of creating failed file record"""
         indexing_service._create_failed_file_record(job, file_data, error_message)
     
+    def _create_token_manager(self, user: Optional[UserModel], access_token: str) -> Optional[GoogleTokenManager]:
+        """Create a token manager for the job's user, if they granted offline access"""
+        if not user or not user.google_refresh_token:
+            logger.info("🔑 No Google refresh token available, the job will use its access token as is")
+            return None
+        
+        user_id = user.id
+        # The stored expiry only applies to the stored token (job parameters may carry an older one)
+        expiry = user.google_token_expiry if access_token == user.google_access_token else None
+        return GoogleTokenManager(
+            access_token,
+            refresh_token=user.google_refresh_token,
+            expiry=expiry,
+            client=self._get_drive_client(),
+            token_loader=lambda: self._load_user_token(user_id),
+            token_saver=lambda token, token_expiry: self._save_user_token(user_id, token, token_expiry)
+        )
+    
+    def _load_user_token(self, user_id: int) -> Optional[Tuple[str, Optional[datetime]]]:
+        """Read the user's current Google token, which another worker may have refreshed"""
+        db = SessionLocal()
+        try:
+            user = db.query(UserModel).filter(UserModel.id == user_id).first()
+            if not user or not user.google_access_token:
+                return None
+            return user.google_access_token, user.google_token_expiry
+        finally:
+            db.close()
+    
+    def _save_user_token(self, user_id: int, access_token: str, expiry: datetime):
+        """Store a refreshed Google token on the user so other jobs and API calls use it"""
+        db = SessionLocal()
+        try:
+            user = db.query(UserModel).filter(UserModel.id == user_id).first()
+            if user:
+                user.google_access_token = access_token
+                user.google_token_expiry = expiry
+                db.commit()
+        finally:
+            db.close()
+    
     def _parse_job_parameters(self, job_parameters: Optional[str]) -> Dict[str, Any]:
         """Parse job parameters from JSON string"""
         if not job_parameters:
@@ -500,7 +849,12 @@ class JobQueueProcessor:
             "process_id": self.process_id,
             "running": self.running,
             "thread_alive": self.thread.is_alive() if self.thread else False,
-            "shutdown_requested": self.shutdown_event.is_set()
+            "shutdown_requested": self.shutdown_event.is_set(),
+            "drive_rate_limits": get_rate_limiter_stats(),
+            "drive_metadata_cache": get_metadata_cache_stats(),
+            "drive_export_policy": get_export_policy_stats(),
+            "drive_download_budget": get_download_budget_stats(),
+            "drive_cassette": get_cassette_stats()
         }
 
 
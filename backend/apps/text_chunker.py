@@ -0,0 +1,124 @@
+"""
+Structure-aware splitting of extracted text into retrieval-sized passages
+"""
+import hashlib
+import os
+import re
+from typing import List, Optional
+
+# Target passage length and how much of the end of a passage is repeated at the start of the next
+CONTENT_CHUNK_SIZE_CHARS = int(os.environ.get("CONTENT_CHUNK_SIZE_CHARS") or 2000)
+CONTENT_CHUNK_OVERLAP_CHARS = int(os.environ.get("CONTENT_CHUNK_OVERLAP_CHARS") or 200)
+
+# Rough characters per model token for Latin-script text
+CHARS_PER_TOKEN = 4
+
+# Headings: Markdown-style lines (also written by the spreadsheet extractor for each sheet)
+_HEADING = re.compile(r'^#{1,6}[ \t]+(\S[^\n]*)$', re.MULTILINE)
+_NON_SPACE = re.compile(r'\S')
+_SPACE = re.compile(r'\s')
+
+# Where a passage may end, best first: before a heading, at a paragraph break,
+# a line break, the end of a sentence, then any space
+_BREAKS = (
+    re.compile(r'\n(?=#{1,6}[ \t])'),
+    re.compile(r'\n[ \t]*\n'),
+    re.compile(r'\n'),
+    re.compile(r'[.!?;:][ \t]'),
+    re.compile(r'[ \t]'),
+)
+
+
+class TextChunk:
+    """A passage of a file's text and where it sits in that text"""
+
+    __slots__ = ("ordinal", "char_start", "char_end", "text", "heading", "token_estimate", "content_hash")
+
+    def __init__(self, ordinal: int, char_start: int, char_end: int, text: str, heading: Optional[str] = None):
+        self.ordinal = ordinal
+        self.char_start = char_start
+        self.char_end = char_end
+        self.text = text
+        self.heading = heading
+        self.token_estimate = estimate_tokens(text)
+        self.content_hash = hashlib.md5(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def __repr__(self) -> str:
+        return f"TextChunk(ordinal={self.ordinal}, chars={self.char_start}-{self.char_end}, heading={self.heading!r})"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the model tokens of a text without a tokenizer"""
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN) if text else 0
+
+
+def _break_before(text: str, low: int, high: int) -> int:
+    """Best place to end a passage in text[low:high], or `high` if there is none"""
+    for pattern in _BREAKS:
+        last = None
+        for last in pattern.finditer(text, low, high):
+            pass
+        if last is not None:
+            return last.end()
+    return high
+
+
+def chunk_text(
+    text: Optional[str],
+    chunk_size: int = CONTENT_CHUNK_SIZE_CHARS,
+    overlap: int = CONTENT_CHUNK_OVERLAP_CHARS,
+) -> List[TextChunk]:
+    """
+    Split text into overlapping passages of about `chunk_size` characters
+
+    Passages end at the best boundary found in their second half: before a
+    heading, at a paragraph break, a line break, the end of a sentence, or a
+    space; text without any is cut at `chunk_size`. Each passage starts about
+    `overlap` characters before the previous one ended, at the start of a
+    word, and records the last heading above it. Offsets index into `text`.
+
+    Args:
+        text: Extracted text of a file
+        chunk_size: Maximum passage length in characters
+        overlap: Characters shared by consecutive passages (less than half of `chunk_size`)
+
+    Returns:
+        Passages in order; empty if the text is empty or only whitespace
+    """
+    if not text:
+        return []
+    chunk_size = max(1, chunk_size)
+    overlap = max(0, min(overlap, chunk_size // 2 - 1))
+    headings = [(match.start(), match.group(1).strip()) for match in _HEADING.finditer(text)]
+
+    chunks: List[TextChunk] = []
+    length = len(text)
+    start = 0
+    heading_index = 0
+    heading = None
+    while start < length:
+        first = _NON_SPACE.search(text, start)
+        if first is None:
+            break
+        start = first.start()
+
+        end = min(start + chunk_size, length)
+        if end < length:
+            end = _break_before(text, start + chunk_size // 2, end)
+        passage = text[start:end].rstrip()
+
+        while heading_index < len(headings) and headings[heading_index][0] <= start:
+            heading = headings[heading_index][1]
+            heading_index += 1
+        chunks.append(TextChunk(len(chunks), start, start + len(passage), passage, heading))
+
+        if end >= length:
+            break
+        next_start = end
+        if overlap:
+            # Back up into the passage, then forward to the start of a word
+            space = _SPACE.search(text, end - overlap, end)
+            if space is not None:
+                next_start = space.end()
+        start = max(next_start, start + 1)
+    return chunks
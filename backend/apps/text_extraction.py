@@ -0,0 +1,436 @@
+"""
+Text extraction from downloaded Drive files, run in a pool of worker processes
+"""
+import asyncio
+import codecs
+import csv
+import io
+import logging
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from multiprocessing import get_context
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows: extractors run without memory limits
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Worker processes parsing PDF and Office files; parsing never runs in the event loop thread
+TEXT_EXTRACTION_WORKERS = int(os.environ.get("TEXT_EXTRACTION_WORKERS") or 2)
+
+# Defaults for extractors that do not set their own limits
+TEXT_EXTRACTION_TIMEOUT_SECONDS = float(os.environ.get("TEXT_EXTRACTION_TIMEOUT_SECONDS") or 60)
+TEXT_EXTRACTION_MEMORY_LIMIT_MB = int(os.environ.get("TEXT_EXTRACTION_MEMORY_LIMIT_MB") or 1024)
+
+# Content up to this size is handed to the worker in memory, larger content through a temporary file
+_INLINE_CONTENT_BYTES = 8 * 1024 * 1024
+
+# Extra time the event loop waits for a worker whose own alarm did not fire before killing the pool
+_TIMEOUT_GRACE_SECONDS = 5
+
+ExtractorFunc = Callable[[BinaryIO, int], str]
+
+
+class ExtractionError(Exception):
+    """Text could not be extracted from a file"""
+
+
+class ExtractionTimeout(ExtractionError):
+    """An extractor ran past its time limit"""
+
+
+class Extractor:
+    """A text extractor and the limits it runs under"""
+
+    __slots__ = ("name", "func", "in_process", "timeout_seconds", "memory_limit_mb")
+
+    def __init__(
+        self,
+        name: str,
+        func: ExtractorFunc,
+        in_process: bool = False,
+        timeout_seconds: float = TEXT_EXTRACTION_TIMEOUT_SECONDS,
+        memory_limit_mb: int = TEXT_EXTRACTION_MEMORY_LIMIT_MB,
+    ):
+        """
+        Args:
+            name: Name used in logs
+            func: Module-level function (so it can be sent to a worker) taking a
+                binary file and the maximum characters wanted
+            in_process: Run in a thread instead of the worker pool; only for pure Python extractors such as plain text and CSV
+            timeout_seconds: Wall time the extractor may run in a worker
+            memory_limit_mb: Address space the worker may use while it runs
+        """
+        self.name = name
+        self.func = func
+        self.in_process = in_process
+        self.timeout_seconds = timeout_seconds
+        self.memory_limit_mb = memory_limit_mb
+
+    def __repr__(self) -> str:
+        return f"Extractor({self.name!r})"
+
+
+class _TextCollector:
+    """Accumulates extracted text pieces up to a character limit"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.parts: List[str] = []
+        self.length = 0
+
+    @property
+    def full(self) -> bool:
+        return self.length > self.max_chars
+
+    def add(self, text: Optional[str]):
+        if text:
+            self.parts.append(text)
+            self.length += len(text) + 1
+
+    def text(self) -> str:
+        return "\n".join(self.parts)
+
+
+# Extractors (run inside worker processes unless marked in_process)
+
+def decode_text(source: BinaryIO, max_chars: int, chunk_size: int = 64 * 1024) -> str:
+    """
+    Decode UTF-8 text incrementally, stopping once more than `max_chars` were read
+
+    The size of the file never determines memory use; the result is at most
+    one chunk longer than the limit. Bytes of a multi-byte character cut off by
+    the limit, or by a source truncated mid-character, are dropped rather than
+    decoded into a replacement character.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    parts = []
+    length = 0
+    while length <= max_chars:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            parts.append(decoder.decode(b'', final=True))
+            break
+        text = decoder.decode(chunk)
+        parts.append(text)
+        length += len(text)
+    return ''.join(parts)
+
+
+def extract_pdf(source: BinaryIO, max_chars: int) -> str:
+    """Text of each page of a PDF"""
+    from pypdf import PdfReader
+
+    collector = _TextCollector(max_chars)
+    for page in PdfReader(source).pages:
+        collector.add(page.extract_text())
+        if collector.full:
+            break
+    return collector.text()
+
+
+def extract_docx(source: BinaryIO, max_chars: int) -> str:
+    """Paragraphs, then table cells, of a Word document"""
+    import docx
+
+    document = docx.Document(source)
+    collector = _TextCollector(max_chars)
+    for paragraph in document.paragraphs:
+        collector.add(paragraph.text)
+        if collector.full:
+            return collector.text()
+    for table in document.tables:
+        for row in table.rows:
+            collector.add("\t".join(cell.text for cell in row.cells))
+            if collector.full:
+                return collector.text()
+    return collector.text()
+
+
+def extract_xlsx(source: BinaryIO, max_chars: int) -> str:
+    """Cell values of every sheet of a workbook, one tab-separated line per row"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    collector = _TextCollector(max_chars)
+    try:
+        for sheet in workbook.worksheets:
+            collector.add(f"# {sheet.title}")
+            for row in sheet.iter_rows(values_only=True):
+                if any(value is not None for value in row):
+                    collector.add("\t".join("" if value is None else str(value) for value in row))
+                if collector.full:
+                    return collector.text()
+    finally:
+        workbook.close()
+    return collector.text()
+
+
+def extract_pptx(source: BinaryIO, max_chars: int) -> str:
+    """Text frames and notes of each slide of a presentation"""
+    from pptx import Presentation
+
+    collector = _TextCollector(max_chars)
+    for slide in Presentation(source).slides:
+        for shape in slide.shapes:
+            if shape.has_text_frame:
+                collector.add(shape.text_frame.text)
+        if slide.has_notes_slide:
+            collector.add(slide.notes_slide.notes_text_frame.text)
+        if collector.full:
+            break
+    return collector.text()
+
+
+def extract_csv(source: BinaryIO, max_chars: int) -> str:
+    """Rows of a CSV file, one tab-separated line per row"""
+    collector = _TextCollector(max_chars)
+    reader = csv.reader(io.StringIO(decode_text(source, max_chars)))
+    try:
+        for row in reader:
+            if any(row):
+                collector.add("\t".join(value.strip() for value in row))
+    except csv.Error:
+        # Malformed rows at the cut-off point; keep what was read
+        pass
+    return collector.text()
+
+
+class _HTMLTextParser(HTMLParser):
+    _SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            data = data.strip()
+            if data:
+                self.parts.append(data)
+
+
+def extract_html(source: BinaryIO, max_chars: int) -> str:
+    """Visible text of an HTML page, without scripts and styles"""
+    parser = _HTMLTextParser()
+    # Markup is dropped, so read more than the characters wanted
+    parser.feed(decode_text(source, max_chars * 4))
+    parser.close()
+    return "\n".join(parser.parts)
+
+
+# Registry
+
+_extractors_by_mime: Dict[str, Extractor] = {}
+_extractors_by_file_type: Dict[str, Extractor] = {}
+
+PLAIN_TEXT_EXTRACTOR = Extractor("text", decode_text, in_process=True)
+
+
+def register_extractor(extractor: Extractor, mime_types: Iterable[str] = (), file_types: Iterable[str] = ()):
+    """
+    Register an extractor for MIME types and/or file types (as given by `get_file_type`)
+
+    A later registration for the same key replaces the earlier one.
+    """
+    for mime_type in mime_types:
+        _extractors_by_mime[mime_type] = extractor
+    for file_type in file_types:
+        _extractors_by_file_type[file_type] = extractor
+
+
+def get_extractor(mime_type: Optional[str], file_type: Optional[str] = None) -> Optional[Extractor]:
+    """
+    Get the extractor for a file, looked up by MIME type, then file type
+
+    Returns:
+        The extractor, the plain text one for any other text/* type, or None
+        when the file has no extractable text (images, archives, unknown binaries)
+    """
+    extractor = _extractors_by_mime.get(mime_type or "") or _extractors_by_file_type.get(file_type or "")
+    if extractor is None and (mime_type or "").startswith("text/"):
+        return PLAIN_TEXT_EXTRACTOR
+    return extractor
+
+
+register_extractor(PLAIN_TEXT_EXTRACTOR, ["text/plain", "text/markdown", "application/json", "application/xml", "text/xml"], ["txt", "json", "md"])
+register_extractor(Extractor("csv", extract_csv, in_process=True), ["text/csv", "text/tab-separated-values"], ["csv"])
+register_extractor(Extractor("html", extract_html), ["text/html"], ["html"])
+register_extractor(Extractor("pdf", extract_pdf, timeout_seconds=TEXT_EXTRACTION_TIMEOUT_SECONDS * 2), ["application/pdf"], ["pdf"])
+register_extractor(Extractor("docx", extract_docx), ["application/vnd.openxmlformats-officedocument.wordprocessingml.document"], ["docx"])
+register_extractor(Extractor("xlsx", extract_xlsx), ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"], ["xlsx"])
+register_extractor(Extractor("pptx", extract_pptx), ["application/vnd.openxmlformats-officedocument.presentationml.presentation"], ["pptx"])
+
+
+# Worker side
+
+def _raise_timeout(signum, frame):
+    raise ExtractionTimeout("extractor ran past its time limit")
+
+
+def _run_in_worker(
+    func: ExtractorFunc,
+    data: Optional[bytes],
+    path: Optional[str],
+    max_chars: int,
+    timeout_seconds: float,
+    memory_limit_mb: int,
+) -> str:
+    """Run an extractor inside a worker process under its time and memory limits"""
+    previous_limit = None
+    if resource is not None and memory_limit_mb:
+        # Only the soft limit is lowered, so it can be raised again for the next extractor
+        previous_limit = resource.getrlimit(resource.RLIMIT_AS)
+        hard = previous_limit[1]
+        soft = memory_limit_mb * 1024 * 1024
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+    signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout_seconds)
+    try:
+        if path is not None:
+            with open(path, "rb") as source:
+                return func(source, max_chars)
+        return func(io.BytesIO(data or b""), max_chars)
+    except ExtractionError:
+        raise
+    except MemoryError:
+        raise ExtractionError(f"extractor exceeded its {memory_limit_mb}MB memory limit")
+    except ImportError as e:
+        raise ExtractionError(f"extractor dependency is not installed: {e}")
+    except Exception as e:
+        # Parser exceptions may not survive pickling back to the parent
+        raise ExtractionError(f"{type(e).__name__}: {e}")
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        if previous_limit is not None:
+            resource.setrlimit(resource.RLIMIT_AS, previous_limit)
+
+
+# Parent side
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# One slot per worker, held from submission to result, so work is only handed to an
+# idle worker and its timeout never counts time spent queued behind other files.
+# An asyncio semaphore only works on the loop it was created on, so there is one per loop.
+_worker_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Get the process-wide worker pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers do not inherit the threads and sockets of the API or processor
+            _pool = ProcessPoolExecutor(max_workers=max(1, TEXT_EXTRACTION_WORKERS), mp_context=get_context("spawn"))
+        return _pool
+
+
+def _get_worker_slots() -> asyncio.Semaphore:
+    """Get the worker slots of the running event loop, creating them on first use"""
+    loop = asyncio.get_event_loop()
+    with _pool_lock:
+        slots = _worker_slots.get(loop)
+        if slots is None:
+            slots = _worker_slots[loop] = asyncio.Semaphore(max(1, TEXT_EXTRACTION_WORKERS))
+        return slots
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Kill the workers of a stuck or broken pool; the next extraction starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False)
+
+
+def shutdown_extraction_pool():
+    """Stop the worker processes"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+async def extract_text(extractor: Extractor, content_file: BinaryIO, max_chars: int) -> str:
+    """
+    Extract the text of a downloaded file
+
+    In-process extractors read the file directly in a thread, so large text
+    and CSV files do not stall the event loop. Others run in the worker
+    pool once a worker is idle: small content is sent in memory, larger content
+    through a temporary file. A worker that outlives its timeout is killed
+    along with its pool.
+
+    Args:
+        extractor: Extractor from `get_extractor`
+        content_file: Binary file positioned at offset 0
+        max_chars: Characters wanted; extractors stop shortly after this many
+
+    Raises:
+        ExtractionError: The extractor failed, timed out or ran out of memory
+    """
+    if extractor.in_process:
+        return await asyncio.to_thread(extractor.func, content_file, max_chars)
+
+    content_file.seek(0, 2)
+    size = content_file.tell()
+    content_file.seek(0)
+
+    data = None
+    path = None
+    if size <= _INLINE_CONTENT_BYTES:
+        data = content_file.read()
+    else:
+        with tempfile.NamedTemporaryFile(prefix="extract_", delete=False) as named_file:
+            shutil.copyfileobj(content_file, named_file)
+            path = named_file.name
+
+    try:
+        async with _get_worker_slots():
+            pool = _get_pool()
+            try:
+                future = asyncio.get_event_loop().run_in_executor(
+                    pool, _run_in_worker, extractor.func, data, path, max_chars,
+                    extractor.timeout_seconds, extractor.memory_limit_mb
+                )
+                return await asyncio.wait_for(future, extractor.timeout_seconds + _TIMEOUT_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                # The worker's own alarm did not stop it: it is stuck outside Python code
+                logger.warning(f"⏱️ {extractor.name} extractor did not stop after {extractor.timeout_seconds:.0f}s, restarting the extraction pool")
+                _discard_pool(pool)
+                raise ExtractionTimeout(f"{extractor.name} extractor timed out")
+            except BrokenProcessPool:
+                # A worker died (e.g. killed by the OOM killer); the pool cannot be reused
+                logger.warning(f"💥 Extraction worker died running the {extractor.name} extractor, restarting the extraction pool")
+                _discard_pool(pool)
+                raise ExtractionError(f"{extractor.name} extractor worker died")
+    finally:
+        if path is not None:
+            os.unlink(path)
@@ -0,0 +1,71 @@
+"""
+Sanitization of text before it is stored in the database
+"""
+from typing import Optional
+
+# C0 control characters except tab, line feed and carriage return (includes NUL,
+# which PostgreSQL text columns reject)
+_CONTROL_BYTES = bytes(code for code in range(0x20) if chr(code) not in '\t\n\r')
+
+TRUNCATION_MARKER = "\n\n[CONTENT TRUNCATED]"
+
+# Long texts are cleaned in slices of this many characters, stopping once the limit is passed
+_SLICE_CHARS = 256 * 1024
+
+
+def _strip_controls(text: str) -> str:
+    """
+    Delete control characters with C-level byte operations instead of a per-character loop
+
+    Latin-1 text (ASCII included) encodes and decodes as a plain copy. Other
+    text goes through UTF-8: bytes below 0x20 only ever encode those same
+    ASCII characters, so deleting them never splits a multi-byte character,
+    and `surrogatepass` lets lone surrogates from broken extractions round-trip.
+    """
+    if text.isprintable():
+        # Names, links and most short fields: nothing to remove, no copy
+        return text
+    try:
+        return text.encode('latin-1').translate(None, _CONTROL_BYTES).decode('latin-1')
+    except UnicodeEncodeError:
+        return text.encode('utf-8', 'surrogatepass').translate(None, _CONTROL_BYTES).decode('utf-8', 'surrogatepass')
+
+
+def sanitize_text(content: Optional[str], max_length: Optional[int] = None) -> Optional[str]:
+    """
+    Remove control characters and cut text that does not fit in `max_length`
+
+    Keeps tab, line feed, carriage return and every character from 0x20 up.
+    Text longer than `max_length` once cleaned is cut and ends with
+    TRUNCATION_MARKER, the result never exceeding `max_length`; a cut through a
+    surrogate pair drops its high half. Long text is cleaned slice by slice,
+    so the part beyond the limit is never processed.
+
+    Args:
+        content: Text to sanitize (None and "" are returned as is)
+        max_length: Maximum length of the result, or None for no limit
+
+    Returns:
+        Sanitized text
+    """
+    if not content:
+        return content
+
+    if max_length is None or len(content) <= max_length:
+        return _strip_controls(content)
+
+    parts = []
+    length = 0
+    for start in range(0, len(content), _SLICE_CHARS):
+        part = _strip_controls(content[start:start + _SLICE_CHARS])
+        parts.append(part)
+        length += len(part)
+        if length > max_length:
+            cleaned = ''.join(parts)
+            cut = max_length - len(TRUNCATION_MARKER)
+            if 0 < cut < len(cleaned) and '\ud800' <= cleaned[cut - 1] <= '\udbff' and '\udc00' <= cleaned[cut] <= '\udfff':
+                # The cut splits a surrogate pair (from a `surrogatepass` extraction): drop its high half
+                cut -= 1
+            return cleaned[:cut] + TRUNCATION_MARKER
+    # Enough control characters were removed for the text to fit
+    return ''.join(parts)
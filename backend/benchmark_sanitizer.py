@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the content sanitizer against the previous per-character implementation
+
+Checks that both produce identical output on every sample (except that the
+new sanitizer never cuts a surrogate pair in half) and that it is at least
+--min-speedup times faster in total.
+"""
+import argparse
+import random
+import sys
+import timeit
+
+from apps.text_sanitizer import sanitize_text
+
+MAX_CONTENT_CHARS = 1000000
+
+
+def sanitize_reference(content, max_length=MAX_CONTENT_CHARS):
+    """Previous IndexingService._sanitize_content, kept as the reference output"""
+    if not content:
+        return content
+    sanitized = ''.join(char for char in content if ord(char) >= 32 or char in '\n\r\t')
+    sanitized = sanitized.replace('\x00', '')
+    if len(sanitized) > max_length:
+        truncate_length = max_length - len("\n\n[CONTENT TRUNCATED]")
+        sanitized = sanitized[:truncate_length] + "\n\n[CONTENT TRUNCATED]"
+    return sanitized
+
+
+ASCII_WORDS = ["report", "program", "evaluation", "year", "data", "2024", "total:", "(n=120)"]
+SPANISH_WORDS = ["informe", "programa", "evaluación", "año", "niñez", "datos", "2024", "total:"]
+TYPOGRAPHIC_WORDS = SPANISH_WORDS + ["“resultados”", "•", "—", "€"]
+EMOJI_WORDS = SPANISH_WORDS + ["🙂", "✅"]
+CONTROLS = ['\x00', '\x01', '\x07', '\x0b', '\x0c', '\x1b', '\x1f']
+
+
+def make_text(rng: random.Random, length: int, control_ratio: float, words=SPANISH_WORDS) -> str:
+    """Prose-like text with a share of control characters (as left by PDF and binary decoding)"""
+    parts = []
+    size = 0
+    while size < length:
+        if rng.random() < control_ratio:
+            part = rng.choice(CONTROLS)
+        else:
+            part = rng.choice(words) + rng.choice([" ", " ", " ", "\n", "\t", "\r\n"])
+        parts.append(part)
+        size += len(part)
+    return ''.join(parts)[:length]
+
+
+def build_samples():
+    rng = random.Random(0)
+    return {
+        "ASCII prose 1M chars": [make_text(rng, MAX_CONTENT_CHARS, 0.001, ASCII_WORDS)],
+        "Spanish prose 1M chars": [make_text(rng, MAX_CONTENT_CHARS, 0.001)],
+        "typographic prose 1M chars, 1% control": [make_text(rng, MAX_CONTENT_CHARS, 0.01, TYPOGRAPHIC_WORDS)],
+        "emoji prose 1M chars": [make_text(rng, MAX_CONTENT_CHARS, 0.001, EMOJI_WORDS)],
+        "binary-like 200k chars, 30% control": [make_text(rng, 200000, 0.3)],
+        "oversized 3M chars (truncated)": [make_text(rng, 3 * MAX_CONTENT_CHARS, 0.01)],
+        "10k short fields": make_short_fields(rng, 10000),
+    }
+
+
+def make_short_fields(rng: random.Random, count: int):
+    """File names, links and descriptions, sanitized for every indexed file"""
+    fields = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            fields.append(f"{rng.choice(SPANISH_WORDS)}_{rng.randint(1, 9999)} (v{rng.randint(1, 5)}).pdf")
+        elif kind == 1:
+            fields.append(f"https://drive.google.com/file/d/{rng.getrandbits(128):032x}/view?usp=drivesdk")
+        else:
+            fields.append(make_text(rng, rng.randint(20, 200), 0.01).strip())
+    return fields
+
+
+def edge_cases():
+    """Inputs checked for identical output only"""
+    marker_length = len("\n\n[CONTENT TRUNCATED]")
+    return [
+        None, "", "\x00", "\t\n\r", "a\x00b\x7f\x85c", "lone \ud800 surrogate\x01",
+        "x" * MAX_CONTENT_CHARS, "x" * (MAX_CONTENT_CHARS + 1),
+        "\x00" * 10 + "x" * MAX_CONTENT_CHARS, "x" * (MAX_CONTENT_CHARS - marker_length) + "\x00" * 50 + "y" * 100,
+        # The cut lands right after a carriage return, replacement character or joiner, which are kept
+        "x" * (MAX_CONTENT_CHARS - marker_length - 1) + "\r\n" + "y" * 100,
+        "x" * (MAX_CONTENT_CHARS - marker_length - 1) + "\ufffd" + "y" * 100,
+        "x" * (MAX_CONTENT_CHARS - marker_length - 1) + "\u200d" + "y" * 100,
+        # A lone high surrogate right before the cut is content, not a split pair
+        "x" * (MAX_CONTENT_CHARS - marker_length - 1) + "\ud83d" + "y" * 100,
+    ]
+
+
+def split_pair_cases():
+    """Inputs whose cut splits a surrogate pair: the high half is dropped instead of kept"""
+    marker_length = len("\n\n[CONTENT TRUNCATED]")
+    text = "x" * (MAX_CONTENT_CHARS - marker_length - 1) + "\ud83d\ude42" + "y" * 100
+    return [(text, "x" * (MAX_CONTENT_CHARS - marker_length - 1) + "\n\n[CONTENT TRUNCATED]")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the content sanitizer")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs per sample (best is kept)")
+    parser.add_argument("--min-speedup", type=float, default=20.0, help="Required total speedup")
+    args = parser.parse_args()
+
+    for text in edge_cases():
+        if sanitize_text(text, MAX_CONTENT_CHARS) != sanitize_reference(text):
+            print(f"❌ Output differs on edge case: {text[:40]!r}")
+            sys.exit(1)
+    for text, expected in split_pair_cases():
+        if sanitize_text(text, MAX_CONTENT_CHARS) != expected:
+            print(f"❌ Surrogate pair split by the cut on edge case: {text[-120:-100]!r}")
+            sys.exit(1)
+    
+    samples = build_samples()
+    total_reference = 0.0
+    total_new = 0.0
+
+    print(f"{'sample':<40} {'reference':>12} {'new':>12} {'speedup':>9}")
+    for name, texts in samples.items():
+        for text in texts:
+            if sanitize_text(text, MAX_CONTENT_CHARS) != sanitize_reference(text):
+                print(f"❌ Output differs on sample: {name}")
+                sys.exit(1)
+
+        reference = min(timeit.repeat(lambda: [sanitize_reference(text) for text in texts], number=1, repeat=args.repeat))
+        new = min(timeit.repeat(lambda: [sanitize_text(text, MAX_CONTENT_CHARS) for text in texts], number=1, repeat=args.repeat))
+        total_reference += reference
+        total_new += new
+        print(f"{name:<40} {reference * 1000:>10.1f}ms {new * 1000:>10.1f}ms {reference / new:>8.1f}x")
+
+    speedup = total_reference / total_new
+    print(f"{'total':<40} {total_reference * 1000:>10.1f}ms {total_new * 1000:>10.1f}ms {speedup:>8.1f}x")
+
+    if speedup < args.min_speedup:
+        print(f"❌ Speedup {speedup:.1f}x is below the required {args.min_speedup:.0f}x")
+        sys.exit(1)
+    print(f"✅ Identical output, {speedup:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, UniqueConstraint, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, ForeignKey, UniqueConstraint, Text, Index, LargeBinary
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from database.database import Base
 import uuid
@@ -37,6 +37,7 @@ class Program(Base):
     # Google Drive linkage
     drive_folder_id = Column(String, unique=True, index=True)
     drive_folder_name = Column(String, nullable=True)
+    drive_changes_page_token = Column(String, nullable=True)  # Drive Changes API cursor from the last successful scan
 
     # Business fields
     internal_code = Column(String, index=True)
@@ -238,6 +239,10 @@ class UserSession(Base):
 class IndexedFile(Base):
     """Model for indexed Google Drive files"""
     __tablename__ = "indexed_files"
+    __table_args__ = (
+        # text_pattern_ops lets "folder_id_path LIKE 'prefix%'" subtree filters use the index
+        Index("ix_indexed_files_folder_id_path", "folder_id_path", postgresql_ops={"folder_id_path": "text_pattern_ops"}),
+    )
     id = Column(Integer, primary_key=True, index=True)
     drive_folder_id = Column(String, nullable=False, index=True)  # Main program folder ID (replaces program_id)
     
@@ -254,9 +259,17 @@ class IndexedFile(Base):
     owners = Column(Text, nullable=True)  # JSON array of owner information
     last_modifying_user = Column(Text, nullable=True)  # JSON object with user info
     md5_checksum = Column(String, nullable=True)
+    head_revision_id = Column(String, nullable=True)  # Drive headRevisionId (binary files only)
+    drive_version = Column(BigInteger, nullable=True)  # Drive version, bumped by every change to the file
+    
+    # Location in the program tree (materialized paths, see DriveFolderNode)
+    drive_file_path = Column(Text, nullable=True)  # Folder names down to the file, e.g. /Reports/2024/file.pdf
+    folder_id_path = Column(Text, nullable=True)  # IDs of the folders above the file, e.g. /<root>/<reports>/<2024>/
     
-    # Content information
-    content_text = Column(Text, nullable=True)  # Extracted text content
+    # Content information (the extracted text lives out of line in content_blobs)
+    content_blob_id = Column(Integer, ForeignKey("content_blobs.id"), nullable=True, index=True)
+    content_partial = Column(Boolean, default=False)  # Text comes from a byte window of a large file
+    content_error = Column(String, nullable=True)  # Why the content could not be downloaded or extracted (retried on the next scan)
     is_google_doc = Column(Boolean, default=False)
     is_downloadable = Column(Boolean, default=True)
     
@@ -283,6 +296,89 @@ class IndexedFile(Base):
     
     # Relationships - now using drive_folder_id instead of program_id
     # We'll need to add a method to get the program from drive_folder_id
+    content_blob = relationship("ContentBlob")
+    
+    # Not stored: filled in from the content blob only when the text is requested
+    content_text = None
+
+
+class ContentBlob(Base):
+    """
+    Compressed extracted text of an indexed file, out of line so file queries stay small
+    
+    Blobs with a checksum are shared by every indexed file with the same bytes;
+    text without one (Google Workspace exports) gets a blob per file. Blobs are
+    never updated: changed content gets a new blob and unused ones are pruned.
+    """
+    __tablename__ = "content_blobs"
+    __table_args__ = (
+        UniqueConstraint("md5_checksum", "file_size", name="uq_content_blob_checksum"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Content address: Drive md5Checksum and size of the file bytes (None for per-file blobs)
+    md5_checksum = Column(String, nullable=True)
+    file_size = Column(BigInteger, nullable=True)
+    
+    # Extracted text, compressed (see apps/content_compression.py) and only loaded when read
+    content_data = deferred(Column(LargeBinary, nullable=False))
+    content_encoding = Column(String, nullable=False, default="identity")  # zstd, gzip or identity
+    content_chars = Column(Integer, default=0)  # Length of the text
+    stored_bytes = Column(Integer, default=0)  # Length of content_data
+    content_partial = Column(Boolean, default=False)  # Text comes from a byte window of a large file
+    
+    # Audit
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ContentChunk(Base):
+    """
+    Passage of a content blob's text, sized for retrieval (see apps/text_chunker.py)
+    
+    Stored uncompressed so passages can be searched and returned without
+    loading the whole text; shared by every indexed file using the blob.
+    """
+    __tablename__ = "content_chunks"
+    __table_args__ = (
+        UniqueConstraint("content_blob_id", "ordinal", name="uq_content_chunk_blob_ordinal"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    content_blob_id = Column(Integer, ForeignKey("content_blobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    
+    # Position in the text
+    ordinal = Column(Integer, nullable=False)
+    char_start = Column(Integer, nullable=False)
+    char_end = Column(Integer, nullable=False)
+    
+    heading = Column(Text, nullable=True)  # Last heading above the passage
+    text = Column(Text, nullable=False)
+    token_estimate = Column(Integer, nullable=False)
+    content_hash = Column(String, nullable=False)  # MD5 of the passage text
+    
+    # Audit
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class DriveFolderNode(Base):
+    """Folder of a program tree, with materialized paths for subtree queries"""
+    __tablename__ = "drive_folder_nodes"
+    __table_args__ = (
+        UniqueConstraint("drive_folder_id", "folder_id", name="uq_drive_folder_node"),
+        Index("ix_drive_folder_nodes_id_path", "drive_folder_id", "id_path", postgresql_ops={"id_path": "text_pattern_ops"}),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    drive_folder_id = Column(String, nullable=False, index=True)  # Main program folder ID
+    
+    folder_id = Column(String, nullable=False)  # Google Drive folder ID
+    parent_id = Column(String, nullable=True)  # Parent folder ID (None for the program root)
+    name = Column(String, nullable=True)
+    path = Column(Text, nullable=False, default="")  # Folder names from the program root, e.g. /Reports/2024
+    id_path = Column(Text, nullable=False)  # Folder IDs from the program root, e.g. /<root>/<reports>/<2024>/
+    depth = Column(Integer, default=0)
+    
+    # Audit
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
 class IndexingJob(Base):
@@ -310,6 +406,7 @@ class IndexingJob(Base):
     processed_files = Column(Integer, default=0)
     successful_files = Column(Integer, default=0)
     failed_files = Column(Integer, default=0)
+    skipped_unchanged = Column(Integer, default=0)  # Files whose listing metadata matched the stored row
     
     # Job metadata
     error_message = Column(Text, nullable=True)
@@ -15,6 +15,8 @@ from database.models import Program, UserModel, IndexingJob, IndexedFile
 from database.schemas import (
     DriveScanRequest, DriveScanResponse, IndexingStatusResponse,
     FileSearchRequest, FileSearchResponse, IndexedFileResponse,
+    ChunkSearchRequest, ChunkSearchResponse, ContentChunkResponse,
+    FileContentResponse,
     IndexingJobResponse
 )
 from apps.indexing_service import IndexingService
@@ -202,9 +204,13 @@ async def search_files(
         drive_folder_id=program.drive_folder_id,
         query=request.query,
         file_types=request.file_types,
-        limit=request.limit
+        limit=request.limit,
+        folder_id=request.folder_id
     )
     
+    if request.include_content:
+        files = _with_content(indexing_service, files)
+    
     return FileSearchResponse(
         files=files,
         total_count=total_count,
@@ -212,16 +218,82 @@ async def search_files(
     )
 
 
+@router.post("/search-chunks", response_model=ChunkSearchResponse)
+async def search_chunks(
+    request: ChunkSearchRequest,
+    current_user: UserModel = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Busca pasajes de contenido en los archivos indexados de un programa
+    """
+    # Verificar que el programa existe y el usuario tiene acceso
+    program = db.query(Program).filter(Program.id == request.program_id).first()
+    if not program:
+        raise HTTPException(status_code=404, detail="Program not found")
+    
+    # Verificar permisos de acceso al programa
+    has_access = False
+    for access in program.access:
+        if access.user_id == current_user.id and access.active:
+            has_access = True
+            break
+    
+    if not has_access:
+        raise HTTPException(status_code=403, detail="No access to this program")
+    
+    # Buscar fragmentos
+    indexing_service = IndexingService(db)
+    rows, total_count = indexing_service.search_chunks(
+        drive_folder_id=program.drive_folder_id,
+        query=request.query,
+        file_types=request.file_types,
+        limit=request.limit,
+        folder_id=request.folder_id
+    )
+    
+    chunks = [
+        ContentChunkResponse(
+            id=chunk.id,
+            indexed_file_id=indexed_file.id,
+            drive_file_id=indexed_file.drive_file_id,
+            drive_file_name=indexed_file.drive_file_name,
+            file_type=indexed_file.file_type,
+            web_view_link=indexed_file.web_view_link,
+            ordinal=chunk.ordinal,
+            char_start=chunk.char_start,
+            char_end=chunk.char_end,
+            heading=chunk.heading,
+            text=chunk.text,
+            token_estimate=chunk.token_estimate,
+            content_hash=chunk.content_hash
+        )
+        for chunk, indexed_file in rows
+    ]
+    
+    return ChunkSearchResponse(
+        chunks=chunks,
+        total_count=total_count,
+        query=request.query,
+        total_tokens=sum(chunk.token_estimate for chunk in chunks)
+    )
+
+
 @router.get("/files/{program_id}", response_model=List[IndexedFileResponse])
 async def get_program_files(
     program_id: int,
     file_types: Optional[str] = None,
     limit: int = 100,
+    folder_id: Optional[str] = None,
+    include_content: bool = False,
     current_user: UserModel = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Obtiene todos los archivos indexados de un programa
+    
+    Con `folder_id` devuelve solo los archivos bajo esa carpeta, a cualquier profundidad.
+    El texto extraído solo se incluye con `include_content`.
     """
     # Verificar que el programa existe y el usuario tiene acceso
     program = db.query(Program).filter(Program.id == program_id).first()
@@ -244,9 +316,60 @@ async def get_program_files(
     files = indexing_service.get_program_files(
         drive_folder_id=program.drive_folder_id,
         file_types=file_types_list,
-        limit=limit
+        limit=limit,
+        folder_id=folder_id
     )
     
+    if include_content:
+        return _with_content(indexing_service, files)
+    return files
+
+
+@router.get("/files/{program_id}/{drive_file_id}/content", response_model=FileContentResponse)
+async def get_file_content(
+    program_id: int,
+    drive_file_id: str,
+    current_user: UserModel = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Obtiene el texto extraído de un archivo indexado
+    """
+    # Verificar que el programa existe y el usuario tiene acceso
+    program = db.query(Program).filter(Program.id == program_id).first()
+    if not program:
+        raise HTTPException(status_code=404, detail="Program not found")
+    
+    # Verificar permisos de acceso al programa
+    has_access = False
+    for access in program.access:
+        if access.user_id == current_user.id and access.active:
+            has_access = True
+            break
+    
+    if not has_access:
+        raise HTTPException(status_code=403, detail="No access to this program")
+    
+    indexing_service = IndexingService(db)
+    indexed_file = indexing_service.get_indexed_file(program.drive_folder_id, drive_file_id)
+    if not indexed_file:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    texts = indexing_service.get_content_texts([indexed_file])
+    return FileContentResponse(
+        drive_file_id=indexed_file.drive_file_id,
+        drive_file_name=indexed_file.drive_file_name,
+        content_text=texts[indexed_file.id],
+        content_partial=indexed_file.content_partial,
+        content_error=indexed_file.content_error
+    )
+
+
+def _with_content(indexing_service: IndexingService, files: List[IndexedFile]) -> List[IndexedFile]:
+    """Completa el texto extraído de los archivos, cargado en una sola consulta"""
+    texts = indexing_service.get_content_texts(files)
+    for indexed_file in files:
+        indexed_file.content_text = texts[indexed_file.id]
     return files
 
 
@@ -331,8 +454,15 @@ async def clear_indexed_files(
     if not has_access:
         raise HTTPException(status_code=403, detail="Only program owners can clear indexed files")
     
-    # Eliminar archivos indexados
-    deleted_count = db.query(IndexedFile).filter(IndexedFile.program_id == program_id).delete()
+    # Eliminar archivos indexados y los blobs de contenido que solo ellos usaban
+    files = db.query(IndexedFile).filter(IndexedFile.program_id == program_id)
+    blob_ids = [
+        blob_id for (blob_id,) in files.with_entities(IndexedFile.content_blob_id).filter(
+            IndexedFile.content_blob_id.isnot(None)
+        ).distinct()
+    ]
+    deleted_count = files.delete(synchronize_session=False)
+    IndexingService(db).prune_content_blobs(blob_ids)
     db.commit()
     
     return {
@@ -100,6 +100,7 @@ async def get_jobs_status(
             "processed_files": job.processed_files,
             "successful_files": job.successful_files,
             "failed_files": job.failed_files,
+            "skipped_unchanged": job.skipped_unchanged or 0,
             "error_message": job.error_message,
             "created_at": job.created_at.isoformat() if job.created_at else None,
             "started_at": job.started_at.isoformat() if job.started_at else None,
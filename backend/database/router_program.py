@@ -47,7 +47,7 @@ async def create_program_route(payload: ProgramCreate, db: Session = Depends(get
     if not user.google_access_token:
         raise HTTPException(status_code=400, detail="Tu cuenta no tiene permiso de Drive. Vuelve a iniciar sesión otorgando permisos de Drive.")
 
-    ok, folder_name = await validate_folder_access(user.google_access_token, folder_id)
+    ok, folder_name = await validate_folder_access(user.google_access_token, folder_id, subject=user.email)
     if not ok:
         raise HTTPException(status_code=400, detail="No se puede acceder a la carpeta de Drive o no es una carpeta.")
 
@@ -77,7 +77,7 @@ async def check_drive_access(q: str, db: Session = Depends(get_db), current_emai
     if not user.google_access_token:
         raise HTTPException(status_code=400, detail="Tu cuenta no tiene permiso de Drive. Vuelve a iniciar sesión otorgando permisos de Drive.")
 
-    ok, folder_name = await validate_folder_access(user.google_access_token, folder_id)
+    ok, folder_name = await validate_folder_access(user.google_access_token, folder_id, subject=user.email)
 
     existing = get_program_by_folder_id(db, folder_id)
 
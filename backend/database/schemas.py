@@ -316,6 +316,10 @@ class IndexedFileResponse(IndexedFileBase):
     id: int
     drive_folder_id: str
     content_text: Optional[str] = None
+    content_partial: Optional[bool] = False
+    content_error: Optional[str] = None
+    drive_file_path: Optional[str] = None
+    folder_id_path: Optional[str] = None
     summary_120w: Optional[str] = None
     keywords: Optional[str] = None
     topics: Optional[str] = None
@@ -348,6 +352,7 @@ class IndexingJobUpdate(BaseModel):
     processed_files: Optional[int] = None
     successful_files: Optional[int] = None
     failed_files: Optional[int] = None
+    skipped_unchanged: Optional[int] = None
     error_message: Optional[str] = None
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
@@ -361,6 +366,7 @@ class IndexingJobResponse(IndexingJobBase):
     processed_files: int
     successful_files: int
     failed_files: int
+    skipped_unchanged: Optional[int] = 0
     error_message: Optional[str] = None
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
@@ -386,7 +392,7 @@ class DriveScanResponse(BaseModel):
 class IndexingStatusResponse(BaseModel):
     job_id: int
     status: str
-    progress: Dict[str, int]  # total_files, processed_files, successful_files, failed_files
+    progress: Dict[str, int]  # total_files, processed_files, successful_files, failed_files, skipped_unchanged
     error_message: Optional[str] = None
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
@@ -396,8 +402,45 @@ class FileSearchRequest(BaseModel):
     query: str
     file_types: Optional[List[str]] = None
     limit: int = 50
+    folder_id: Optional[str] = None
+    include_content: bool = False  # Load each file's extracted text (otherwise content_text is null)
 
 class FileSearchResponse(BaseModel):
     files: List[IndexedFileResponse]
     total_count: int
     query: str
+
+class FileContentResponse(BaseModel):
+    drive_file_id: str
+    drive_file_name: str
+    content_text: Optional[str] = None
+    content_partial: Optional[bool] = False
+    content_error: Optional[str] = None
+
+class ContentChunkResponse(BaseModel):
+    id: int
+    indexed_file_id: int
+    drive_file_id: str
+    drive_file_name: Optional[str] = None
+    file_type: Optional[str] = None
+    web_view_link: Optional[str] = None
+    ordinal: int
+    char_start: int
+    char_end: int
+    heading: Optional[str] = None
+    text: str
+    token_estimate: int
+    content_hash: str
+
+class ChunkSearchRequest(BaseModel):
+    program_id: int
+    query: str
+    file_types: Optional[List[str]] = None
+    limit: int = Field(20, ge=1, le=100)
+    folder_id: Optional[str] = None
+
+class ChunkSearchResponse(BaseModel):
+    chunks: List[ContentChunkResponse]
+    total_count: int
+    query: str
+    total_tokens: int
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the content_blobs table holding the extracted text
+and chunks of identical files once (keyed by Drive md5Checksum and size), and
+to move the text of already indexed files into it
+"""
+import sys
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def migrate_content_blobs():
+    """Create content_blobs, link indexed_files and content_chunks to it and deduplicate existing text"""
+
+    # Get database URL from environment
+    database_url = os.getenv("SQLALCHEMY_DATABASE_URL")
+    if not database_url:
+        print("❌ SQLALCHEMY_DATABASE_URL environment variable not set")
+        sys.exit(1)
+
+    engine = create_engine(database_url)
+
+    migration_sql = [
+        """
+        CREATE TABLE IF NOT EXISTS content_blobs (
+            id SERIAL PRIMARY KEY,
+            md5_checksum VARCHAR NOT NULL,
+            file_size BIGINT NOT NULL,
+            content_text TEXT,
+            content_partial BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            CONSTRAINT uq_content_blob_checksum UNIQUE (md5_checksum, file_size)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_content_blobs_id ON content_blobs (id);",
+
+        # Files reference the blob of their bytes
+        "ALTER TABLE indexed_files ADD COLUMN IF NOT EXISTS content_blob_id INTEGER REFERENCES content_blobs (id);",
+        "CREATE INDEX IF NOT EXISTS ix_indexed_files_content_blob_id ON indexed_files (content_blob_id);",
+
+        # Chunks belong to a file or to a blob
+        "ALTER TABLE content_chunks ADD COLUMN IF NOT EXISTS content_blob_id INTEGER REFERENCES content_blobs (id) ON DELETE CASCADE;",
+        "ALTER TABLE content_chunks ALTER COLUMN indexed_file_id DROP NOT NULL;",
+        "ALTER TABLE content_chunks ALTER COLUMN drive_folder_id DROP NOT NULL;",
+        "ALTER TABLE content_chunks ALTER COLUMN drive_file_id DROP NOT NULL;",
+        "CREATE INDEX IF NOT EXISTS ix_content_chunks_content_blob_id ON content_chunks (content_blob_id);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_content_chunk_blob_ordinal ON content_chunks (content_blob_id, ordinal);",
+
+        # One blob per checksum and size, from the oldest file with that content
+        """
+        INSERT INTO content_blobs (md5_checksum, file_size, content_text, content_partial)
+        SELECT DISTINCT ON (md5_checksum, file_size) md5_checksum, file_size, content_text, COALESCE(content_partial, FALSE)
+        FROM indexed_files
+        WHERE md5_checksum IS NOT NULL AND content_text IS NOT NULL AND content_blob_id IS NULL
+        ORDER BY md5_checksum, file_size, id
+        ON CONFLICT (md5_checksum, file_size) DO NOTHING;
+        """,
+        """
+        UPDATE indexed_files f
+        SET content_blob_id = b.id
+        FROM content_blobs b
+        WHERE f.md5_checksum = b.md5_checksum AND f.file_size = b.file_size
+          AND f.content_text IS NOT NULL AND f.content_blob_id IS NULL;
+        """,
+
+        # The chunks of the oldest file of each blob become the blob's chunks
+        """
+        UPDATE content_chunks c
+        SET content_blob_id = f.content_blob_id, indexed_file_id = NULL, drive_folder_id = NULL, drive_file_id = NULL
+        FROM indexed_files f
+        WHERE c.indexed_file_id = f.id
+          AND f.content_blob_id IS NOT NULL
+          AND f.id = (SELECT MIN(o.id) FROM indexed_files o WHERE o.content_blob_id = f.content_blob_id)
+          AND NOT EXISTS (SELECT 1 FROM content_chunks e WHERE e.content_blob_id = f.content_blob_id);
+        """,
+        """
+        DELETE FROM content_chunks c
+        USING indexed_files f
+        WHERE c.indexed_file_id = f.id AND f.content_blob_id IS NOT NULL;
+        """,
+
+        # The text now lives only in the blob
+        "UPDATE indexed_files SET content_text = NULL WHERE content_blob_id IS NOT NULL AND content_text IS NOT NULL;",
+    ]
+
+    try:
+        with engine.begin() as connection:
+            print("Starting content blobs migration...")
+
+            for i, sql in enumerate(migration_sql, 1):
+                print(f"Executing migration step {i}/{len(migration_sql)}: {sql.strip()[:50]}...")
+                connection.execute(text(sql))
+
+            blobs, files = connection.execute(text(
+                "SELECT (SELECT COUNT(*) FROM content_blobs), (SELECT COUNT(*) FROM indexed_files WHERE content_blob_id IS NOT NULL)"
+            )).one()
+            print(f"✅ Content blobs migration completed successfully! {files} files share {blobs} content blobs")
+            print("ℹ️ Run VACUUM on indexed_files to return the space of the moved text")
+
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    migrate_content_blobs()
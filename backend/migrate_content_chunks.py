@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the content_chunks table holding retrieval-sized
+passages of each indexed file, and to chunk the text already indexed
+"""
+import sys
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+from apps.text_chunker import chunk_text
+
+# Load environment variables
+load_dotenv()
+
+# Files chunked per transaction during the backfill
+BACKFILL_BATCH_SIZE = 200
+
+def migrate_content_chunks():
+    """Create content_chunks and fill it from indexed_files.content_text"""
+
+    # Get database URL from environment
+    database_url = os.getenv("SQLALCHEMY_DATABASE_URL")
+    if not database_url:
+        print("❌ SQLALCHEMY_DATABASE_URL environment variable not set")
+        sys.exit(1)
+
+    engine = create_engine(database_url)
+
+    migration_sql = [
+        """
+        CREATE TABLE IF NOT EXISTS content_chunks (
+            id SERIAL PRIMARY KEY,
+            indexed_file_id INTEGER NOT NULL REFERENCES indexed_files (id) ON DELETE CASCADE,
+            drive_folder_id VARCHAR NOT NULL,
+            drive_file_id VARCHAR NOT NULL,
+            ordinal INTEGER NOT NULL,
+            char_start INTEGER NOT NULL,
+            char_end INTEGER NOT NULL,
+            heading TEXT,
+            text TEXT NOT NULL,
+            token_estimate INTEGER NOT NULL,
+            content_hash VARCHAR NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            CONSTRAINT uq_content_chunk_ordinal UNIQUE (indexed_file_id, ordinal)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_content_chunks_id ON content_chunks (id);",
+        "CREATE INDEX IF NOT EXISTS ix_content_chunks_indexed_file_id ON content_chunks (indexed_file_id);",
+        "CREATE INDEX IF NOT EXISTS ix_content_chunks_drive_folder_id ON content_chunks (drive_folder_id);",
+    ]
+
+    insert_sql = text("""
+        INSERT INTO content_chunks (
+            indexed_file_id, drive_folder_id, drive_file_id, ordinal, char_start, char_end,
+            heading, text, token_estimate, content_hash
+        ) VALUES (
+            :indexed_file_id, :drive_folder_id, :drive_file_id, :ordinal, :char_start, :char_end,
+            :heading, :text, :token_estimate, :content_hash
+        )
+    """)
+
+    try:
+        with engine.begin() as connection:
+            print("Starting content chunks migration...")
+
+            for i, sql in enumerate(migration_sql, 1):
+                print(f"Executing migration step {i}/{len(migration_sql)}: {sql.strip()[:50]}...")
+                connection.execute(text(sql))
+
+        # Chunk files that have text but no chunks yet, a batch per transaction
+        print("Chunking indexed content...")
+        last_id = 0
+        files = 0
+        chunks = 0
+        while True:
+            with engine.begin() as connection:
+                rows = connection.execute(text("""
+                    SELECT f.id, f.drive_folder_id, f.drive_file_id, f.content_text
+                    FROM indexed_files f
+                    WHERE f.id > :last_id
+                      AND f.content_text IS NOT NULL
+                      AND NOT EXISTS (SELECT 1 FROM content_chunks c WHERE c.indexed_file_id = f.id)
+                    ORDER BY f.id
+                    LIMIT :batch_size
+                """), {"last_id": last_id, "batch_size": BACKFILL_BATCH_SIZE}).fetchall()
+                if not rows:
+                    break
+
+                for file_id, drive_folder_id, drive_file_id, content_text in rows:
+                    params = [
+                        {
+                            "indexed_file_id": file_id,
+                            "drive_folder_id": drive_folder_id,
+                            "drive_file_id": drive_file_id,
+                            "ordinal": chunk.ordinal,
+                            "char_start": chunk.char_start,
+                            "char_end": chunk.char_end,
+                            "heading": chunk.heading,
+                            "text": chunk.text,
+                            "token_estimate": chunk.token_estimate,
+                            "content_hash": chunk.content_hash
+                        }
+                        for chunk in chunk_text(content_text)
+                    ]
+                    if params:
+                        connection.execute(insert_sql, params)
+                    chunks += len(params)
+                files += len(rows)
+                last_id = rows[-1][0]
+            print(f"  {files} files chunked ({chunks} chunks)")
+
+        print("✅ Content chunks migration completed successfully!")
+
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    migrate_content_chunks()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the partial content flag to the indexed_files table
+(text extracted from a byte window of a file too large to download whole)
+"""
+import sys
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def migrate_content_partial():
+    """Add content_partial column to indexed_files table"""
+    
+    # Get database URL from environment
+    database_url = os.getenv("SQLALCHEMY_DATABASE_URL")
+    if not database_url:
+        print("❌ SQLALCHEMY_DATABASE_URL environment variable not set")
+        sys.exit(1)
+    
+    engine = create_engine(database_url)
+    
+    migration_sql = [
+        # Add partial content flag
+        "ALTER TABLE indexed_files ADD COLUMN IF NOT EXISTS content_partial BOOLEAN DEFAULT FALSE;",
+    ]
+    
+    try:
+        with engine.begin() as connection:
+            print("Starting content partial migration...")
+            
+            for i, sql in enumerate(migration_sql, 1):
+                print(f"Executing migration step {i}/{len(migration_sql)}: {sql[:50]}...")
+                connection.execute(text(sql))
+            
+            print("✅ Content partial migration completed successfully!")
+            
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    migrate_content_partial()
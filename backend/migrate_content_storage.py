@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Migration script to move extracted text out of indexed_files into compressed
+content blobs (run after migrate_content_chunks.py and migrate_content_blobs.py)
+"""
+import sys
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+from apps.content_compression import compress_text
+
+# Load environment variables
+load_dotenv()
+
+# Texts compressed per transaction
+BATCH_SIZE = 200
+
+def _has_column(connection, table: str, column: str) -> bool:
+    return connection.execute(text(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = :table AND column_name = :column"
+    ), {"table": table, "column": column}).first() is not None
+
+def _compressed(content_text: str) -> dict:
+    content_data, content_encoding = compress_text(content_text)
+    return {
+        "content_data": content_data,
+        "content_encoding": content_encoding,
+        "content_chars": len(content_text),
+        "stored_bytes": len(content_data)
+    }
+
+def migrate_content_storage():
+    """Compress blob text, give files with inline text a blob of their own and drop the text columns"""
+
+    # Get database URL from environment
+    database_url = os.getenv("SQLALCHEMY_DATABASE_URL")
+    if not database_url:
+        print("❌ SQLALCHEMY_DATABASE_URL environment variable not set")
+        sys.exit(1)
+
+    engine = create_engine(database_url)
+
+    migration_sql = [
+        # Blobs without a checksum hold the text of a single file
+        "ALTER TABLE content_blobs ALTER COLUMN md5_checksum DROP NOT NULL;",
+        "ALTER TABLE content_blobs ALTER COLUMN file_size DROP NOT NULL;",
+        "ALTER TABLE content_blobs ADD COLUMN IF NOT EXISTS content_data BYTEA;",
+        "ALTER TABLE content_blobs ADD COLUMN IF NOT EXISTS content_encoding VARCHAR NOT NULL DEFAULT 'identity';",
+        "ALTER TABLE content_blobs ADD COLUMN IF NOT EXISTS content_chars INTEGER DEFAULT 0;",
+        "ALTER TABLE content_blobs ADD COLUMN IF NOT EXISTS stored_bytes INTEGER DEFAULT 0;",
+    ]
+
+    # Once every text is compressed: chunks belong to blobs only and the plain text columns go away
+    cleanup_sql = [
+        "DELETE FROM content_chunks WHERE content_blob_id IS NULL;",
+        "ALTER TABLE content_chunks DROP COLUMN IF EXISTS indexed_file_id;",
+        "ALTER TABLE content_chunks DROP COLUMN IF EXISTS drive_folder_id;",
+        "ALTER TABLE content_chunks DROP COLUMN IF EXISTS drive_file_id;",
+        "ALTER TABLE content_chunks ALTER COLUMN content_blob_id SET NOT NULL;",
+        "ALTER TABLE content_blobs DROP COLUMN IF EXISTS content_text;",
+        "ALTER TABLE content_blobs ALTER COLUMN content_data SET NOT NULL;",
+        "ALTER TABLE indexed_files DROP COLUMN IF EXISTS content_text;",
+    ]
+
+    try:
+        with engine.begin() as connection:
+            print("Starting content storage migration...")
+
+            for i, sql in enumerate(migration_sql, 1):
+                print(f"Executing migration step {i}/{len(migration_sql)}: {sql[:50]}...")
+                connection.execute(text(sql))
+
+            has_blob_text = _has_column(connection, "content_blobs", "content_text")
+            has_file_text = _has_column(connection, "indexed_files", "content_text")
+
+        # Compress the text of shared blobs
+        blobs = 0
+        while has_blob_text:
+            with engine.begin() as connection:
+                rows = connection.execute(text("""
+                    SELECT id, COALESCE(content_text, '') FROM content_blobs
+                    WHERE content_data IS NULL
+                    ORDER BY id
+                    LIMIT :batch_size
+                """), {"batch_size": BATCH_SIZE}).fetchall()
+                for blob_id, content_text in rows:
+                    connection.execute(text("""
+                        UPDATE content_blobs
+                        SET content_data = :content_data, content_encoding = :content_encoding,
+                            content_chars = :content_chars, stored_bytes = :stored_bytes
+                        WHERE id = :id
+                    """), dict(_compressed(content_text), id=blob_id))
+            if not rows:
+                break
+            blobs += len(rows)
+            print(f"  {blobs} content blobs compressed")
+
+        # Move inline text (files without a checksum) into a blob per file, along with its chunks
+        files = 0
+        while has_file_text:
+            with engine.begin() as connection:
+                rows = connection.execute(text("""
+                    SELECT id, content_text, COALESCE(content_partial, FALSE) FROM indexed_files
+                    WHERE content_text IS NOT NULL AND content_blob_id IS NULL
+                    ORDER BY id
+                    LIMIT :batch_size
+                """), {"batch_size": BATCH_SIZE}).fetchall()
+                for file_id, content_text, content_partial in rows:
+                    blob_id = connection.execute(text("""
+                        INSERT INTO content_blobs (content_data, content_encoding, content_chars, stored_bytes, content_partial)
+                        VALUES (:content_data, :content_encoding, :content_chars, :stored_bytes, :content_partial)
+                        RETURNING id
+                    """), dict(_compressed(content_text), content_partial=content_partial)).scalar()
+                    connection.execute(text(
+                        "UPDATE indexed_files SET content_blob_id = :blob_id, content_text = NULL WHERE id = :id"
+                    ), {"blob_id": blob_id, "id": file_id})
+                    connection.execute(text("""
+                        UPDATE content_chunks
+                        SET content_blob_id = :blob_id, indexed_file_id = NULL, drive_folder_id = NULL, drive_file_id = NULL
+                        WHERE indexed_file_id = :id
+                    """), {"blob_id": blob_id, "id": file_id})
+            if not rows:
+                break
+            files += len(rows)
+            print(f"  {files} files moved to their own content blob")
+
+        with engine.begin() as connection:
+            for i, sql in enumerate(cleanup_sql, 1):
+                print(f"Executing cleanup step {i}/{len(cleanup_sql)}: {sql[:50]}...")
+                connection.execute(text(sql))
+
+            texts, chars, stored = connection.execute(text(
+                "SELECT COUNT(*), COALESCE(SUM(content_chars), 0), COALESCE(SUM(stored_bytes), 0) FROM content_blobs"
+            )).one()
+            print(f"✅ Content storage migration completed successfully! {texts} texts, {chars} chars in {stored} bytes")
+            print("ℹ️ Run VACUUM FULL on indexed_files and content_blobs to return the space of the dropped columns")
+
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    migrate_content_storage()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the Drive Changes API cursor to the programs table
+(used by incremental indexing jobs)
+"""
+import sys
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def migrate_drive_changes():
+    """Add drive_changes_page_token column to programs table"""
+    
+    # Get database URL from environment
+    database_url = os.getenv("SQLALCHEMY_DATABASE_URL")
+    if not database_url:
+        print("❌ SQLALCHEMY_DATABASE_URL environment variable not set")
+        sys.exit(1)
+    
+    engine = create_engine(database_url)
+    
+    migration_sql = [
+        # Add Drive Changes API cursor column
+        "ALTER TABLE programs ADD COLUMN IF NOT EXISTS drive_changes_page_token VARCHAR;",
+    ]
+    
+    try:
+        with engine.begin() as connection:
+            print("Starting Drive changes migration...")
+            
+            for i, sql in enumerate(migration_sql, 1):
+                print(f"Executing migration step {i}/{len(migration_sql)}: {sql[:50]}...")
+                connection.execute(text(sql))
+            
+            print("✅ Drive changes migration completed successfully!")
+            
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    migrate_drive_changes()
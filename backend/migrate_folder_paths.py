@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Migration script to add materialized folder paths to the indexed_files table
+and the drive_folder_nodes table holding each program's folder hierarchy
+"""
+import sys
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def migrate_folder_paths():
+    """Add path columns to indexed_files and create drive_folder_nodes"""
+    
+    # Get database URL from environment
+    database_url = os.getenv("SQLALCHEMY_DATABASE_URL")
+    if not database_url:
+        print("❌ SQLALCHEMY_DATABASE_URL environment variable not set")
+        sys.exit(1)
+    
+    engine = create_engine(database_url)
+    
+    migration_sql = [
+        # Materialized paths of indexed files
+        "ALTER TABLE indexed_files ADD COLUMN IF NOT EXISTS drive_file_path TEXT;",
+        "ALTER TABLE indexed_files ADD COLUMN IF NOT EXISTS folder_id_path TEXT;",
+        "CREATE INDEX IF NOT EXISTS ix_indexed_files_folder_id_path ON indexed_files (folder_id_path text_pattern_ops);",
+        
+        # Folder hierarchy
+        """
+        CREATE TABLE IF NOT EXISTS drive_folder_nodes (
+            id SERIAL PRIMARY KEY,
+            drive_folder_id VARCHAR NOT NULL,
+            folder_id VARCHAR NOT NULL,
+            parent_id VARCHAR,
+            name VARCHAR,
+            path TEXT NOT NULL DEFAULT '',
+            id_path TEXT NOT NULL,
+            depth INTEGER DEFAULT 0,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE,
+            CONSTRAINT uq_drive_folder_node UNIQUE (drive_folder_id, folder_id)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_drive_folder_nodes_id ON drive_folder_nodes (id);",
+        "CREATE INDEX IF NOT EXISTS ix_drive_folder_nodes_drive_folder_id ON drive_folder_nodes (drive_folder_id);",
+        "CREATE INDEX IF NOT EXISTS ix_drive_folder_nodes_id_path ON drive_folder_nodes (drive_folder_id, id_path text_pattern_ops);",
+    ]
+    
+    try:
+        with engine.begin() as connection:
+            print("Starting folder paths migration...")
+            
+            for i, sql in enumerate(migration_sql, 1):
+                print(f"Executing migration step {i}/{len(migration_sql)}: {sql.strip()[:50]}...")
+                connection.execute(text(sql))
+            
+            print("✅ Folder paths migration completed successfully!")
+            print("ℹ️ Paths are filled in by the next full scan of each program")
+            
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    migrate_folder_paths()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Migration script to add Drive revision identifiers to the indexed_files table
+(lets reindexing skip the download or export of files whose content did not change)
+"""
+import sys
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def migrate_revision_ids():
+    """Add head_revision_id and drive_version columns to indexed_files table"""
+    
+    # Get database URL from environment
+    database_url = os.getenv("SQLALCHEMY_DATABASE_URL")
+    if not database_url:
+        print("❌ SQLALCHEMY_DATABASE_URL environment variable not set")
+        sys.exit(1)
+    
+    engine = create_engine(database_url)
+    
+    migration_sql = [
+        # Head revision of binary files
+        "ALTER TABLE indexed_files ADD COLUMN IF NOT EXISTS head_revision_id VARCHAR;",
+        # Version counter of every file (the only revision marker of Google Workspace files)
+        "ALTER TABLE indexed_files ADD COLUMN IF NOT EXISTS drive_version BIGINT;",
+    ]
+    
+    try:
+        with engine.begin() as connection:
+            print("Starting revision ids migration...")
+            
+            for i, sql in enumerate(migration_sql, 1):
+                print(f"Executing migration step {i}/{len(migration_sql)}: {sql[:50]}...")
+                connection.execute(text(sql))
+            
+            print("✅ Revision ids migration completed successfully!")
+            
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    migrate_revision_ids()
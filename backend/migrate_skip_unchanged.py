@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the unchanged files counter to the indexing_jobs table
+(files skipped because their Drive metadata matched the indexed row) and the
+content error of indexed files, whose files are never skipped
+"""
+import sys
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def migrate_skip_unchanged():
+    """Add skipped_unchanged column to indexing_jobs and content_error column to indexed_files"""
+    
+    # Get database URL from environment
+    database_url = os.getenv("SQLALCHEMY_DATABASE_URL")
+    if not database_url:
+        print("❌ SQLALCHEMY_DATABASE_URL environment variable not set")
+        sys.exit(1)
+    
+    engine = create_engine(database_url)
+    
+    migration_sql = [
+        # Add unchanged files counter
+        "ALTER TABLE indexing_jobs ADD COLUMN IF NOT EXISTS skipped_unchanged INTEGER DEFAULT 0;",
+        # Files whose content failed to download or extract are never skipped
+        "ALTER TABLE indexed_files ADD COLUMN IF NOT EXISTS content_error VARCHAR;",
+    ]
+    
+    try:
+        with engine.begin() as connection:
+            print("Starting skip unchanged migration...")
+            
+            for i, sql in enumerate(migration_sql, 1):
+                print(f"Executing migration step {i}/{len(migration_sql)}: {sql[:50]}...")
+                connection.execute(text(sql))
+            
+            print("✅ Skip unchanged migration completed successfully!")
+            
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    migrate_skip_unchanged()